@@ -16,10 +16,15 @@ def create_app(config_name=None):
     # 允许跨域请求
     CORS(app)
     
+    # 接口响应和数据库JSON列使用快速JSON序列化（安装了orjson时使用orjson）
+    from app.json_provider import init_json_provider, engine_json_options
+    init_json_provider(app)
+    
     # 配置数据库
     app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get(
         'DATABASE_URI', 'sqlite:///ev_monitoring.db')
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_json_options()
     
     # 初始化数据库
     db.init_app(app)
@@ -31,5 +36,28 @@ def create_app(config_name=None):
     # 创建数据库表
     with app.app_context():
         db.create_all()
+        _create_missing_indexes()
+    
+    # 传感器后台线程需要应用上下文才能访问数据库（在建表之后启动）
+    from app.api.sensors import sensor_manager
+    sensor_manager.init_app(app)
+    
+    # 推理调度线程中的检测结果会创建警报，同样需要应用上下文
+    from app.api.cameras import inference_scheduler
+    inference_scheduler.init_app(app)
+    
+    # 定期写回合并的重复警报次数
+    from app.services.alerts.alert_service import AlertService
+    AlertService().init_app(app)
+    
+    # 加载警报统计计数并定期核对
+    from app.services.alerts.alert_stats import get_alert_stats
+    get_alert_stats().init_app(app)
         
-    return app 
\ No newline at end of file
+    return app
+
+def _create_missing_indexes():
+    """为已存在的表补建模型中新声明的索引（create_all不会修改已有的表）"""
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=db.engine, checkfirst=True) 
\ No newline at end of file
@@ -3,4 +3,4 @@ from flask import Blueprint
 api_bp = Blueprint('api', __name__)
 
 # 导入各个API路由
-from app.api import alerts, sensors, cameras, dashboard, auth 
\ No newline at end of file
+from app.api import alerts, sensors, cameras, events, dashboard, auth 
\ No newline at end of file
@@ -1,23 +1,99 @@
 from flask import jsonify, request
 from app.api import api_bp
 from app.models.alert import Alert
+from app.services.alerts.alert_service import OPEN_STATUSES, flush_occurrences
+from app.services.alerts.alert_deduplicator import get_deduplicator
+from app.services.alerts.alert_stats import get_alert_stats
+from app.services.alerts.fusion_service import get_fusion_service
+from app.services.events.event_bus import get_event_bus, TOPIC_ALERTS
+from app.api.pagination import encode_cursor, decode_cursor, parse_fields, rows_to_dicts
+from app.api.export import stream_export, EXPORT_FORMATS, EXPORT_CHUNK_ROWS
 from app import db
 from datetime import datetime
 
+# 可通过 fields= 选择的字段（与 Alert.to_dict 的键一致）
+ALERT_FIELDS = [
+    'id', 'alert_type', 'status', 'message', 'source_type', 'source_id', 'location', 'details',
+    'severity', 'image_url', 'occurrence_count', 'last_occurrence_at', 'handled_by',
+    'handler_notes', 'resolved_at', 'created_at', 'updated_at'
+]
+
 @api_bp.route('/alerts', methods=['GET'])
 def get_alerts():
-    """获取所有报警信息"""
+    """
+    获取所有报警信息
+    
+    分页方式：
+    - 带 cursor 参数时使用游标分页，按 (created_at, id) 倒序，每页耗时与翻页深度无关；
+      首页传空的 cursor，响应中的 next_cursor 用于获取下一页（为null表示没有更多）。
+      默认不统计总数（total 为null），需要时传 count=true，此时每页都会统计整个过滤结果
+    - 否则使用 page/per_page 页码分页，默认统计总数，count=false 时不统计
+    fields=a,b,c 只查询并返回指定字段
+    
+    只查询所需的列，由列值直接构造响应，不创建模型实例
+    """
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 20, type=int)
+    cursor = request.args.get('cursor')
+    # 游标分页默认不统计总数，页码分页默认统计
+    count = request.args.get('count')
+    if count is None:
+        with_count = cursor is None
+    else:
+        with_count = count.lower() != 'false'
+    
+    try:
+        fields = parse_fields(request.args.get('fields'), ALERT_FIELDS)
+        before = decode_cursor(cursor) if cursor else None
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    # 游标分页需要的 created_at 和 id 总是加载
+    fields = fields or ALERT_FIELDS
+    columns = [field for field in ALERT_FIELDS if field in set(fields) | {'id', 'created_at'}]
+    query = _filter_alerts(Alert.query).with_entities(*[getattr(Alert, field) for field in columns])
+    query = query.order_by(Alert.created_at.desc(), Alert.id.desc())
+    
+    def serialize(rows):
+        items = rows_to_dicts(rows, columns)
+        if len(columns) > len(fields):
+            items = [{field: item[field] for field in fields} for item in items]
+        return items
+    
+    if cursor is not None:
+        total = query.order_by(None).with_entities(db.func.count(Alert.id)).scalar() if with_count else None
+        if before is not None:
+            query = query.filter(db.tuple_(Alert.created_at, Alert.id) < before)
+        
+        # 多取一条判断是否还有下一页
+        items = query.limit(per_page + 1).all()
+        next_cursor = None
+        if len(items) > per_page:
+            items = items[:per_page]
+            next_cursor = encode_cursor(items[-1].created_at, items[-1].id)
+        
+        return jsonify({
+            'items': serialize(items),
+            'total': total,
+            'next_cursor': next_cursor
+        })
     
-    # 支持过滤条件
+    pagination = query.paginate(page=page, per_page=per_page, count=with_count)
+    
+    return jsonify({
+        'items': serialize(pagination.items),
+        'total': pagination.total,
+        'pages': pagination.pages if with_count else None,
+        'current_page': pagination.page
+    })
+
+def _filter_alerts(query):
+    """按查询参数中的状态、类型和日期范围过滤"""
     status = request.args.get('status')
     alert_type = request.args.get('type')
     start_date = request.args.get('start_date')
     end_date = request.args.get('end_date')
     
-    query = Alert.query
-    
     if status:
         query = query.filter_by(status=status)
     if alert_type:
@@ -28,21 +104,31 @@ def get_alerts():
     if end_date:
         end_date = datetime.strptime(end_date, '%Y-%m-%d')
         query = query.filter(Alert.created_at <= end_date)
+    return query
+
+@api_bp.route('/alerts/export', methods=['GET'])
+def export_alerts():
+    """
+    流式导出报警记录
     
-    pagination = query.order_by(Alert.created_at.desc()).paginate(
-        page=page, per_page=per_page
-    )
+    format 为 csv（默认）或 ndjson，gzip=true 时边导出边压缩；
+    过滤参数同 /alerts，fields=a,b,c 只导出指定字段。按 (created_at, id) 正序分批从数据库游标读取。
+    """
+    export_format = request.args.get('format', 'csv')
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({'error': '无效的导出格式'}), 400
     
-    alerts = []
-    for alert in pagination.items:
-        alerts.append(alert.to_dict())
+    try:
+        fields = parse_fields(request.args.get('fields'), ALERT_FIELDS) or ALERT_FIELDS
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
-    return jsonify({
-        'items': alerts,
-        'total': pagination.total,
-        'pages': pagination.pages,
-        'current_page': pagination.page
-    })
+    query = _filter_alerts(Alert.query).with_entities(*[getattr(Alert, field) for field in fields])
+    query = query.order_by(Alert.created_at, Alert.id).yield_per(EXPORT_CHUNK_ROWS)
+    
+    rows = (dict(zip(fields, row)) for row in query)
+    compress = request.args.get('gzip', 'false').lower() == 'true'
+    return stream_export(rows, fields, export_format, 'alerts', compress=compress)
 
 @api_bp.route('/alerts/<int:alert_id>', methods=['GET'])
 def get_alert(alert_id):
@@ -57,6 +143,7 @@ def update_alert(alert_id):
     data = request.get_json()
     
     if 'status' in data:
+        get_alert_stats().record_status_change(alert.status, data['status'])
         alert.status = data['status']
     if 'handled_by' in data:
         alert.handled_by = data['handled_by']
@@ -66,30 +153,26 @@ def update_alert(alert_id):
     alert.updated_at = datetime.utcnow()
     db.session.commit()
     
-    return jsonify(alert.to_dict())
-
-@api_bp.route('/alerts/stats', methods=['GET'])
-def get_alert_stats():
-    """获取报警统计信息"""
-    # 按类型统计
-    type_stats = db.session.query(
-        Alert.alert_type, db.func.count(Alert.id)
-    ).group_by(Alert.alert_type).all()
-    
-    # 按状态统计
-    status_stats = db.session.query(
-        Alert.status, db.func.count(Alert.id)
-    ).group_by(Alert.status).all()
-    
-    # 按日期统计近7天
-    date_stats = db.session.query(
-        db.func.date(Alert.created_at), db.func.count(Alert.id)
-    ).group_by(db.func.date(Alert.created_at))\
-        .order_by(db.func.date(Alert.created_at).desc())\
-        .limit(7).all()
+    # 警报关闭后，后续同类警报将重新创建；关闭前合并的重复次数立即写回
+    if alert.status not in OPEN_STATUSES:
+        get_deduplicator().release(alert.id)
+        flush_occurrences()
     
+    result = alert.to_dict()
+    get_event_bus().publish(TOPIC_ALERTS, 'alert_updated', result)
+    
+    return jsonify(result)
+
+@api_bp.route('/alerts/fusion', methods=['GET'])
+def get_fusion_scores():
+    """获取各位置当前的多源融合风险评分"""
+    fusion = get_fusion_service()
     return jsonify({
-        'by_type': {t[0]: t[1] for t in type_stats},
-        'by_status': {s[0]: s[1] for s in status_stats},
-        'by_date': {str(d[0]): d[1] for d in date_stats}
-    }) 
\ No newline at end of file
+        'scores': fusion.get_scores(),
+        'stats': fusion.get_stats()
+    })
+
+@api_bp.route('/alerts/stats', methods=['GET'])
+def get_alert_stats_summary():
+    """获取报警统计信息（增量维护的计数，按类型、状态和近7天日期）"""
+    return jsonify(get_alert_stats().get_stats())
\ No newline at end of file
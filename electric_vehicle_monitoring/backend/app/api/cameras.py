@@ -2,13 +2,24 @@ from flask import jsonify, request, Response, stream_with_context
 from app.api import api_bp
 from app.services.detection.camera_manager import CameraManager
 from app.services.detection.yolo_detector import YoloDetector
-import cv2
+from app.services.detection.inference_scheduler import InferenceScheduler
+from app.services.detection.stream_pipeline import StreamPipelineManager
+from app.services.detection.frame_cache import FrameCache
 import numpy as np
-import time
 
 camera_manager = CameraManager()
 yolo_detector = YoloDetector()
 
+# 所有摄像头共享的批量推理调度器
+inference_scheduler = InferenceScheduler(camera_manager, yolo_detector)
+inference_scheduler.start()
+
+# 编码帧缓存，快照和视频流共享同一帧的编码结果
+frame_cache = FrameCache(camera_manager, inference_scheduler)
+
+# 每路摄像头一条处理流水线，观看者数量不影响CPU负载
+stream_pipelines = StreamPipelineManager(camera_manager, frame_cache)
+
 @api_bp.route('/cameras', methods=['GET'])
 def get_cameras():
     """获取所有摄像头列表"""
@@ -26,32 +37,18 @@ def get_camera(camera_id):
 @api_bp.route('/cameras/<camera_id>/stream', methods=['GET'])
 def stream_camera(camera_id):
     """获取摄像头视频流"""
+    # 是否返回检测结果（可选，根据查询参数决定）
+    detect = request.args.get('detect', 'false').lower() == 'true'
+    
     def generate():
-        camera = camera_manager.get_stream(camera_id)
-        if not camera:
+        pipeline = stream_pipelines.get_pipeline(camera_id)
+        if not pipeline:
             yield b'--frame\r\nContent-Type: text/plain\r\n\r\n' + '摄像头不可用'.encode('utf-8') + b'\r\n'
             return
         
-        while True:
-            success, frame = camera.read()
-            if not success:
-                break
-                
-            # 进行目标检测（可选，根据查询参数决定）
-            detect = request.args.get('detect', 'false').lower() == 'true'
-            if detect:
-                frame = yolo_detector.detect_objects(frame)
-                
-            # 编码为JPEG
-            ret, buffer = cv2.imencode('.jpg', frame, [int(cv2.IMWRITE_JPEG_QUALITY), 70])
-            frame_bytes = buffer.tobytes()
-            
-            # 发送帧
-            yield (b'--frame\r\n'
-                   b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
-            
-            # 控制帧率
-            time.sleep(0.05)  # 大约20fps
+        # 所有观看者共享同一条流水线编码好的帧
+        for chunk in pipeline.subscribe(detect):
+            yield chunk
     
     return Response(
         stream_with_context(generate()),
@@ -61,18 +58,30 @@ def stream_camera(camera_id):
 @api_bp.route('/cameras/<camera_id>/snapshot', methods=['GET'])
 def get_camera_snapshot(camera_id):
     """获取摄像头的当前快照"""
-    frame = camera_manager.get_snapshot(camera_id)
-    if frame is None:
-        return jsonify({'error': '无法获取摄像头快照'}), 404
-    
-    # 进行目标检测（可选，根据查询参数决定）
+    # 是否返回检测结果（可选，根据查询参数决定）
     detect = request.args.get('detect', 'false').lower() == 'true'
-    if detect:
-        frame = yolo_detector.detect_objects(frame)
+    quality = request.args.get('quality', 85, type=int)
+    
+    # 输出分辨率（可选，格式: 640x480）
+    resolution = request.args.get('resolution')
+    if resolution:
+        try:
+            width, height = (int(v) for v in resolution.lower().split('x'))
+            if width <= 0 or height <= 0:
+                raise ValueError(resolution)
+            resolution = (width, height)
+        except ValueError:
+            return jsonify({'error': '无效的分辨率参数'}), 400
+    else:
+        resolution = None
+    
+    if not 1 <= quality <= 100:
+        return jsonify({'error': '无效的质量参数'}), 400
     
-    # 编码为JPEG
-    ret, buffer = cv2.imencode('.jpg', frame, [int(cv2.IMWRITE_JPEG_QUALITY), 85])
-    snapshot_bytes = buffer.tobytes()
+    # 同一帧同一规格只编码一次，之后的请求直接读取缓存
+    _, snapshot_bytes = frame_cache.get_jpeg(camera_id, detect, quality, resolution)
+    if snapshot_bytes is None:
+        return jsonify({'error': '无法获取摄像头快照'}), 404
     
     return Response(snapshot_bytes, mimetype='image/jpeg')
 
@@ -106,6 +115,13 @@ def update_camera(camera_id):
     if not success:
         return jsonify({'error': '摄像头不存在'}), 404
     
+    # URL变化后重新创建的流帧序号从0开始，清除旧流的流水线、编码缓存和检测结果，
+    # 避免新流到达相同序号时返回旧画面
+    if 'url' in data:
+        stream_pipelines.remove_pipeline(camera_id)
+        frame_cache.invalidate_camera(camera_id)
+        inference_scheduler.remove_camera(camera_id)
+    
     return jsonify({'message': '摄像头信息已更新'})
 
 @api_bp.route('/cameras/<camera_id>', methods=['DELETE'])
@@ -115,4 +131,8 @@ def delete_camera(camera_id):
     if not success:
         return jsonify({'error': '摄像头不存在'}), 404
     
+    stream_pipelines.remove_pipeline(camera_id)
+    frame_cache.invalidate_camera(camera_id)
+    inference_scheduler.remove_camera(camera_id)
+    
     return jsonify({'message': '摄像头已删除'}) 
\ No newline at end of file
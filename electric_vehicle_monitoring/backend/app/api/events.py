@@ -0,0 +1,57 @@
+import os
+from flask import jsonify, request, Response
+from app.api import api_bp
+from app.services.events.event_bus import get_event_bus, format_sse, TOPICS
+
+# 空闲时发送心跳注释的间隔（秒），防止代理断开长连接
+KEEPALIVE_INTERVAL = float(os.environ.get("EVENT_KEEPALIVE_INTERVAL", 15))
+
+@api_bp.route('/events', methods=['GET'])
+def stream_events():
+    """
+    服务器推送事件流 (SSE)
+    
+    查询参数 topics 为逗号分隔的主题列表（alerts, sensors），默认订阅全部。
+    断线重连时浏览器自动携带 Last-Event-ID，服务端补发之后的警报事件。
+    """
+    topics = request.args.get('topics')
+    topics = [topic.strip() for topic in topics.split(',') if topic.strip()] if topics else list(TOPICS)
+    unknown = [topic for topic in topics if topic not in TOPICS]
+    if unknown:
+        return jsonify({'error': f"未知的主题: {', '.join(unknown)}"}), 400
+    
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    try:
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        last_event_id = None
+    
+    event_bus = get_event_bus()
+    subscription = event_bus.subscribe(topics, last_event_id)
+    
+    def generate():
+        try:
+            # 客户端断线后1秒重连
+            yield "retry: 1000\n\n"
+            while True:
+                events = subscription.get(KEEPALIVE_INTERVAL)
+                if not events:
+                    yield ": keepalive\n\n"
+                    continue
+                yield "".join(format_sse(event) for event in events)
+        finally:
+            event_bus.unsubscribe(subscription)
+    
+    return Response(
+        generate(),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'  # 关闭nginx缓冲
+        }
+    )
+
+@api_bp.route('/events/stats', methods=['GET'])
+def get_event_stats():
+    """获取事件总线统计信息"""
+    return jsonify(get_event_bus().get_stats())
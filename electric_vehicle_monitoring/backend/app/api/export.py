@@ -0,0 +1,85 @@
+import io
+import csv
+import zlib
+from datetime import datetime
+from flask import Response, stream_with_context
+from app.json_provider import dumps
+
+# 导出格式及对应的内容类型
+EXPORT_FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson; charset=utf-8'
+}
+
+# 每次向客户端发送的行数
+EXPORT_CHUNK_ROWS = 1000
+
+def _csv_value(value):
+    """CSV单元格的值：JSON字段序列化为字符串，时间转为ISO格式"""
+    if isinstance(value, (dict, list)):
+        return dumps(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+def _csv_chunks(rows, fields):
+    """逐块生成CSV文本"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fields)
+
+    count = 0
+    for row in rows:
+        writer.writerow([_csv_value(row[field]) for field in fields])
+        count += 1
+        if count % EXPORT_CHUNK_ROWS == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+def _ndjson_chunks(rows, fields):
+    """逐块生成NDJSON文本"""
+    lines = []
+    for row in rows:
+        lines.append(dumps({field: row[field] for field in fields}))
+        if len(lines) >= EXPORT_CHUNK_ROWS:
+            yield "\n".join(lines) + "\n"
+            lines = []
+    if lines:
+        yield "\n".join(lines) + "\n"
+
+def _gzip_chunks(chunks):
+    """边生成边压缩为gzip格式"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+def stream_export(rows, fields, export_format, filename, compress=False):
+    """
+    以流式响应导出数据行
+
+    Args:
+        rows: 逐行生成字典的迭代器（在应用上下文中消费），时间字段可以是datetime
+        fields: 导出的字段列表
+        export_format: csv 或 ndjson
+        filename: 下载文件名（不含扩展名）
+        compress: 是否gzip压缩
+    """
+    chunks = _csv_chunks(rows, fields) if export_format == 'csv' else _ndjson_chunks(rows, fields)
+    filename = f"{filename}.{export_format}"
+    headers = {'X-Accel-Buffering': 'no'}
+
+    if compress:
+        chunks = _gzip_chunks(chunks)
+        filename += '.gz'
+        mimetype = 'application/gzip'
+    else:
+        chunks = (chunk.encode('utf-8') for chunk in chunks)
+        mimetype = EXPORT_FORMATS[export_format]
+
+    headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return Response(stream_with_context(chunks), mimetype=mimetype, headers=headers)
@@ -0,0 +1,46 @@
+import json
+import base64
+from datetime import datetime
+
+def encode_cursor(timestamp, row_id=None):
+    """将最后一条记录的 (时间, ID) 编码为不透明的游标字符串"""
+    payload = json.dumps([timestamp.isoformat(), row_id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor):
+    """
+    解析游标
+
+    Returns:
+        (时间, ID)，ID可能为None；游标无效时抛出 ValueError
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        timestamp, row_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        return datetime.fromisoformat(timestamp), (int(row_id) if row_id is not None else None)
+    except (TypeError, ValueError, UnicodeError, json.JSONDecodeError) as e:
+        raise ValueError(f"无效的游标: {cursor}") from e
+
+def parse_fields(fields, allowed):
+    """
+    解析 fields= 查询参数
+
+    Returns:
+        字段名列表（保持allowed中的顺序），未指定时返回None；包含未知字段时抛出 ValueError
+    """
+    if not fields:
+        return None
+
+    requested = {field.strip() for field in fields.split(',') if field.strip()}
+    unknown = requested - set(allowed)
+    if unknown:
+        raise ValueError(f"未知的字段: {', '.join(sorted(unknown))}")
+    return [field for field in allowed if field in requested]
+
+def rows_to_dicts(rows, fields):
+    """
+    将按fields顺序选择列的查询结果行转换为字典列表
+
+    时间字段保持datetime，由应用的JSON序列化统一转为ISO格式，不再逐个构造模型实例
+    """
+    return [dict(zip(fields, row)) for row in rows]
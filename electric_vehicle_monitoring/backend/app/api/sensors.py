@@ -1,62 +1,169 @@
 from flask import jsonify, request
 from app.api import api_bp
-from app.models.sensor_data import SensorData, SensorType
+from app.models.sensor_data import SensorData, SensorDataChunk, SensorType
 from app.services.sensors.sensor_manager import SensorManager
-from app.services.alerts.alert_service import AlertService
-from app import db
-from datetime import datetime, timedelta
+from app.services.sensors.rollup_service import RESOLUTIONS
+from app.services.sensors.sensor_storage import SENSOR_DATA_FIELDS
+from app.api.pagination import encode_cursor, decode_cursor, parse_fields
+from app.api.export import stream_export, EXPORT_FORMATS, EXPORT_CHUNK_ROWS
+from datetime import datetime, timedelta, timezone
+import json
+import os
 
 sensor_manager = SensorManager()
-alert_service = AlertService()
+
+# 批量写入时每批的读数数量
+INGEST_BATCH_SIZE = int(os.environ.get("SENSOR_INGEST_BATCH_SIZE", 1000))
+# 响应中最多返回的错误条数
+MAX_REPORTED_ERRORS = 100
+
+NDJSON_MIMETYPES = ('application/x-ndjson', 'application/ndjson', 'application/jsonl')
+
+def _parse_timestamp(value):
+    """
+    解析ISO格式时间，带时区的时间转换为UTC并去掉时区
+
+    数据库和内存缓存中的时间都是不带时区的UTC时间，混入带时区的时间会导致比较时出错
+    """
+    timestamp = datetime.fromisoformat(value)
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return timestamp
 
 @api_bp.route('/sensors/data', methods=['GET'])
 def get_sensor_data():
-    """获取传感器数据，支持时间范围和传感器类型过滤"""
+    """
+    获取传感器数据，支持时间范围和传感器类型过滤
+    
+    resolution 可选 raw / 1m / 1h / 1d / auto，默认 raw（原始读数，默认最多100条）；
+    auto 时短时间范围返回原始读数，长时间范围返回对应粒度的汇总数据。
+    汇总数据只包含启用汇总之后写入的读数
+    
+    原始读数支持游标分页（带 cursor 参数，首页传空值）：按 (timestamp, id) 倒序，
+    返回 {'items', 'next_cursor'}；fields=a,b,c 只查询并返回指定字段。
+    列式存储（SENSOR_STORAGE_BACKEND=columnar）的读数没有ID（id 为null），不支持游标分页
+    """
     sensor_type = request.args.get('type')
+    device_id = request.args.get('device_id')
     start_time = request.args.get('start_time')
     end_time = request.args.get('end_time')
-    limit = request.args.get('limit', 100, type=int)
+    resolution = request.args.get('resolution', 'raw')
+    limit = request.args.get('limit', type=int)
+    cursor = request.args.get('cursor')
     
-    query = SensorData.query
+    if resolution not in ('auto', 'raw') and resolution not in RESOLUTIONS:
+        return jsonify({'error': '无效的时间粒度'}), 400
     
-    if sensor_type:
-        query = query.filter_by(sensor_type=sensor_type)
+    try:
+        fields = parse_fields(request.args.get('fields'), SENSOR_DATA_FIELDS)
+        before = decode_cursor(cursor) if cursor else None
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    if cursor is not None and not sensor_manager.storage.has_ids:
+        return jsonify({'error': '列式存储的读数没有ID，不支持游标分页'}), 400
+    
+    # 游标分页和字段选择只用于原始读数
+    if cursor is not None or (fields and resolution == 'auto'):
+        resolution = 'raw'
     
     if start_time:
-        start_time = datetime.fromisoformat(start_time)
-        query = query.filter(SensorData.timestamp >= start_time)
+        start_time = _parse_timestamp(start_time)
     else:
         # 默认获取最近24小时的数据
         start_time = datetime.utcnow() - timedelta(hours=24)
-        query = query.filter(SensorData.timestamp >= start_time)
         
     if end_time:
-        end_time = datetime.fromisoformat(end_time)
-        query = query.filter(SensorData.timestamp <= end_time)
+        end_time = _parse_timestamp(end_time)
+    
+    if resolution == 'auto':
+        resolution = sensor_manager.rollups.choose_resolution(start_time, end_time or datetime.utcnow())
+    
+    if resolution != 'raw':
+        rollups = sensor_manager.rollups.query(
+            resolution, start_time, end_time or datetime.utcnow(),
+            sensor_type=sensor_type, device_id=device_id, limit=limit
+        )
+        return jsonify(rollups)
+    
+    limit = limit or 100
+    if cursor is None:
+        return jsonify(sensor_manager.storage.query(
+            start_time, end_time, sensor_type=sensor_type, device_id=device_id, limit=limit, fields=fields
+        ))
+    
+    # 游标需要时间和ID，多取一条判断是否还有下一页
+    query_fields = fields and [field for field in SENSOR_DATA_FIELDS if field in set(fields) | {'id', 'timestamp'}]
+    items = sensor_manager.storage.query(
+        start_time, end_time, sensor_type=sensor_type, device_id=device_id,
+        limit=limit + 1, before=before, fields=query_fields
+    )
+    
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        last = items[-1]
+        next_cursor = encode_cursor(last['timestamp'], last['id'])
     
-    records = query.order_by(SensorData.timestamp.desc()).limit(limit).all()
-    result = [record.to_dict() for record in records]
+    if fields:
+        items = [{field: item[field] for field in fields} for item in items]
     
-    return jsonify(result)
+    return jsonify({'items': items, 'next_cursor': next_cursor})
+
+@api_bp.route('/sensors/export', methods=['GET'])
+def export_sensor_data():
+    """
+    流式导出原始传感器读数
+    
+    format 为 csv（默认）或 ndjson，gzip=true 时边导出边压缩；
+    start_time 默认24小时前，end_time 默认当前时间，fields=a,b,c 只导出指定字段。
+    读数按时间正序分批读取，内存占用与时间范围无关。
+    """
+    export_format = request.args.get('format', 'csv')
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({'error': '无效的导出格式'}), 400
+    
+    try:
+        fields = parse_fields(request.args.get('fields'), SENSOR_DATA_FIELDS) or SENSOR_DATA_FIELDS
+        start_time = request.args.get('start_time')
+        start_time = _parse_timestamp(start_time) if start_time else datetime.utcnow() - timedelta(hours=24)
+        end_time = request.args.get('end_time')
+        end_time = _parse_timestamp(end_time) if end_time else datetime.utcnow()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    rows = sensor_manager.storage.iter_readings(
+        start_time, end_time,
+        sensor_type=request.args.get('type'), device_id=request.args.get('device_id'),
+        fields=fields, chunk_size=EXPORT_CHUNK_ROWS
+    )
+    compress = request.args.get('gzip', 'false').lower() == 'true'
+    return stream_export(rows, fields, export_format, 'sensor_data', compress=compress)
 
 @api_bp.route('/sensors/latest', methods=['GET'])
 def get_latest_sensor_data():
-    """获取最新的传感器数据"""
-    latest_data = {}
+    """
+    获取最新的传感器数据（从内存缓存读取）
     
-    for sensor_type in SensorType:
-        latest = SensorData.query.filter_by(
-            sensor_type=sensor_type.value
-        ).order_by(SensorData.timestamp.desc()).first()
-        
-        if latest:
-            latest_data[sensor_type.value] = latest.to_dict()
+    默认返回每种传感器类型最新的一条读数；指定 device_id 时只返回该设备的读数；
+    all_devices=true 时按 {传感器类型: {设备ID: 读数}} 返回所有设备的最新读数
+    """
+    device_id = request.args.get('device_id')
+    
+    if request.args.get('all_devices', 'false').lower() == 'true':
+        return jsonify(sensor_manager.latest_cache.get_latest(
+            sensor_type=request.args.get('type'), device_id=device_id
+        ))
     
-    return jsonify(latest_data)
+    return jsonify(sensor_manager.latest_cache.get_latest_by_type(device_id=device_id))
 
 @api_bp.route('/sensors/readings', methods=['POST'])
 def record_sensor_reading():
-    """记录传感器读数"""
+    """
+    记录传感器读数
+    
+    返回保存的读数；列式存储的读数没有ID，返回的 id 为null
+    """
     data = request.get_json()
     
     sensor_type = data.get('sensor_type')
@@ -73,6 +180,11 @@ def record_sensor_reading():
     except ValueError:
         return jsonify({'error': '无效的传感器类型'}), 400
     
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return jsonify({'error': '无效的数值'}), 400
+    
     # 创建传感器数据记录
     sensor_data = SensorData(
         sensor_type=sensor_type,
@@ -82,18 +194,131 @@ def record_sensor_reading():
         timestamp=datetime.utcnow()
     )
     
-    db.session.add(sensor_data)
-    db.session.commit()
-    
-    # 检查是否需要触发警报
-    alert_service.check_sensor_alert(sensor_data)
+    # 保存数据并检查是否需要触发警报
+    sensor_manager.save_reading(sensor_data)
     
     return jsonify(sensor_data.to_dict()), 201
 
+@api_bp.route('/sensors/readings/batch', methods=['POST'])
+def record_sensor_readings_batch():
+    """
+    批量记录传感器读数
+    
+    请求体为JSON数组，或 Content-Type 为 application/x-ndjson 的逐行JSON流；
+    读数按批次批量写入，每批只提交一次事务。
+    """
+    if request.mimetype in NDJSON_MIMETYPES:
+        items = _iter_ndjson(request.stream)
+    else:
+        data = request.get_json(silent=True)
+        if isinstance(data, dict):
+            data = data.get('readings')
+        if not isinstance(data, list):
+            return jsonify({'error': '请求体应为读数数组'}), 400
+        items = enumerate(data)
+    
+    accepted = 0
+    errors = []
+    batch = []
+    
+    for index, item in items:
+        reading, error = _validate_reading(item)
+        if error:
+            errors.append({'index': index, 'error': error})
+            continue
+            
+        batch.append(reading)
+        if len(batch) >= INGEST_BATCH_SIZE:
+            accepted += sensor_manager.ingest_readings(batch)
+            batch = []
+    
+    if batch:
+        accepted += sensor_manager.ingest_readings(batch)
+    
+    status_code = 201 if accepted else 400
+    return jsonify({
+        'accepted': accepted,
+        'rejected': len(errors),
+        'errors': errors[:MAX_REPORTED_ERRORS]
+    }), status_code
+
+def _iter_ndjson(stream):
+    """逐行解析NDJSON请求体，无需将整个请求读入内存"""
+    for line_number, line in enumerate(stream):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield line_number, json.loads(line)
+        except ValueError:
+            yield line_number, None
+
+def _validate_reading(item):
+    """校验单条读数，返回 (sensor_data 行字典, 错误信息)"""
+    if not isinstance(item, dict):
+        return None, '无效的读数格式'
+        
+    sensor_type = item.get('sensor_type')
+    value = item.get('value')
+    device_id = item.get('device_id')
+    
+    if not all([sensor_type, value is not None, device_id]):
+        return None, '缺少必要参数'
+    
+    # 检查传感器类型是否有效
+    try:
+        SensorType(sensor_type)
+    except ValueError:
+        return None, '无效的传感器类型'
+    
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None, '无效的数值'
+    
+    timestamp = item.get('timestamp')
+    if timestamp:
+        try:
+            timestamp = _parse_timestamp(timestamp)
+        except (TypeError, ValueError):
+            return None, '无效的时间戳'
+    else:
+        timestamp = datetime.utcnow()
+    
+    return {
+        'sensor_type': sensor_type,
+        'value': value,
+        'device_id': str(device_id),
+        'location': item.get('location'),
+        'timestamp': timestamp,
+        'unit': item.get('unit') or sensor_manager._get_sensor_unit(sensor_type),
+        'status': item.get('status'),
+        'metadata': item.get('metadata')
+    }, None
+
+@api_bp.route('/sensors/stats', methods=['GET'])
+def get_sensor_stats():
+    """获取传感器服务统计信息（写入缓冲积压等）"""
+    return jsonify(sensor_manager.get_stats())
+
+@api_bp.route('/sensors/anomalies', methods=['GET'])
+def get_sensor_anomaly_stats():
+    """获取各设备的滚动统计（EWMA、滚动均值/标准差、每分钟斜率）"""
+    sensor_type = request.args.get('type')
+    device_id = request.args.get('device_id')
+    return jsonify(sensor_manager.get_anomaly_stats(sensor_type, device_id))
+
+@api_bp.route('/sensors/archive', methods=['GET'])
+def get_sensor_archive():
+    """获取已归档（已从数据库删除）的原始数据分块"""
+    chunks = SensorDataChunk.query.order_by(SensorDataChunk.day.desc()).all()
+    return jsonify([chunk.to_dict() for chunk in chunks])
+
 @api_bp.route('/sensors/thresholds', methods=['GET'])
 def get_sensor_thresholds():
     """获取传感器阈值设置"""
-    thresholds = sensor_manager.get_thresholds()
+    include_devices = request.args.get('include_devices', 'false').lower() == 'true'
+    thresholds = sensor_manager.get_thresholds(include_devices=include_devices)
     return jsonify(thresholds)
 
 @api_bp.route('/sensors/thresholds', methods=['PUT'])
@@ -0,0 +1,84 @@
+import json
+import logging
+from datetime import date, datetime
+from decimal import Decimal
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # 可选依赖，未安装时使用标准库
+    orjson = None
+
+# 字典键允许非字符串；numpy数组和标量直接序列化
+ORJSON_OPTIONS = (orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY) if orjson else 0
+
+def _default(value):
+    """标准库和orjson均无法直接序列化的类型"""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    if hasattr(value, 'item'):  # numpy标量
+        return value.item()
+    if hasattr(value, 'tolist'):  # numpy数组
+        return value.tolist()
+    raise TypeError(f"无法序列化为JSON的类型: {type(value).__name__}")
+
+def dumps(obj):
+    """序列化为紧凑的JSON字符串（非ASCII字符不转义，时间转为ISO格式）"""
+    if orjson is not None:
+        return orjson.dumps(obj, default=_default, option=ORJSON_OPTIONS).decode('utf-8')
+    return json.dumps(obj, default=_default, ensure_ascii=False, separators=(',', ':'))
+
+def engine_json_options():
+    """
+    数据库JSON列（警报详情、检测配置等）的序列化选项，传给 create_engine
+
+    未安装orjson时返回空字典，使用SQLAlchemy默认的标准库序列化
+    """
+    if orjson is None:
+        return {}
+    return {'json_serializer': dumps, 'json_deserializer': orjson.loads}
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """
+    接口响应的JSON序列化
+
+    安装了orjson时使用orjson编码，否则回退到标准库。
+    时间字段直接序列化为ISO格式（与各模型 to_dict 中的 isoformat() 一致），
+    列表接口可以直接返回查询结果的列值，无需逐行转换。
+
+    与Flask默认实现一样按键排序；标准库回退时的输出与默认实现完全相同，
+    orjson 不支持 ensure_ascii，非ASCII字符以UTF-8原样输出（JSON语义不变）。
+    """
+
+    def dumps(self, obj, **kwargs):
+        if orjson is not None and not kwargs:
+            option = ORJSON_OPTIONS | orjson.OPT_SORT_KEYS
+            return orjson.dumps(obj, default=_default, option=option).decode('utf-8')
+        kwargs.setdefault('default', _default)
+        return super().dumps(obj, **kwargs)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        pretty = (self.compact is None and self._app.debug) or self.compact is False
+
+        if orjson is not None:
+            option = ORJSON_OPTIONS | orjson.OPT_SORT_KEYS | orjson.OPT_APPEND_NEWLINE
+            if pretty:
+                option |= orjson.OPT_INDENT_2
+            body = orjson.dumps(obj, default=_default, option=option)
+        else:
+            dump_args = {'indent': 2} if pretty else {'separators': (',', ':')}
+            body = f"{self.dumps(obj, **dump_args)}\n"
+
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+
+def init_json_provider(app):
+    """为应用启用快速JSON序列化"""
+    app.json = FastJSONProvider(app)
+    logging.getLogger("FastJSONProvider").info(f"JSON序列化: {'orjson' if orjson else 'json'}")
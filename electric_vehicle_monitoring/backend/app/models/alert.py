@@ -22,6 +22,16 @@ class AlertStatus(Enum):
 class Alert(db.Model):
     """报警信息模型"""
     __tablename__ = 'alerts'
+    __table_args__ = (
+        # 列表默认按创建时间倒序，以及按日期范围过滤/统计
+        db.Index('ix_alerts_created_at', 'created_at'),
+        # 按状态过滤（含活跃警报）
+        db.Index('ix_alerts_status_created_at', 'status', 'created_at'),
+        # 按类型过滤
+        db.Index('ix_alerts_type_created_at', 'alert_type', 'created_at'),
+        # 按来源查询，以及去重时查找同一来源的未关闭警报
+        db.Index('ix_alerts_source_created_at', 'source_type', 'source_id', 'created_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     alert_type = db.Column(db.String(50), nullable=False)  # 报警类型
@@ -38,6 +48,10 @@ class Alert(db.Model):
     severity = db.Column(db.Integer, default=3)  # 严重程度 (1-5, 5最严重)
     image_url = db.Column(db.String(255))  # 相关图像URL
     
+    # 重复合并信息（时间窗口内同一来源的重复警报会合并到同一条记录）
+    occurrence_count = db.Column(db.Integer, default=1)  # 出现次数
+    last_occurrence_at = db.Column(db.DateTime, default=datetime.utcnow)  # 最后一次出现时间
+    
     # 处理信息
     handled_by = db.Column(db.String(50))  # 处理人
     handler_notes = db.Column(db.Text)  # 处理备注
@@ -60,9 +74,24 @@ class Alert(db.Model):
             'details': self.details,
             'severity': self.severity,
             'image_url': self.image_url,
+            'occurrence_count': self.occurrence_count,
+            'last_occurrence_at': self.last_occurrence_at.isoformat() if self.last_occurrence_at else None,
             'handled_by': self.handled_by,
             'handler_notes': self.handler_notes,
             'resolved_at': self.resolved_at.isoformat() if self.resolved_at else None,
             'created_at': self.created_at.isoformat(),
             'updated_at': self.updated_at.isoformat()
-        } 
\ No newline at end of file
+        } 
+
+class AlertStat(db.Model):
+    """警报统计计数（按类型/状态/日期），随警报的创建和状态变化增量维护"""
+    __tablename__ = 'alert_stats'
+    __table_args__ = (
+        db.UniqueConstraint('dimension', 'key', name='uq_alert_stat_key'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    dimension = db.Column(db.String(10), nullable=False)  # 统计维度 (type, status, date)
+    key = db.Column(db.String(50), nullable=False)  # 维度取值
+    count = db.Column(db.Integer, nullable=False, default=0)  # 警报数量
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
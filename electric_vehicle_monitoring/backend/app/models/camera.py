@@ -42,6 +42,10 @@ class Camera(db.Model):
 class DetectionEvent(db.Model):
     """检测事件模型 - 记录检测到的异常情况"""
     __tablename__ = 'detection_events'
+    __table_args__ = (
+        db.Index('ix_detection_events_camera_timestamp', 'camera_id', 'timestamp'),
+        db.Index('ix_detection_events_timestamp', 'timestamp'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     camera_id = db.Column(db.Integer, db.ForeignKey('cameras.id'), nullable=False)
@@ -60,7 +64,8 @@ class DetectionEvent(db.Model):
     alert_id = db.Column(db.Integer, db.ForeignKey('alerts.id'))
     
     # 元数据
-    metadata = db.Column(db.JSON)  # 其他元数据
+    # "metadata"是声明式模型的保留属性名，列名保持不变
+    extra_metadata = db.Column('metadata', db.JSON)  # 其他元数据
     
     def to_dict(self):
         """转换为字典表示"""
@@ -74,5 +79,5 @@ class DetectionEvent(db.Model):
             'video_clip_path': self.video_clip_path,
             'timestamp': self.timestamp.isoformat(),
             'alert_id': self.alert_id,
-            'metadata': self.metadata
+            'metadata': self.extra_metadata
         } 
\ No newline at end of file
@@ -14,6 +14,14 @@ class SensorType(Enum):
 class SensorData(db.Model):
     """传感器数据模型"""
     __tablename__ = 'sensor_data'
+    __table_args__ = (
+        # 按类型查询历史数据，按时间排序
+        db.Index('ix_sensor_data_type_timestamp', 'sensor_type', 'timestamp'),
+        # 按类型和设备查询，以及每个设备最新读数
+        db.Index('ix_sensor_data_type_device_timestamp', 'sensor_type', 'device_id', 'timestamp'),
+        # 只按时间范围查询
+        db.Index('ix_sensor_data_timestamp', 'timestamp'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     sensor_type = db.Column(db.String(20), nullable=False)  # 传感器类型
@@ -25,7 +33,8 @@ class SensorData(db.Model):
     # 可选的元数据字段
     unit = db.Column(db.String(10))  # 单位（如摄氏度、安培等）
     status = db.Column(db.String(20))  # 设备状态
-    metadata = db.Column(db.JSON)  # 其他元数据
+    # "metadata"是声明式模型的保留属性名，列名保持不变
+    extra_metadata = db.Column('metadata', db.JSON)  # 其他元数据
     
     def to_dict(self):
         """转换为字典表示"""
@@ -38,7 +47,7 @@ class SensorData(db.Model):
             'timestamp': self.timestamp.isoformat(),
             'unit': self.unit,
             'status': self.status,
-            'metadata': self.metadata
+            'metadata': self.extra_metadata
         }
     
     @classmethod
@@ -53,18 +62,94 @@ class SensorData(db.Model):
     
     @classmethod
     def get_average_by_type(cls, sensor_type, device_id=None, hours=1):
-        """获取指定类型的平均传感器数据"""
+        """获取指定类型的平均传感器数据（基于分钟级汇总数据计算）"""
         from sqlalchemy import func
         import datetime as dt
         
-        query = db.session.query(func.avg(cls.value)).filter_by(sensor_type=sensor_type)
+        query = db.session.query(
+            func.sum(SensorRollup.sum_value), func.sum(SensorRollup.count)
+        ).filter(
+            SensorRollup.resolution == '1m',
+            SensorRollup.sensor_type == sensor_type
+        )
         
         if device_id:
-            query = query.filter_by(device_id=device_id)
+            query = query.filter(SensorRollup.device_id == device_id)
             
-        # 限制时间范围
+        # 限制时间范围（按分钟对齐）
         time_limit = datetime.utcnow() - dt.timedelta(hours=hours)
-        query = query.filter(cls.timestamp >= time_limit)
+        query = query.filter(SensorRollup.bucket_start >= time_limit.replace(second=0, microsecond=0))
         
-        result = query.scalar()
-        return result if result is not None else 0 
\ No newline at end of file
+        total, count = query.one()
+        return total / count if count else 0
+
+class SensorRollup(db.Model):
+    """传感器数据降采样汇总模型（按时间桶统计 count/min/max/avg/last）"""
+    __tablename__ = 'sensor_rollups'
+    __table_args__ = (
+        db.UniqueConstraint('resolution', 'sensor_type', 'device_id', 'bucket_start',
+                            name='uq_sensor_rollup_bucket'),
+        # 不限传感器类型按时间范围查询
+        db.Index('ix_sensor_rollups_resolution_bucket', 'resolution', 'bucket_start'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    resolution = db.Column(db.String(4), nullable=False)  # 时间粒度 (1m, 1h, 1d)
+    sensor_type = db.Column(db.String(20), nullable=False)  # 传感器类型
+    device_id = db.Column(db.String(50), nullable=False)  # 设备ID
+    bucket_start = db.Column(db.DateTime, nullable=False)  # 时间桶起始时间
+    
+    # 汇总统计
+    count = db.Column(db.Integer, nullable=False, default=0)  # 读数数量
+    min_value = db.Column(db.Float)  # 最小值
+    max_value = db.Column(db.Float)  # 最大值
+    sum_value = db.Column(db.Float, nullable=False, default=0)  # 数值总和（用于计算平均值）
+    last_value = db.Column(db.Float)  # 桶内最后一个读数
+    last_timestamp = db.Column(db.DateTime)  # 最后一个读数的时间
+    
+    @property
+    def avg_value(self):
+        return self.sum_value / self.count if self.count else None
+    
+    def to_dict(self):
+        """转换为字典表示（value为平均值，与原始数据格式兼容）"""
+        return {
+            'sensor_type': self.sensor_type,
+            'device_id': self.device_id,
+            'resolution': self.resolution,
+            'timestamp': self.bucket_start.isoformat(),
+            'value': self.avg_value,
+            'count': self.count,
+            'min': self.min_value,
+            'max': self.max_value,
+            'avg': self.avg_value,
+            'last': self.last_value
+        }
+
+class SensorDataChunk(db.Model):
+    """传感器原始数据的按天分块记录（保留策略归档/删除后的目录）"""
+    __tablename__ = 'sensor_data_chunks'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, nullable=False, unique=True)  # 分块日期
+    status = db.Column(db.String(20), nullable=False)  # 状态 (archived, dropped)
+    row_count = db.Column(db.Integer, nullable=False, default=0)  # 原始读数数量
+    first_id = db.Column(db.Integer)  # 最小读数ID
+    last_id = db.Column(db.Integer)  # 最大读数ID
+    archive_format = db.Column(db.String(10))  # 归档格式 (npz, parquet)
+    archive_files = db.Column(db.JSON)  # 归档文件路径列表
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def to_dict(self):
+        """转换为字典表示"""
+        return {
+            'id': self.id,
+            'day': self.day.isoformat(),
+            'status': self.status,
+            'row_count': self.row_count,
+            'first_id': self.first_id,
+            'last_id': self.last_id,
+            'archive_format': self.archive_format,
+            'archive_files': self.archive_files,
+            'archived_at': self.archived_at.isoformat() if self.archived_at else None
+        }
@@ -0,0 +1,193 @@
+import os
+import time
+import logging
+import threading
+
+class AlertDeduplicator:
+    """
+    警报去重引擎
+
+    以 (alert_type, source_type, source_id) 为键，在时间窗口内重复出现的同类警报
+    只累加到已有的未关闭警报上；严重程度升高时升级该警报。
+    时间窗口从最后一次出现开始计算，持续的故障会一直合并为同一条警报。
+    """
+
+    # 新建 / 重复 / 升级
+    NEW = 'new'
+    DUPLICATE = 'duplicate'
+    ESCALATE = 'escalate'
+
+    def __init__(self, window=None, flush_interval=None, type_windows=None):
+        self.logger = logging.getLogger("AlertDeduplicator")
+
+        # 去重时间窗口（秒）
+        if window is None:
+            window = float(os.environ.get("ALERT_DEDUP_WINDOW", 300))
+        # 重复次数写回数据库的最小间隔（秒）
+        if flush_interval is None:
+            flush_interval = float(os.environ.get("ALERT_DEDUP_FLUSH_INTERVAL", 10))
+
+        self.window = window
+        self.flush_interval = flush_interval
+        self.type_windows = type_windows or {}  # 按警报类型覆盖的时间窗口
+
+        # {key: {'alert_id', 'severity', 'count', 'first_seen', 'last_seen', 'flushed_count', 'flushed_at'}}
+        self.entries = {}
+        self.expired_pending = []  # 过期时尚未写回的重复次数
+        self.lock = threading.Lock()
+
+        # 统计
+        self.suppressed = 0
+        self.escalated = 0
+
+    def observe(self, key, severity, now=None):
+        """
+        记录一次警报出现
+
+        Returns:
+            (action, entry)，action为 NEW / DUPLICATE / ESCALATE
+        """
+        if now is None:
+            now = time.time()
+
+        with self.lock:
+            entry = self.entries.get(key)
+
+            if entry is None or now - entry['last_seen'] > self.window_for(key):
+                if entry is not None and entry['alert_id'] is not None and entry['count'] != entry['flushed_count']:
+                    self.expired_pending.append((entry['alert_id'], entry['count'], entry['last_seen']))
+                entry = {
+                    'alert_id': None,
+                    'severity': severity,
+                    'count': 1,
+                    'first_seen': now,
+                    'last_seen': now,
+                    'flushed_count': 1,
+                    'flushed_at': now
+                }
+                self.entries[key] = entry
+                return self.NEW, dict(entry)
+
+            entry['count'] += 1
+            entry['last_seen'] = now
+
+            if severity > entry['severity']:
+                entry['severity'] = severity
+                self.escalated += 1
+                return self.ESCALATE, dict(entry)
+
+            self.suppressed += 1
+            return self.DUPLICATE, dict(entry)
+
+    def peek(self, key, severity, now=None):
+        """判断一次警报是否会被合并（不记录）"""
+        if now is None:
+            now = time.time()
+
+        with self.lock:
+            entry = self.entries.get(key)
+            return (entry is not None
+                    and now - entry['last_seen'] <= self.window_for(key)
+                    and severity <= entry['severity'])
+
+    def bind(self, key, alert_id, now=None):
+        """为新建的警报登记ID（新警报本身记为第1次出现）"""
+        if now is None:
+            now = time.time()
+
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return
+            entry['alert_id'] = alert_id
+            # 创建期间并发到达的重复警报会在下次写回时计入
+            entry['flushed_count'] = 1
+            entry['flushed_at'] = now
+
+    def adopt(self, key, alert_id, persisted_count, severity, now=None):
+        """将本次出现合并到数据库中仍在窗口内的未关闭警报（如服务重启后）"""
+        if now is None:
+            now = time.time()
+
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return
+            entry['alert_id'] = alert_id
+            entry['count'] += persisted_count
+            entry['severity'] = max(entry['severity'], severity)
+            entry['flushed_count'] = persisted_count
+            entry['flushed_at'] = now
+
+    def discard(self, key):
+        """警报创建失败时移除占位记录"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry['alert_id'] is None:
+                del self.entries[key]
+
+    def release(self, alert_id):
+        """警报关闭（已解决/误报）后，后续同类警报将新建记录；尚未写回的重复次数留待下次写回"""
+        with self.lock:
+            for key in [k for k, e in self.entries.items() if e['alert_id'] == alert_id]:
+                entry = self.entries.pop(key)
+                if entry['count'] != entry['flushed_count']:
+                    self.expired_pending.append((entry['alert_id'], entry['count'], entry['last_seen']))
+
+    def take_pending_flushes(self, now=None, force=False):
+        """
+        取出需要写回数据库的重复次数
+
+        Returns:
+            [(alert_id, count, last_seen), ...]
+        """
+        if now is None:
+            now = time.time()
+
+        with self.lock:
+            pending = self.expired_pending
+            self.expired_pending = []
+            
+            for key, entry in list(self.entries.items()):
+                if entry['alert_id'] is None or entry['count'] == entry['flushed_count']:
+                    continue
+                if not force and now - entry['flushed_at'] < self.flush_interval:
+                    continue
+
+                pending.append((entry['alert_id'], entry['count'], entry['last_seen']))
+                entry['flushed_count'] = entry['count']
+                entry['flushed_at'] = now
+
+            # 清理已过期且已写回的记录
+            for key, entry in list(self.entries.items()):
+                if (now - entry['last_seen'] > self.window_for(key)
+                        and entry['count'] == entry['flushed_count']):
+                    del self.entries[key]
+
+        return pending
+
+    def get_stats(self):
+        """获取去重统计信息"""
+        with self.lock:
+            return {
+                'tracked': len(self.entries),
+                'suppressed': self.suppressed,
+                'escalated': self.escalated
+            }
+
+    def window_for(self, key):
+        """获取警报键对应的去重时间窗口"""
+        return self.type_windows.get(key[0], self.window)
+
+
+# 进程内共享的去重引擎（AlertService会被多个模块分别实例化）
+_deduplicator = None
+_deduplicator_lock = threading.Lock()
+
+def get_deduplicator():
+    """获取全局警报去重引擎"""
+    global _deduplicator
+    with _deduplicator_lock:
+        if _deduplicator is None:
+            _deduplicator = AlertDeduplicator()
+        return _deduplicator
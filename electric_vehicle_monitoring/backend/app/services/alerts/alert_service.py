@@ -1,14 +1,31 @@
 import logging
 import os
 import json
-import smtplib
-import requests
+import time
+import atexit
+import threading
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-from datetime import datetime
+from datetime import datetime, timedelta
 from app.models.alert import Alert, AlertType, AlertStatus
+from app.services.alerts.notification_dispatcher import get_dispatcher
+from app.services.alerts.alert_deduplicator import AlertDeduplicator, get_deduplicator
+from app.services.alerts.notification_channels import get_http_notifier, get_smtp_notifier
+from app.services.events.event_bus import get_event_bus, TOPIC_ALERTS
+from app.services.alerts.alert_stats import get_alert_stats
 from app import db
 
+# 未关闭的警报状态
+OPEN_STATUSES = [
+    AlertStatus.NEW.value,
+    AlertStatus.ACKNOWLEDGED.value,
+    AlertStatus.IN_PROGRESS.value
+]
+
+# 定期写回重复次数的后台线程（进程内共享）
+_flush_thread = None
+_flush_thread_lock = threading.Lock()
+
 class AlertService:
     """警报服务，用于创建和发送警报"""
     
@@ -18,6 +35,56 @@ class AlertService:
         # 加载通知配置
         self.notification_config = self._load_notification_config()
         
+        # 重复警报合并（进程内共享）
+        self.deduplicator = get_deduplicator()
+        
+        # 通知在后台线程中异步发送，创建警报不再等待网络请求
+        self.dispatcher = get_dispatcher()
+        
+        # 复用连接的通知通道
+        self.sms_notifier = get_http_notifier('sms')
+        self.webhook_notifier = get_http_notifier('webhook')
+        self.smtp_notifier = get_smtp_notifier()
+        
+        # 按类型/状态/日期的统计计数随警报变化增量维护（进程内共享）
+        self.stats = get_alert_stats()
+        
+        # 警报创建和状态变化推送给实时事件订阅者
+        self.event_bus = get_event_bus()
+        
+        # 待发送的邮件批次，发送任务开始前到达的邮件会合并到同一个SMTP会话中
+        self.email_batch = None
+        self.email_lock = threading.Lock()
+        
+    def init_app(self, app):
+        """
+        启动定期写回重复次数的后台线程（进程内只启动一次）
+        
+        重复警报停止后不会再有新的 create_alert 触发写回，由后台线程按写回间隔写入；
+        进程退出时写回剩余的次数。
+        """
+        global _flush_thread
+        with _flush_thread_lock:
+            if _flush_thread is not None:
+                return
+            _flush_thread = threading.Thread(
+                target=self._flush_loop, args=(app,), name="alert-occurrence-flush", daemon=True
+            )
+            _flush_thread.start()
+        atexit.register(self._flush_at_exit, app)
+        
+    def _flush_loop(self, app):
+        """定期写回重复次数（检查间隔为写回间隔的一半，写回延迟不超过1.5倍写回间隔）"""
+        interval = max(self.deduplicator.flush_interval / 2, 0.5)
+        while True:
+            time.sleep(interval)
+            with app.app_context():
+                self._flush_occurrences()
+                
+    def _flush_at_exit(self, app):
+        with app.app_context():
+            self._flush_occurrences(force=True)
+        
     def _load_notification_config(self):
         """加载通知配置"""
         # 默认配置
@@ -28,18 +95,21 @@ class AlertService:
                 'smtp_port': 587,
                 'username': 'alert@example.com',
                 'password': '',
-                'recipients': []
+                'recipients': [],
+                'timeout': 10
             },
             'sms': {
                 'enabled': False,
                 'api_key': '',
                 'api_url': 'https://api.sms.example.com/send',
-                'recipients': []
+                'recipients': [],
+                'timeout': 5
             },
             'webhook': {
                 'enabled': False,
                 'url': 'https://webhook.example.com/alert',
-                'headers': {'Content-Type': 'application/json'}
+                'headers': {'Content-Type': 'application/json'},
+                'timeout': 5
             },
             'push': {
                 'enabled': False,
@@ -66,20 +136,30 @@ class AlertService:
         return default_config
         
     def create_alert(self, alert_type, message, source_type, source_id, details=None, location=None, image_url=None, severity=3):
-        """创建新警报"""
+        """创建新警报（时间窗口内的重复警报会合并到已有的未关闭警报上）"""
+        alert_type = self._normalize_alert_type(alert_type)
+        key = (alert_type, source_type, source_id)
+        
+        # 写回之前合并的重复次数
+        self._flush_occurrences()
+        
+        action, entry = self.deduplicator.observe(key, severity)
+        if action == AlertDeduplicator.DUPLICATE:
+            return entry['alert_id']
+        if action == AlertDeduplicator.ESCALATE:
+            return self._escalate_alert(entry['alert_id'], message, details, image_url, severity)
+        
         try:
-            # 检查AlertType
-            try:
-                if isinstance(alert_type, str):
-                    # 尝试将字符串转换为AlertType
-                    alert_type = AlertType[alert_type].value
-                elif isinstance(alert_type, AlertType):
-                    alert_type = alert_type.value
-            except (KeyError, ValueError):
-                # 如果不是有效的AlertType，直接使用字符串
-                pass
+            # 服务重启后内存中没有记录，检查数据库中是否有窗口内的未关闭警报
+            existing = self._find_open_alert(key)
+            if existing is not None:
+                self.deduplicator.adopt(key, existing.id, existing.occurrence_count or 1, existing.severity)
+                if severity > existing.severity:
+                    return self._escalate_alert(existing.id, message, details, image_url, severity)
+                return existing.id
                 
             # 创建警报记录
+            now = datetime.utcnow()
             alert = Alert(
                 alert_type=alert_type,
                 status=AlertStatus.NEW.value,
@@ -90,14 +170,19 @@ class AlertService:
                 details=details,
                 severity=severity,
                 image_url=image_url,
-                created_at=datetime.utcnow(),
-                updated_at=datetime.utcnow()
+                occurrence_count=1,
+                last_occurrence_at=now,
+                created_at=now,
+                updated_at=now
             )
             
             db.session.add(alert)
+            self.stats.record_created(alert)
             db.session.commit()
+            self.deduplicator.bind(key, alert.id)
             
             self.logger.info(f"创建警报: {alert_type} - {message} (ID: {alert.id})")
+            self.publish_alert_event('alert_created', alert)
             
             # 发送通知
             self._send_notifications(alert)
@@ -107,8 +192,83 @@ class AlertService:
         except Exception as e:
             self.logger.error(f"创建警报失败: {e}")
             db.session.rollback()
+            self.deduplicator.discard(key)
+            return None
+    
+    def publish_alert_event(self, event_type, alert):
+        """向订阅者推送警报事件（alert_created / alert_updated）"""
+        if self.event_bus.has_subscribers(TOPIC_ALERTS):
+            self.event_bus.publish(TOPIC_ALERTS, event_type, alert.to_dict())
+    
+    def is_duplicate(self, alert_type, source_type, source_id, severity=3):
+        """判断警报是否会被合并到已有警报（不计数），用于跳过保存截图等开销"""
+        key = (self._normalize_alert_type(alert_type), source_type, source_id)
+        return self.deduplicator.peek(key, severity)
+    
+    def _normalize_alert_type(self, alert_type):
+        """将警报类型统一转换为存储值"""
+        try:
+            if isinstance(alert_type, str):
+                # 尝试将字符串转换为AlertType
+                return AlertType[alert_type].value
+            elif isinstance(alert_type, AlertType):
+                return alert_type.value
+        except (KeyError, ValueError):
+            # 如果不是有效的AlertType，直接使用字符串
+            pass
+        return alert_type
+    
+    def _find_open_alert(self, key):
+        """查找时间窗口内同一来源的未关闭警报"""
+        alert_type, source_type, source_id = key
+        since = datetime.utcnow() - timedelta(seconds=self.deduplicator.window_for(key))
+        return Alert.query.filter(
+            Alert.alert_type == alert_type,
+            Alert.source_type == source_type,
+            Alert.source_id == source_id,
+            Alert.status.in_(OPEN_STATUSES),
+            Alert.last_occurrence_at >= since
+        ).order_by(Alert.created_at.desc()).first()
+    
+    def _escalate_alert(self, alert_id, message, details, image_url, severity):
+        """严重程度升高时升级已有警报并重新发送通知"""
+        if alert_id is None:
+            # 原警报仍在创建中，升级会在其创建完成后由后续警报触发
+            return None
+            
+        try:
+            alert = Alert.query.get(alert_id)
+            if not alert:
+                return None
+                
+            previous = alert.severity
+            alert.severity = severity
+            alert.message = message
+            if details is not None:
+                alert.details = details
+            if image_url:
+                alert.image_url = image_url
+            alert.last_occurrence_at = datetime.utcnow()
+            alert.updated_at = datetime.utcnow()
+            db.session.commit()
+            
+            self.logger.warning(f"警报升级: {alert_id} 严重程度 {previous} -> {severity}")
+            self.publish_alert_event('alert_updated', alert)
+            
+            # 严重程度升高后可能需要通过更多渠道通知
+            self._send_notifications(alert)
+            
+            return alert.id
+            
+        except Exception as e:
+            self.logger.error(f"升级警报失败: {e}")
+            db.session.rollback()
             return None
     
+    def _flush_occurrences(self, force=False):
+        """将合并的重复次数批量写回数据库"""
+        flush_occurrences(force=force)
+    
     def update_alert_status(self, alert_id, status, handled_by=None, handler_notes=None):
         """更新警报状态"""
         try:
@@ -129,6 +289,7 @@ class AlertService:
                 pass
                 
             # 更新状态
+            self.stats.record_status_change(alert.status, status)
             alert.status = status
             
             # 更新处理信息
@@ -145,7 +306,13 @@ class AlertService:
             
             db.session.commit()
             
+            # 警报关闭后，后续同类警报将重新创建；关闭前合并的重复次数立即写回
+            if status not in OPEN_STATUSES:
+                self.deduplicator.release(alert_id)
+                self._flush_occurrences()
+            
             self.logger.info(f"更新警报状态: {alert_id} -> {status}")
+            self.publish_alert_event('alert_updated', alert)
             
             return True
             
@@ -157,11 +324,7 @@ class AlertService:
     def get_active_alerts(self):
         """获取所有活跃警报"""
         return Alert.query.filter(
-            Alert.status.in_([
-                AlertStatus.NEW.value, 
-                AlertStatus.ACKNOWLEDGED.value,
-                AlertStatus.IN_PROGRESS.value
-            ])
+            Alert.status.in_(OPEN_STATUSES)
         ).order_by(Alert.created_at.desc()).all()
     
     def get_alerts_by_type(self, alert_type):
@@ -176,139 +339,169 @@ class AlertService:
         return query.order_by(Alert.created_at.desc()).all()
     
     def _send_notifications(self, alert):
-        """发送警报通知"""
+        """将警报通知提交到后台分发队列"""
         # 根据警报严重程度决定通知方式
         severity = alert.severity
+        payload = self._notification_payload(alert)
         
         # 发送邮件通知
         if severity >= 3 and self.notification_config['email']['enabled']:
-            self._send_email_notification(alert)
+            self._queue_email_notification(payload)
             
-        # 发送短信通知
+        # 发送短信通知（每个收件人单独重试，避免重复发送给已成功的收件人）
         if severity >= 4 and self.notification_config['sms']['enabled']:
-            self._send_sms_notification(alert)
+            recipients = self.notification_config['sms']['recipients']
+            if not recipients:
+                self.logger.warning("无法发送短信通知: 没有收件人")
+            for recipient in recipients:
+                self.dispatcher.submit('sms', self._send_sms_notification, payload, recipient)
             
         # 发送Webhook通知
         if self.notification_config['webhook']['enabled']:
-            self._send_webhook_notification(alert)
+            self.dispatcher.submit('webhook', self._send_webhook_notification, payload)
             
         # 发送推送通知
         if severity >= 3 and self.notification_config['push']['enabled']:
-            self._send_push_notification(alert)
+            self.dispatcher.submit('push', self._send_push_notification, payload)
     
-    def _send_email_notification(self, alert):
-        """发送邮件通知"""
-        try:
-            config = self.notification_config['email']
-            recipients = config['recipients']
-            
-            if not recipients:
-                self.logger.warning("无法发送邮件通知: 没有收件人")
-                return
-                
-            # 创建邮件
-            msg = MIMEMultipart()
-            msg['From'] = config['username']
-            msg['To'] = ", ".join(recipients)
-            msg['Subject'] = f"[警报] {alert.alert_type}: {alert.message}"
-            
-            # 邮件内容
-            body = f"""
-            <html>
-            <body>
-                <h2>电动车充电安全监控系统警报</h2>
-                <p><strong>警报类型:</strong> {alert.alert_type}</p>
-                <p><strong>警报消息:</strong> {alert.message}</p>
-                <p><strong>时间:</strong> {alert.created_at.strftime('%Y-%m-%d %H:%M:%S')}</p>
-                <p><strong>来源:</strong> {alert.source_type} ({alert.source_id})</p>
-                <p><strong>位置:</strong> {alert.location or '未知'}</p>
-                <p><strong>严重程度:</strong> {alert.severity}/5</p>
-                <p><strong>状态:</strong> {alert.status}</p>
-                <p>请尽快登录系统查看详情并处理。</p>
-            </body>
-            </html>
-            """
-            
-            msg.attach(MIMEText(body, 'html'))
-            
-            # 连接SMTP服务器并发送
-            server = smtplib.SMTP(config['smtp_server'], config['smtp_port'])
-            server.starttls()
-            server.login(config['username'], config['password'])
-            server.send_message(msg)
-            server.quit()
-            
-            self.logger.info(f"已发送邮件通知: {', '.join(recipients)}")
-            
-        except Exception as e:
-            self.logger.error(f"发送邮件通知失败: {e}")
+    def _notification_payload(self, alert):
+        """提取通知所需的警报字段，避免在后台线程中访问ORM对象"""
+        return {
+            'id': alert.id,
+            'alert_type': alert.alert_type,
+            'message': alert.message,
+            'source_type': alert.source_type,
+            'source_id': alert.source_id,
+            'location': alert.location,
+            'severity': alert.severity,
+            'status': alert.status,
+            'created_at': alert.created_at,
+            'details': alert.details
+        }
     
-    def _send_sms_notification(self, alert):
-        """发送短信通知"""
-        try:
-            config = self.notification_config['sms']
-            recipients = config['recipients']
-            
-            if not recipients:
-                self.logger.warning("无法发送短信通知: 没有收件人")
-                return
+    def _queue_email_notification(self, payload):
+        """将邮件加入待发送批次，批次为空时提交一个发送任务"""
+        with self.email_lock:
+            if self.email_batch is None:
+                batch = []
+                if not self.dispatcher.submit('email', self._send_email_batch, batch):
+                    return
+                self.email_batch = batch
+            self.email_batch.append(payload)
+    
+    def _send_email_batch(self, batch):
+        """在同一个SMTP会话中发送一批邮件通知（失败时抛出异常，由分发器重试）"""
+        # 发送开始后不再向该批次追加邮件
+        with self.email_lock:
+            if self.email_batch is batch:
+                self.email_batch = None
                 
-            # 短信内容
-            message = f"警报: {alert.alert_type} - {alert.message} (严重程度: {alert.severity}/5)"
+        config = self.notification_config['email']
+        recipients = config['recipients']
+        
+        if not recipients:
+            self.logger.warning("无法发送邮件通知: 没有收件人")
+            return
+        
+        # 已构建的邮件在重试时保留，发送成功的邮件会从列表中移除
+        for i, alert in enumerate(batch):
+            if isinstance(alert, dict):
+                batch[i] = self._build_email_message(alert, config)
+        
+        self.smtp_notifier.send_messages(config, batch)
+        
+        self.logger.info(f"已发送邮件通知: {', '.join(recipients)}")
+    
+    def _build_email_message(self, alert, config):
+        """构建警报邮件"""
+        recipients = config['recipients']
+        
+        # 创建邮件
+        msg = MIMEMultipart()
+        msg['From'] = config['username']
+        msg['To'] = ", ".join(recipients)
+        msg['Subject'] = f"[警报] {alert['alert_type']}: {alert['message']}"
+        
+        # 邮件内容
+        body = f"""
+        <html>
+        <body>
+            <h2>电动车充电安全监控系统警报</h2>
+            <p><strong>警报类型:</strong> {alert['alert_type']}</p>
+            <p><strong>警报消息:</strong> {alert['message']}</p>
+            <p><strong>时间:</strong> {alert['created_at'].strftime('%Y-%m-%d %H:%M:%S')}</p>
+            <p><strong>来源:</strong> {alert['source_type']} ({alert['source_id']})</p>
+            <p><strong>位置:</strong> {alert['location'] or '未知'}</p>
+            <p><strong>严重程度:</strong> {alert['severity']}/5</p>
+            <p><strong>状态:</strong> {alert['status']}</p>
+            <p>请尽快登录系统查看详情并处理。</p>
+        </body>
+        </html>
+        """
+        
+        msg.attach(MIMEText(body, 'html'))
+        return msg
+    
+    def _send_sms_notification(self, alert, recipient):
+        """发送短信通知（失败时抛出异常，由分发器重试）"""
+        config = self.notification_config['sms']
+        
+        # 短信内容
+        message = f"警报: {alert['alert_type']} - {alert['message']} (严重程度: {alert['severity']}/5)"
+        
+        # 调用SMS API
+        data = {
+            'api_key': config['api_key'],
+            'to': recipient,
+            'message': message
+        }
+        
+        response = self.sms_notifier.post(config['api_url'], json=data, timeout=config['timeout'])
+        if response.status_code != 200:
+            raise RuntimeError(f"发送短信通知失败: {recipient}, 状态码: {response.status_code}")
             
-            # 调用SMS API
-            for recipient in recipients:
-                data = {
-                    'api_key': config['api_key'],
-                    'to': recipient,
-                    'message': message
-                }
-                
-                response = requests.post(config['api_url'], json=data)
-                if response.status_code == 200:
-                    self.logger.info(f"已发送短信通知: {recipient}")
-                else:
-                    self.logger.warning(f"发送短信通知失败: {recipient}, 状态码: {response.status_code}")
-                    
-        except Exception as e:
-            self.logger.error(f"发送短信通知失败: {e}")
+        self.logger.info(f"已发送短信通知: {recipient}")
     
     def _send_webhook_notification(self, alert):
-        """发送Webhook通知"""
-        try:
-            config = self.notification_config['webhook']
-            
-            # 准备数据
-            data = {
-                'id': alert.id,
-                'alert_type': alert.alert_type,
-                'message': alert.message,
-                'source_type': alert.source_type,
-                'source_id': alert.source_id,
-                'location': alert.location,
-                'severity': alert.severity,
-                'status': alert.status,
-                'created_at': alert.created_at.isoformat(),
-                'details': alert.details
-            }
-            
-            # 发送请求
-            response = requests.post(
-                config['url'], 
-                json=data,
-                headers=config['headers']
-            )
+        """发送Webhook通知（失败时抛出异常，由分发器重试）"""
+        config = self.notification_config['webhook']
+        
+        # 准备数据
+        data = dict(alert, created_at=alert['created_at'].isoformat())
+        
+        # 发送请求
+        response = self.webhook_notifier.post(
+            config['url'],
+            json=data,
+            headers=config['headers'],
+            timeout=config['timeout']
+        )
+        
+        if response.status_code not in [200, 201, 202]:
+            raise RuntimeError(f"发送Webhook通知失败: 状态码: {response.status_code}")
             
-            if response.status_code in [200, 201, 202]:
-                self.logger.info(f"已发送Webhook通知: {config['url']}")
-            else:
-                self.logger.warning(f"发送Webhook通知失败: 状态码: {response.status_code}")
-                
-        except Exception as e:
-            self.logger.error(f"发送Webhook通知失败: {e}")
+        self.logger.info(f"已发送Webhook通知: {config['url']}")
     
     def _send_push_notification(self, alert):
         """发送推送通知"""
         # 这里可以集成第三方推送服务，如Firebase、极光推送等
         # 具体实现根据选用的推送服务而定
-        self.logger.info(f"推送通知功能待实现") 
\ No newline at end of file
+        self.logger.info(f"推送通知功能待实现")
+
+
+def flush_occurrences(force=False):
+    """将去重引擎中合并的重复次数批量写回数据库（需在应用上下文中调用）"""
+    pending = get_deduplicator().take_pending_flushes(force=force)
+    if not pending:
+        return
+        
+    try:
+        for alert_id, count, last_seen in pending:
+            Alert.query.filter_by(id=alert_id).update({
+                'occurrence_count': count,
+                'last_occurrence_at': datetime.utcfromtimestamp(last_seen)
+            }, synchronize_session=False)
+        db.session.commit()
+    except Exception as e:
+        logging.getLogger("AlertService").error(f"写回警报重复次数失败: {e}")
+        db.session.rollback()
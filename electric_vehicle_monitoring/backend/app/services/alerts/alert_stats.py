@@ -0,0 +1,227 @@
+import os
+import heapq
+import logging
+import threading
+from collections import Counter
+from datetime import datetime
+from sqlalchemy import event
+from sqlalchemy.exc import IntegrityError
+from app.models.alert import Alert, AlertStat
+from app import db
+
+# 统计维度
+DIMENSIONS = ('type', 'status', 'date')
+
+class AlertStatsService:
+    """
+    警报统计的增量维护
+
+    警报创建和状态变化时，在同一事务中累加 alert_stats 表的计数，
+    事务提交后再更新内存中的计数，/alerts/stats 直接读取内存，不再对 alerts 表做聚合查询。
+    后台任务定期用聚合查询重新核对计数，修正多进程并发等原因造成的偏差。
+    """
+
+    def __init__(self, reconcile_interval=None):
+        self.logger = logging.getLogger("AlertStatsService")
+
+        # 核对计数的间隔（秒）
+        if reconcile_interval is None:
+            reconcile_interval = float(os.environ.get("ALERT_STATS_RECONCILE_INTERVAL", 3600))
+        self.reconcile_interval = reconcile_interval
+
+        self.counters = {dimension: Counter() for dimension in DIMENSIONS}
+        self.loaded = False
+        self.lock = threading.Lock()
+
+        self.app = None
+        self.thread = None
+        self.stop_event = threading.Event()
+        self.last_reconciled_at = None
+        self.last_corrections = 0
+
+        # 计数变化随会话事务提交或回滚
+        event.listen(db.session, 'after_commit', self._after_commit)
+        event.listen(db.session, 'after_soft_rollback', self._after_rollback)
+
+    def init_app(self, app):
+        """绑定Flask应用，加载计数并启动定期核对线程（需在建表之后调用）"""
+        self.app = app
+        with app.app_context():
+            try:
+                self._ensure_loaded()
+            except Exception as e:
+                db.session.rollback()
+                self.logger.error(f"加载警报统计失败: {e}")
+
+        if self.thread is not None or self.reconcile_interval <= 0:
+            return
+        self.thread = threading.Thread(target=self._reconcile_loop, name="alert-stats-reconcile", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def record_created(self, alert):
+        """记录新建的警报（在提交警报的事务中调用）"""
+        self._record({
+            ('type', alert.alert_type): 1,
+            ('status', alert.status): 1,
+            ('date', alert.created_at.date().isoformat()): 1
+        })
+
+    def record_status_change(self, old_status, new_status):
+        """记录警报状态变化（在提交状态的事务中调用）"""
+        if old_status == new_status:
+            return
+        self._record({
+            ('status', old_status): -1,
+            ('status', new_status): 1
+        })
+
+    def _record(self, deltas):
+        """累加统计表中的计数，并登记待提交后更新内存的增量"""
+        # 统计表为空时尚未由警报表建立计数，此时只写入部分计数会使之后的加载误以为计数完整；
+        # 保持为空，首次加载时会从警报表（包括本次提交的警报）重建
+        if not self.loaded and db.session.query(AlertStat.id).limit(1).scalar() is None:
+            return
+
+        for (dimension, key), delta in deltas.items():
+            if self._increment(dimension, key, delta):
+                continue
+            try:
+                with db.session.begin_nested():
+                    db.session.add(AlertStat(dimension=dimension, key=key, count=delta))
+            except IntegrityError:
+                # 其他线程或进程同时插入了同一计数，改为累加
+                self._increment(dimension, key, delta)
+
+        pending = db.session.info.setdefault('alert_stat_deltas', [])
+        pending.append(deltas)
+
+    @staticmethod
+    def _increment(dimension, key, delta):
+        """累加已存在的计数，返回是否存在该计数"""
+        return AlertStat.query.filter_by(dimension=dimension, key=key).update(
+            {'count': AlertStat.count + delta}, synchronize_session=False
+        ) > 0
+
+    def _after_commit(self, session):
+        pending = session.info.pop('alert_stat_deltas', None)
+        if not pending or not self.loaded:
+            return
+        with self.lock:
+            for deltas in pending:
+                for (dimension, key), delta in deltas.items():
+                    self.counters[dimension][key] += delta
+
+    def _after_rollback(self, session, previous_transaction):
+        # 只在最外层事务回滚时丢弃增量；保存点（如插入计数冲突）及其中的flush回滚时
+        # 外层事务仍然有效，已登记的增量会随外层事务提交
+        if previous_transaction.parent is not None:
+            return
+        session.info.pop('alert_stat_deltas', None)
+
+    def get_stats(self, days=7):
+        """
+        获取警报统计（需在应用上下文中调用）
+
+        Returns:
+            {'by_type': {...}, 'by_status': {...}, 'by_date': {最近days天: 数量}}
+        """
+        self._ensure_loaded()
+
+        with self.lock:
+            dates = heapq.nlargest(days, (key for key, count in self.counters['date'].items() if count > 0))
+            return {
+                'by_type': {key: count for key, count in self.counters['type'].items() if count > 0},
+                'by_status': {key: count for key, count in self.counters['status'].items() if count > 0},
+                'by_date': {key: self.counters['date'][key] for key in dates}
+            }
+
+    def _ensure_loaded(self):
+        """首次访问时从统计表加载计数，统计表为空时由警报表重建"""
+        if self.loaded:
+            return
+
+        rows = AlertStat.query.all()
+        if not rows and db.session.query(Alert.id).limit(1).scalar() is not None:
+            self.reconcile()
+            return
+
+        with self.lock:
+            for dimension in DIMENSIONS:
+                self.counters[dimension].clear()
+            for row in rows:
+                self.counters[row.dimension][row.key] = row.count
+            self.loaded = True
+
+    def reconcile(self):
+        """
+        用聚合查询重新计算计数，修正统计表和内存中的偏差
+
+        Returns:
+            修正的计数数量
+        """
+        actual = {
+            'type': Counter(dict(db.session.query(Alert.alert_type, db.func.count(Alert.id)).group_by(Alert.alert_type))),
+            'status': Counter(dict(db.session.query(Alert.status, db.func.count(Alert.id)).group_by(Alert.status))),
+            'date': Counter({
+                str(date): count
+                for date, count in db.session.query(
+                    db.func.date(Alert.created_at), db.func.count(Alert.id)
+                ).group_by(db.func.date(Alert.created_at))
+            })
+        }
+
+        corrections = 0
+        try:
+            stored = {(row.dimension, row.key): row for row in AlertStat.query.all()}
+            for dimension in DIMENSIONS:
+                for key, count in actual[dimension].items():
+                    row = stored.pop((dimension, key), None)
+                    if row is None:
+                        db.session.add(AlertStat(dimension=dimension, key=key, count=count))
+                        corrections += 1
+                    elif row.count != count:
+                        row.count = count
+                        corrections += 1
+            for row in stored.values():
+                if row.count != 0:
+                    corrections += 1
+                db.session.delete(row)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+        with self.lock:
+            self.counters = actual
+            self.loaded = True
+
+        self.last_corrections = corrections
+        self.last_reconciled_at = datetime.utcnow()
+        if corrections:
+            self.logger.warning(f"警报统计核对修正了 {corrections} 个计数")
+        return corrections
+
+    def _reconcile_loop(self):
+        """定期核对计数"""
+        while not self.stop_event.wait(self.reconcile_interval):
+            try:
+                with self.app.app_context():
+                    self.reconcile()
+            except Exception as e:
+                self.logger.error(f"警报统计核对失败: {e}")
+
+
+# 进程内共享的统计服务（AlertService会被多个模块分别实例化）
+_alert_stats = None
+_alert_stats_lock = threading.Lock()
+
+def get_alert_stats():
+    """获取全局警报统计服务"""
+    global _alert_stats
+    with _alert_stats_lock:
+        if _alert_stats is None:
+            _alert_stats = AlertStatsService()
+        return _alert_stats
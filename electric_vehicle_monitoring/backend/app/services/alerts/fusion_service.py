@@ -0,0 +1,219 @@
+import os
+import json
+import time
+import logging
+import threading
+from collections import deque
+from datetime import datetime
+from app.services.alerts.alert_service import AlertService
+
+# 各信号对火灾风险的权重，信号名称为 "来源类型:类别"
+SIGNAL_WEIGHTS = {
+    'camera:fire': 0.7,
+    'camera:smoke': 0.5,
+    'sensor:smoke': 0.5,
+    'sensor:temperature': 0.4,
+    'sensor:current': 0.3,
+    'sensor:power': 0.2,
+    'sensor:voltage': 0.2
+}
+
+class FusionService:
+    """
+    多源融合风险评估
+
+    摄像头检测和传感器警报作为事件送入本服务，按位置保留最近一段时间窗口内的事件。
+    每种信号用单调队列维护窗口内置信度最高的一次（每个事件摊销O(1)），按 noisy-OR 合并为综合风险评分：
+        score = 1 - Π(1 - weight × confidence)
+    至少有两种不同信号且评分达到阈值时，为该位置触发一条融合警报。
+    全部在内存中以事件驱动方式计算，不查询数据库。
+    """
+
+    def __init__(self):
+        self.logger = logging.getLogger("FusionService")
+
+        # 事件时间窗口（秒）
+        self.window = float(os.environ.get("FUSION_WINDOW_SECONDS", 120))
+        # 触发融合警报的综合评分
+        self.alert_score = float(os.environ.get("FUSION_ALERT_SCORE", 0.6))
+        # 评分达到该值时按最高严重程度触发
+        self.critical_score = float(os.environ.get("FUSION_CRITICAL_SCORE", 0.85))
+
+        # 来源ID到位置的映射，如 {"camera_1": "A区3号桩", "charger_03": "A区3号桩"}
+        self.locations = self._load_locations()
+
+        # {location: {signal: deque[(monotonic, confidence, source_id, timestamp)]}}，队列内置信度递减
+        self.events = {}
+        self.emitted = {}  # {location: (monotonic, 已触发的信号集合)}
+        self.lock = threading.Lock()
+
+        self.alert_service = AlertService()
+
+        # 统计
+        self.stats = {
+            'events': 0,
+            'alerts': 0,
+            'last_latency_ms': 0.0,
+            'max_latency_ms': 0.0
+        }
+
+    def _load_locations(self):
+        """加载来源ID到位置的映射配置"""
+        config_path = os.environ.get("FUSION_LOCATION_MAP", "config/fusion_locations.json")
+        try:
+            if os.path.exists(config_path):
+                with open(config_path, 'r') as f:
+                    locations = json.load(f)
+                self.logger.info(f"从配置文件加载了 {len(locations)} 个来源位置: {config_path}")
+                return locations
+        except Exception as e:
+            self.logger.error(f"加载来源位置配置失败: {e}")
+        return {}
+
+    def set_location(self, source_id, location):
+        """登记来源所在位置（如摄像头配置中的位置）"""
+        with self.lock:
+            if location:
+                self.locations[source_id] = location
+            else:
+                self.locations.pop(source_id, None)
+
+    def resolve_location(self, source_id, location=None):
+        """确定事件所属位置：事件自带位置 > 映射配置 > 来源ID本身"""
+        return location or self.locations.get(source_id) or source_id
+
+    def observe(self, signal, source_id, confidence=1.0, location=None):
+        """
+        送入一个事件并重新计算该位置的风险评分
+
+        Args:
+            signal: 信号名称，如 camera:fire、sensor:temperature
+            source_id: 事件来源ID
+            confidence: 置信度 (0-1)
+            location: 事件位置（可选）
+
+        Returns:
+            该位置当前的综合评分
+        """
+        weight = SIGNAL_WEIGHTS.get(signal)
+        if not weight:
+            return None
+
+        started = time.perf_counter()
+        now = time.monotonic()
+        location = self.resolve_location(source_id, location)
+
+        confidence = min(max(float(confidence), 0.0), 1.0)
+        with self.lock:
+            events = self.events.setdefault(location, {})
+            queue = events.setdefault(signal, deque())
+            # 更新且置信度不低于队尾的事件使队尾事件不再可能成为窗口内最大值
+            while queue and queue[-1][1] <= confidence:
+                queue.pop()
+            queue.append((now, confidence, source_id, datetime.utcnow()))
+            self._expire(events, now)
+
+            score, signals = self._score(events)
+            emit = self._should_emit(location, now, score, signals)
+            if emit:
+                self.emitted[location] = (now, set(signals))
+            self.stats['events'] += 1
+
+        if emit:
+            self._raise_alert(location, score, signals)
+
+        latency = (time.perf_counter() - started) * 1000
+        with self.lock:
+            self.stats['last_latency_ms'] = latency
+            self.stats['max_latency_ms'] = max(self.stats['max_latency_ms'], latency)
+        return score
+
+    def _expire(self, events, now):
+        for signal in list(events):
+            queue = events[signal]
+            while queue and queue[0][0] < now - self.window:
+                queue.popleft()
+            if not queue:
+                del events[signal]
+
+    def _score(self, events):
+        """每种信号取置信度最高的事件（队首），按 noisy-OR 合并"""
+        signals = {signal: queue[0][1:] for signal, queue in events.items()}  # {signal: (confidence, source_id, timestamp)}
+
+        remaining = 1.0
+        for signal, (confidence, _, _) in signals.items():
+            remaining *= 1 - SIGNAL_WEIGHTS[signal] * confidence
+        return 1 - remaining, signals
+
+    def _should_emit(self, location, now, score, signals):
+        """评分达到阈值且至少两种信号时触发；窗口内只在出现新信号时再次触发"""
+        if score < self.alert_score or len(signals) < 2:
+            return False
+
+        last = self.emitted.get(location)
+        if last is None or now - last[0] > self.window:
+            return True
+        return not set(signals) <= last[1]
+
+    def _raise_alert(self, location, score, signals):
+        """触发融合警报"""
+        try:
+            self.alert_service.create_alert(
+                alert_type='FIRE',
+                message=f"多源融合判定火灾风险: {location}（风险评分 {score:.2f}）",
+                source_type="fusion",
+                source_id=location,
+                location=location,
+                details={
+                    'score': round(score, 4),
+                    'signals': {
+                        signal: {
+                            'confidence': confidence,
+                            'source_id': source_id,
+                            'timestamp': timestamp.isoformat()
+                        }
+                        for signal, (confidence, source_id, timestamp) in signals.items()
+                    }
+                },
+                severity=5 if score >= self.critical_score else 4
+            )
+            with self.lock:
+                self.stats['alerts'] += 1
+            self.logger.warning(f"融合警报 ({location}): 评分 {score:.2f}, 信号 {sorted(signals)}")
+        except Exception as e:
+            self.logger.error(f"触发融合警报失败: {e}")
+
+    def get_scores(self):
+        """获取各位置当前窗口内的综合评分"""
+        now = time.monotonic()
+        result = {}
+        with self.lock:
+            for location in list(self.events):
+                events = self.events[location]
+                self._expire(events, now)
+                if not events:
+                    del self.events[location]
+                    continue
+                score, signals = self._score(events)
+                result[location] = {
+                    'score': round(score, 4),
+                    'signals': {signal: confidence for signal, (confidence, _, _) in signals.items()}
+                }
+        return result
+
+    def get_stats(self):
+        with self.lock:
+            return dict(self.stats, locations=len(self.events))
+
+
+# 进程内共享的融合服务（摄像头检测和传感器管理分别送入事件）
+_fusion_service = None
+_fusion_service_lock = threading.Lock()
+
+def get_fusion_service():
+    """获取全局融合服务"""
+    global _fusion_service
+    with _fusion_service_lock:
+        if _fusion_service is None:
+            _fusion_service = FusionService()
+        return _fusion_service
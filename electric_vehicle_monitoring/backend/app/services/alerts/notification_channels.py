@@ -0,0 +1,135 @@
+import os
+import time
+import atexit
+import smtplib
+import logging
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+
+class HttpNotifier:
+    """HTTP通知通道，使用带连接池的持久会话，复用TCP/TLS连接"""
+
+    def __init__(self, channel, pool_size=None):
+        self.channel = channel
+        self.logger = logging.getLogger(f"HttpNotifier-{channel}")
+
+        if pool_size is None:
+            pool_size = int(os.environ.get("NOTIFY_HTTP_POOL_SIZE", os.environ.get("NOTIFY_WORKERS", 4)))
+
+        # 重试由通知分发器负责，这里不做自动重试
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=0)
+        self.session = requests.Session()
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def post(self, url, json=None, headers=None, timeout=None):
+        """通过持久会话发送POST请求"""
+        return self.session.post(url, json=json, headers=headers, timeout=timeout)
+
+    def close(self):
+        self.session.close()
+
+
+class SmtpNotifier:
+    """SMTP通知通道，复用已登录的连接发送多封邮件，发送前检查连接是否可用"""
+
+    def __init__(self, idle_timeout=None):
+        self.logger = logging.getLogger("SmtpNotifier")
+
+        # 超过该时间未使用的连接会被关闭后重建
+        if idle_timeout is None:
+            idle_timeout = float(os.environ.get("SMTP_IDLE_TIMEOUT", 60))
+        self.idle_timeout = idle_timeout
+
+        self.server = None
+        self.server_key = None  # 建立连接所用的 (服务器, 端口, 用户名)
+        self.last_used = 0
+        self.lock = threading.Lock()
+
+    def send_messages(self, config, messages):
+        """
+        在同一个SMTP会话中依次发送邮件
+
+        发送成功的邮件会从列表中移除，失败时抛出异常，重试时只发送剩余部分
+        """
+        with self.lock:
+            server = self._get_connection(config)
+            try:
+                while messages:
+                    server.send_message(messages[0])
+                    messages.pop(0)
+            except (smtplib.SMTPException, OSError):
+                self._close()
+                raise
+            self.last_used = time.time()
+
+    def close(self):
+        with self.lock:
+            self._close()
+
+    def _get_connection(self, config):
+        """获取可用连接：复用健康的已有连接，否则重新连接并登录（需持有锁）"""
+        key = (config['smtp_server'], config['smtp_port'], config['username'])
+        if self.server is not None:
+            if self.server_key == key and time.time() - self.last_used < self.idle_timeout and self._is_alive():
+                return self.server
+            self._close()
+
+        server = smtplib.SMTP(config['smtp_server'], config['smtp_port'], timeout=config['timeout'])
+        try:
+            server.starttls()
+            server.login(config['username'], config['password'])
+        except Exception:
+            server.close()
+            raise
+
+        self.server = server
+        self.server_key = key
+        self.last_used = time.time()
+        self.logger.info(f"已建立SMTP连接: {config['smtp_server']}:{config['smtp_port']}")
+        return server
+
+    def _is_alive(self):
+        """通过NOOP命令检查连接是否仍然可用（需持有锁）"""
+        try:
+            return self.server.noop()[0] == 250
+        except (smtplib.SMTPException, OSError):
+            return False
+
+    def _close(self):
+        """关闭当前连接（需持有锁）"""
+        if self.server is None:
+            return
+        try:
+            self.server.quit()
+        except (smtplib.SMTPException, OSError):
+            self.server.close()
+        self.server = None
+        self.server_key = None
+
+
+# 进程内共享的通知通道，连接在多个AlertService实例间复用
+_http_notifiers = {}
+_smtp_notifier = None
+_channels_lock = threading.Lock()
+
+def get_http_notifier(channel):
+    """获取指定渠道（sms / webhook）的HTTP通知通道"""
+    with _channels_lock:
+        notifier = _http_notifiers.get(channel)
+        if notifier is None:
+            notifier = HttpNotifier(channel)
+            _http_notifiers[channel] = notifier
+            atexit.register(notifier.close)
+        return notifier
+
+
+def get_smtp_notifier():
+    """获取共享的SMTP通知通道"""
+    global _smtp_notifier
+    with _channels_lock:
+        if _smtp_notifier is None:
+            _smtp_notifier = SmtpNotifier()
+            atexit.register(_smtp_notifier.close)
+        return _smtp_notifier
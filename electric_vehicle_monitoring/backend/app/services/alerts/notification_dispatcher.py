@@ -0,0 +1,123 @@
+import os
+import time
+import atexit
+import queue
+import logging
+import threading
+
+class NotificationDispatcher:
+    """异步通知分发服务，使用有界队列和工作线程池发送通知，失败时按指数退避重试"""
+
+    def __init__(self, num_workers=None, queue_size=None, max_retries=None, retry_backoff=None):
+        self.logger = logging.getLogger("NotificationDispatcher")
+
+        if num_workers is None:
+            num_workers = int(os.environ.get("NOTIFY_WORKERS", 4))
+        if queue_size is None:
+            queue_size = int(os.environ.get("NOTIFY_QUEUE_SIZE", 1000))
+        if max_retries is None:
+            max_retries = int(os.environ.get("NOTIFY_MAX_RETRIES", 3))
+        if retry_backoff is None:
+            retry_backoff = float(os.environ.get("NOTIFY_RETRY_BACKOFF", 2))
+
+        self.num_workers = num_workers
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+
+        # 通知任务队列: (channel, send_func, args)
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.workers = []
+        self.is_running = False
+
+        # 统计信息
+        self.stats = {'queued': 0, 'sent': 0, 'retried': 0, 'failed': 0, 'dropped': 0}
+        self.stats_lock = threading.Lock()
+
+    def start(self):
+        """启动工作线程"""
+        if self.is_running:
+            return
+
+        self.is_running = True
+        for i in range(self.num_workers):
+            worker = threading.Thread(target=self._worker_func, name=f"notify-worker-{i}", daemon=True)
+            worker.start()
+            self.workers.append(worker)
+        self.logger.info(f"启动通知分发服务，工作线程数: {self.num_workers}")
+
+    def stop(self, timeout=5):
+        """停止分发服务，尽量发送完队列中剩余的通知"""
+        deadline = time.time() + timeout
+        while not self.queue.empty() and time.time() < deadline:
+            time.sleep(0.1)
+        self.is_running = False
+        self.logger.info("停止通知分发服务")
+
+    def submit(self, channel, send_func, *args):
+        """提交通知任务，队列已满时丢弃并返回False（不阻塞调用方）"""
+        try:
+            self.queue.put_nowait((channel, send_func, args))
+        except queue.Full:
+            self._count('dropped')
+            self.logger.error(f"通知队列已满，丢弃{channel}通知")
+            return False
+
+        self._count('queued')
+        return True
+
+    def get_stats(self):
+        """获取分发统计信息"""
+        with self.stats_lock:
+            stats = dict(self.stats)
+        stats['pending'] = self.queue.qsize()
+        return stats
+
+    def _worker_func(self):
+        """工作线程函数"""
+        while self.is_running:
+            try:
+                channel, send_func, args = self.queue.get(timeout=1)
+            except queue.Empty:
+                continue
+
+            try:
+                self._deliver(channel, send_func, args)
+            finally:
+                self.queue.task_done()
+
+    def _deliver(self, channel, send_func, args):
+        """发送一条通知，失败时按指数退避重试"""
+        for attempt in range(self.max_retries + 1):
+            try:
+                send_func(*args)
+                self._count('sent')
+                return
+            except Exception as e:
+                if attempt >= self.max_retries:
+                    self._count('failed')
+                    self.logger.error(f"发送{channel}通知失败（已重试{attempt}次）: {e}")
+                    return
+
+                delay = self.retry_backoff * (2 ** attempt)
+                self._count('retried')
+                self.logger.warning(f"发送{channel}通知失败，{delay:.1f}秒后重试: {e}")
+                time.sleep(delay)
+
+    def _count(self, key):
+        with self.stats_lock:
+            self.stats[key] += 1
+
+
+# 进程内共享的分发器（AlertService会被多个模块分别实例化）
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+def get_dispatcher():
+    """获取全局通知分发器，首次调用时创建并启动"""
+    global _dispatcher
+    with _dispatcher_lock:
+        if _dispatcher is None:
+            _dispatcher = NotificationDispatcher()
+            _dispatcher.start()
+            atexit.register(_dispatcher.stop)
+        return _dispatcher
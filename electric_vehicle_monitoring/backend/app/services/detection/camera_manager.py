@@ -4,19 +4,46 @@ import logging
 import threading
 import uuid
 import time
+from sqlalchemy import select
 from app.models.camera import Camera
+from app.services.alerts.fusion_service import get_fusion_service
 from app import db
 
+# 摄像头字段（与 Camera.to_dict 的键一致）
+CAMERA_FIELDS = [
+    'id', 'name', 'url', 'location', 'status', 'resolution', 'fps',
+    'detection_enabled', 'detection_config', 'created_at', 'updated_at'
+]
+
 class CameraStream:
-    """摄像头视频流类"""
+    """摄像头视频流类
+    
+    采集线程将帧解码到预分配的环形缓冲区中，并为每帧分配递增的序号。
+    读取方法返回缓冲区槽位的只读视图而不复制数据；槽位会在 ring_size 帧之后被覆盖，
+    需要长期持有帧的调用方应自行复制。
+    """
     
-    def __init__(self, camera_id, url):
+    def __init__(self, camera_id, url, ring_size=None):
         self.camera_id = camera_id
         self.url = url
         self.stream = None
         self.is_running = False
+        self.thread = None
         self.lock = threading.Lock()
-        self.last_frame = None
+        self.frame_ready = threading.Condition(self.lock)  # 新帧到达时通知等待的读取方
+        
+        # 预分配的帧环形缓冲区
+        if ring_size is None:
+            ring_size = int(os.environ.get("CAMERA_RING_SIZE", 4))
+        self.ring_size = max(2, ring_size)
+        self.ring = []
+        self.latest_index = None
+        self.frame_seq = 0  # 帧序号，每捕获一帧递增
+        
+        # 超过该时间无人读取时，采集线程只抓取不解码
+        self.idle_timeout = float(os.environ.get("CAMERA_IDLE_DECODE_TIMEOUT", 2))
+        self.last_demand = time.time()
+        
         self.logger = logging.getLogger(f"CameraStream-{camera_id}")
         
     def start(self):
@@ -24,6 +51,10 @@ class CameraStream:
         if self.is_running:
             return True
             
+        # 等待上一次的采集线程退出，避免两个线程同时操作同一个流
+        if self.thread is not None and self.thread.is_alive():
+            self.thread.join(timeout=3)
+            
         try:
             self.stream = cv2.VideoCapture(self.url)
             if not self.stream.isOpened():
@@ -31,8 +62,10 @@ class CameraStream:
                 return False
                 
             self.is_running = True
+            self.last_demand = time.time()
             # 启动后台线程来捕获帧
-            threading.Thread(target=self._update_frame, daemon=True).start()
+            self.thread = threading.Thread(target=self._update_frame, daemon=True)
+            self.thread.start()
             self.logger.info(f"成功启动摄像头流: {self.url}")
             return True
             
@@ -43,38 +76,105 @@ class CameraStream:
     def stop(self):
         """停止摄像头流"""
         self.is_running = False
+        with self.frame_ready:
+            self.ring = []
+            self.latest_index = None
+            self.frame_ready.notify_all()
+            
+        # 采集线程运行时由其自行释放流，避免与阻塞中的grab()竞争
+        if self.thread is None or not self.thread.is_alive():
+            self._release()
+        self.logger.info(f"已停止摄像头流: {self.url}")
+    
+    def _release(self):
+        """释放底层视频流"""
         if self.stream:
             self.stream.release()
             self.stream = None
-            self.last_frame = None
-            self.logger.info(f"已停止摄像头流: {self.url}")
     
     def read(self):
-        """读取当前帧"""
-        with self.lock:
-            if self.last_frame is None:
-                return False, None
-            return True, self.last_frame.copy()
+        """读取当前帧（只读视图）"""
+        ret, frame, _ = self.read_with_seq()
+        return ret, frame
+    
+    def read_with_seq(self):
+        """读取当前帧（只读视图）及其序号"""
+        with self.frame_ready:
+            self._mark_demand()
+            return self._latest_view()
+    
+    def wait_for_frame(self, last_seq, timeout=1.0):
+        """阻塞等待序号大于last_seq的新帧，超时返回当前帧"""
+        with self.frame_ready:
+            self._mark_demand()
+            if self.frame_seq == last_seq and self.is_running:
+                self.frame_ready.wait(timeout)
+            return self._latest_view()
+    
+    def latest_seq(self):
+        """获取当前帧的序号"""
+        with self.frame_ready:
+            self._mark_demand()
+            return self.frame_seq if self.latest_index is not None else None
+    
+    def _mark_demand(self):
+        """记录读取需求；若采集线程因空闲暂停了解码，等待一帧新数据（需持有锁）"""
+        now = time.time()
+        was_idle = now - self.last_demand > self.idle_timeout
+        self.last_demand = now
+        if was_idle and self.is_running:
+            seq = self.frame_seq
+            self.frame_ready.wait_for(lambda: self.frame_seq != seq or not self.is_running, timeout=1.0)
+    
+    def _latest_view(self):
+        """返回最新帧的只读视图（需持有锁）"""
+        if self.latest_index is None:
+            return False, None, self.frame_seq
+        view = self.ring[self.latest_index].view()
+        view.flags.writeable = False
+        return True, view, self.frame_seq
     
     def _update_frame(self):
         """持续更新帧的后台线程"""
         while self.is_running:
             try:
-                if self.stream and self.stream.isOpened():
-                    ret, frame = self.stream.read()
-                    if ret:
-                        with self.lock:
-                            self.last_frame = frame
+                if not (self.stream and self.stream.isOpened()):
+                    time.sleep(0.1)
+                    continue
+                    
+                # grab() 会阻塞到下一帧到达，无需额外休眠
+                if not self.stream.grab():
+                    self.logger.warning(f"无法从摄像头读取帧: {self.url}")
+                    # 尝试重新连接
+                    self.stream.release()
+                    time.sleep(2)
+                    self.stream = cv2.VideoCapture(self.url)
+                    continue
+                    
+                # 无人读取时跳过解码
+                if time.time() - self.last_demand > self.idle_timeout:
+                    continue
+                    
+                # 直接解码到下一个环形缓冲区槽位，形状不符时由OpenCV重新分配
+                index = 0 if self.latest_index is None else (self.latest_index + 1) % self.ring_size
+                slot = self.ring[index] if index < len(self.ring) else None
+                ret, frame = self.stream.retrieve(slot) if slot is not None else self.stream.retrieve()
+                if not ret:
+                    continue
+                    
+                with self.frame_ready:
+                    if index < len(self.ring):
+                        self.ring[index] = frame
                     else:
-                        self.logger.warning(f"无法从摄像头读取帧: {self.url}")
-                        # 尝试重新连接
-                        self.stream.release()
-                        time.sleep(2)
-                        self.stream = cv2.VideoCapture(self.url)
-                time.sleep(0.01)  # 避免CPU占用过高
+                        self.ring.append(frame)
+                    self.latest_index = index
+                    self.frame_seq += 1
+                    self.frame_ready.notify_all()
             except Exception as e:
                 self.logger.error(f"更新帧时出错: {e}")
                 time.sleep(1)  # 错误后暂停一段时间再尝试
+                
+        self._release()
 
 
 class CameraManager:
@@ -92,6 +192,7 @@ class CameraManager:
             cameras = Camera.query.filter_by(status='active').all()
             for camera in cameras:
                 self._init_camera_stream(camera.id, camera.url)
+                get_fusion_service().set_location(f"camera_{camera.id}", camera.location)
             self.logger.info(f"已从数据库加载 {len(cameras)} 个摄像头配置")
         except Exception as e:
             self.logger.error(f"从数据库加载摄像头配置时出错: {e}")
@@ -104,10 +205,10 @@ class CameraManager:
             camera_stream.start()
             
     def get_all_cameras(self):
-        """获取所有摄像头信息"""
+        """获取所有摄像头信息（由列值直接构造字典，时间字段为datetime）"""
         try:
-            cameras = Camera.query.all()
-            return [camera.to_dict() for camera in cameras]
+            rows = db.session.execute(select(*[getattr(Camera, field) for field in CAMERA_FIELDS]))
+            return [dict(zip(CAMERA_FIELDS, row)) for row in rows]
         except Exception as e:
             self.logger.error(f"获取所有摄像头信息时出错: {e}")
             return []
@@ -168,6 +269,7 @@ class CameraManager:
             
             # 初始化摄像头流
             self._init_camera_stream(camera.id, url)
+            get_fusion_service().set_location(f"camera_{camera.id}", location)
             
             return camera.id
         except Exception as e:
@@ -181,6 +283,8 @@ class CameraManager:
             camera = Camera.query.get(camera_id)
             if not camera:
                 return False
+            # 流按整数ID登记（接口传入的是字符串）
+            camera_id = camera.id
                 
             # 更新字段
             if 'name' in data:
@@ -194,6 +298,7 @@ class CameraManager:
                 self._init_camera_stream(camera_id, data['url'])
             if 'location' in data:
                 camera.location = data['location']
+                get_fusion_service().set_location(f"camera_{camera_id}", data['location'])
             if 'status' in data:
                 camera.status = data['status']
                 if data['status'] != 'active' and camera_id in self.cameras:
@@ -216,6 +321,7 @@ class CameraManager:
             camera = Camera.query.get(camera_id)
             if not camera:
                 return False
+            camera_id = camera.id
                 
             # 停止并移除流
             if camera_id in self.cameras:
@@ -224,6 +330,7 @@ class CameraManager:
                 
             db.session.delete(camera)
             db.session.commit()
+            get_fusion_service().set_location(f"camera_{camera_id}", None)
             return True
         except Exception as e:
             self.logger.error(f"删除摄像头时出错: {e}")
@@ -0,0 +1,152 @@
+import cv2
+import os
+import logging
+import threading
+from collections import OrderedDict
+
+class FrameCache:
+    """JPEG编码帧缓存，同一帧的每种编码参数只编码一次"""
+
+    def __init__(self, camera_manager, scheduler, max_entries=None, max_bytes=None):
+        self.camera_manager = camera_manager
+        self.scheduler = scheduler
+        self.logger = logging.getLogger("FrameCache")
+
+        # 内存上限（LRU淘汰）
+        if max_entries is None:
+            max_entries = int(os.environ.get("FRAME_CACHE_MAX_ENTRIES", 256))
+        if max_bytes is None:
+            max_bytes = int(os.environ.get("FRAME_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+
+        # 缓存: {(camera_id, seq, detect, quality, resolution): bytes}
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+        self.lock = threading.Lock()
+
+        # 命中统计
+        self.hits = 0
+        self.misses = 0
+
+    def get_jpeg(self, camera_id, detect=False, quality=85, resolution=None):
+        """
+        获取摄像头当前帧的JPEG数据
+
+        Args:
+            camera_id: 摄像头ID
+            detect: 是否返回带检测框的图像
+            quality: JPEG质量
+            resolution: 输出分辨率 (width, height)，为None时保持原始大小
+
+        Returns:
+            (source_seq, jpeg_bytes)，无可用帧时返回 (None, None)
+        """
+        stream = self.camera_manager.get_stream(camera_id)
+        if not stream:
+            return None, None
+        camera_id = stream.camera_id
+
+        # 先用当前帧序号查缓存，命中时无需读取和编码帧
+        source_seq = self._current_seq(stream, camera_id, detect)
+        if source_seq is None:
+            return None, None
+
+        data = self.get((camera_id, source_seq, detect, quality, resolution))
+        if data is not None:
+            return source_seq, data
+
+        # 未命中：读取帧（以实际读到的帧序号作为缓存键）并编码
+        source_seq, frame = self._read_frame(stream, camera_id, detect)
+        if frame is None:
+            return None, None
+
+        data = self._encode(frame, quality, resolution)
+        if data is None:
+            return None, None
+        self.put((camera_id, source_seq, detect, quality, resolution), data)
+        return source_seq, data
+
+    def get(self, key):
+        """查找缓存，命中时刷新LRU顺序"""
+        with self.lock:
+            data = self.entries.get(key)
+            if data is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return data
+
+    def put(self, key, data):
+        """写入缓存，同一输出规格只保留最新一帧"""
+        camera_id, seq, detect, quality, resolution = key
+        with self.lock:
+            # 新帧到达后，同一规格的旧帧不会再被请求
+            for old_key in [k for k in self.entries
+                            if k[0] == camera_id and k[2:] == (detect, quality, resolution) and k != key]:
+                self.total_bytes -= len(self.entries.pop(old_key))
+
+            if key in self.entries:
+                self.total_bytes -= len(self.entries[key])
+            self.entries[key] = data
+            self.entries.move_to_end(key)
+            self.total_bytes += len(data)
+
+            # LRU淘汰
+            while self.entries and (len(self.entries) > self.max_entries or self.total_bytes > self.max_bytes):
+                _, evicted = self.entries.popitem(last=False)
+                self.total_bytes -= len(evicted)
+
+    def invalidate_camera(self, camera_id):
+        """清除某摄像头的全部缓存"""
+        try:
+            camera_id = int(camera_id)
+        except (TypeError, ValueError):
+            return
+
+        with self.lock:
+            for key in [k for k in self.entries if k[0] == camera_id]:
+                self.total_bytes -= len(self.entries.pop(key))
+
+    def get_stats(self):
+        """获取缓存统计信息"""
+        with self.lock:
+            return {
+                'entries': len(self.entries),
+                'bytes': self.total_bytes,
+                'hits': self.hits,
+                'misses': self.misses
+            }
+
+    def _current_seq(self, stream, camera_id, detect):
+        """获取当前可用帧的序号"""
+        if detect:
+            result = self.scheduler.get_result(camera_id)
+            if result is not None:
+                return ('detect', result['seq'])
+        return stream.latest_seq()
+
+    def _read_frame(self, stream, camera_id, detect):
+        """读取帧及其序号，检测结果尚未生成时退回原始帧"""
+        if detect:
+            result = self.scheduler.get_result(camera_id)
+            if result is not None:
+                _, annotated = self.scheduler.get_annotated_frame(camera_id, result)
+                return ('detect', result['seq']), annotated
+
+        ret, frame, seq = stream.read_with_seq()
+        if not ret:
+            return None, None
+        return seq, frame
+
+    def _encode(self, frame, quality, resolution):
+        """按指定质量和分辨率编码JPEG"""
+        if resolution is not None and (frame.shape[1], frame.shape[0]) != resolution:
+            frame = cv2.resize(frame, resolution, interpolation=cv2.INTER_AREA)
+
+        ret, buffer = cv2.imencode('.jpg', frame, [int(cv2.IMWRITE_JPEG_QUALITY), quality])
+        if not ret:
+            self.logger.error("JPEG编码失败")
+            return None
+        return buffer.tobytes()
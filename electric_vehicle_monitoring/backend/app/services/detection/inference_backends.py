@@ -0,0 +1,222 @@
+import ast
+import cv2
+import numpy as np
+import os
+import logging
+
+# 各后端的依赖在创建时才导入，使用ONNX Runtime/OpenVINO时进程无需加载torch
+
+class UltralyticsBackend:
+    """PyTorch推理后端（ultralytics）"""
+
+    def __init__(self, model_path, num_threads=None, precision='fp32'):
+        from ultralytics import YOLO
+
+        if num_threads:
+            import torch
+            torch.set_num_threads(num_threads)
+
+        self.model = YOLO(model_path)
+        self.names = dict(self.model.names)
+        self.half = precision == 'fp16'
+
+    def predict(self, frames, conf):
+        """批量推理，返回每帧的检测结果数组 [x1, y1, x2, y2, conf, cls]"""
+        results = self.model(frames, conf=conf, half=self.half, verbose=False)
+        detections = []
+        for result in results:
+            if result.boxes is None or len(result.boxes) == 0:
+                detections.append(np.empty((0, 6), dtype=np.float32))
+            else:
+                detections.append(result.boxes.data.cpu().numpy()[:, :6].astype(np.float32))
+        return detections
+
+
+class OnnxRuntimeBackend:
+    """ONNX Runtime CPU推理后端，加载由ultralytics导出的YOLOv8 ONNX模型"""
+
+    def __init__(self, model_path, num_threads=None, precision='fp32'):
+        import onnxruntime as ort
+
+        self.logger = logging.getLogger("OnnxRuntimeBackend")
+
+        if precision == 'int8':
+            model_path = self._quantize(model_path)
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(model_path, options, providers=['CPUExecutionProvider'])
+
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        self.input_dtype = np.float16 if 'float16' in model_input.type else np.float32
+        self.fixed_batch, self.input_size = _parse_input_shape(model_input.shape)
+
+        metadata = self.session.get_modelmeta().custom_metadata_map
+        self.names = _parse_names(metadata.get('names'), model_path)
+        self.iou_threshold = float(os.environ.get("DETECTION_IOU_THRESHOLD", 0.45))
+
+    def predict(self, frames, conf):
+        """批量推理，返回每帧的检测结果数组 [x1, y1, x2, y2, conf, cls]"""
+        blob, metas = _preprocess(frames, self.input_size, self.input_dtype)
+
+        # 静态批量的模型需按模型批量大小分段运行
+        step = self.fixed_batch or len(frames)
+        outputs = []
+        for start in range(0, len(frames), step):
+            chunk = blob[start:start + step]
+            outputs.append(self.session.run(None, {self.input_name: chunk})[0])
+        output = np.concatenate(outputs, axis=0)
+
+        return [_postprocess(output[i], metas[i], conf, self.iou_threshold) for i in range(len(frames))]
+
+    def _quantize(self, model_path):
+        """生成INT8动态量化模型（已存在时直接复用）"""
+        quantized_path = os.path.splitext(model_path)[0] + '.int8.onnx'
+        if not os.path.exists(quantized_path):
+            from onnxruntime.quantization import quantize_dynamic, QuantType
+            self.logger.info(f"将模型 {model_path} 量化为INT8: {quantized_path}")
+            quantize_dynamic(model_path, quantized_path, weight_type=QuantType.QUInt8)
+        return quantized_path
+
+
+class OpenVinoBackend:
+    """OpenVINO CPU推理后端，加载由ultralytics导出的OpenVINO IR或ONNX模型"""
+
+    def __init__(self, model_path, num_threads=None, precision='fp32'):
+        import openvino as ov
+
+        core = ov.Core()
+        model = core.read_model(model_path)
+
+        config = {}
+        if num_threads:
+            config['INFERENCE_NUM_THREADS'] = num_threads
+        if precision == 'fp16':
+            config['INFERENCE_PRECISION_HINT'] = 'f16'
+        # INT8需使用NNCF等工具预先量化好的IR模型，这里无需额外配置
+
+        self.compiled_model = core.compile_model(model, 'CPU', config)
+        self.output = self.compiled_model.output(0)
+
+        self.fixed_batch, self.input_size = _parse_input_shape(
+            [dim.get_length() if dim.is_static else None for dim in model.input(0).get_partial_shape()]
+        )
+        self.names = _parse_names(None, model_path)
+        self.iou_threshold = float(os.environ.get("DETECTION_IOU_THRESHOLD", 0.45))
+
+    def predict(self, frames, conf):
+        """批量推理，返回每帧的检测结果数组 [x1, y1, x2, y2, conf, cls]"""
+        blob, metas = _preprocess(frames, self.input_size, np.float32)
+
+        step = self.fixed_batch or len(frames)
+        outputs = []
+        for start in range(0, len(frames), step):
+            outputs.append(self.compiled_model(blob[start:start + step])[self.output])
+        output = np.concatenate(outputs, axis=0)
+
+        return [_postprocess(output[i], metas[i], conf, self.iou_threshold) for i in range(len(frames))]
+
+
+BACKENDS = {
+    'ultralytics': UltralyticsBackend,
+    'onnxruntime': OnnxRuntimeBackend,
+    'openvino': OpenVinoBackend
+}
+
+def create_backend(name, model_path, num_threads=None, precision='fp32'):
+    """根据名称创建推理后端"""
+    backend_class = BACKENDS.get(name)
+    if backend_class is None:
+        raise ValueError(f"未知的推理后端: {name}")
+    return backend_class(model_path, num_threads=num_threads, precision=precision)
+
+
+def _parse_input_shape(shape):
+    """解析模型输入形状 [batch, 3, height, width]，返回 (固定批量或None, (height, width))"""
+    batch = shape[0] if isinstance(shape[0], int) and shape[0] > 0 else None
+    height = shape[2] if isinstance(shape[2], int) and shape[2] > 0 else 640
+    width = shape[3] if isinstance(shape[3], int) and shape[3] > 0 else 640
+    return batch, (height, width)
+
+
+def _parse_names(names, model_path):
+    """解析类别名称，优先使用模型元数据，其次使用导出目录下的metadata.yaml"""
+    if names is None:
+        metadata_path = os.path.join(os.path.dirname(model_path), 'metadata.yaml')
+        if os.path.exists(metadata_path):
+            try:
+                import yaml
+                with open(metadata_path, 'r') as f:
+                    names = yaml.safe_load(f).get('names')
+            except Exception:
+                names = None
+
+    if isinstance(names, str):
+        try:
+            names = ast.literal_eval(names)
+        except (ValueError, SyntaxError):
+            names = None
+
+    if isinstance(names, dict):
+        return {int(k): v for k, v in names.items()}
+    if isinstance(names, list):
+        return dict(enumerate(names))
+    return {}
+
+
+def _preprocess(frames, input_size, dtype):
+    """等比缩放并填充到模型输入尺寸，返回 (NCHW批量数据, 每帧的缩放信息)"""
+    height, width = input_size
+    blob = np.full((len(frames), 3, height, width), 114 / 255.0, dtype=dtype)
+    metas = []
+
+    for i, frame in enumerate(frames):
+        h, w = frame.shape[:2]
+        ratio = min(height / h, width / w)
+        new_w, new_h = int(round(w * ratio)), int(round(h * ratio))
+        pad_x, pad_y = (width - new_w) // 2, (height - new_h) // 2
+
+        resized = cv2.resize(frame, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+        rgb = cv2.cvtColor(resized, cv2.COLOR_BGR2RGB)
+        blob[i, :, pad_y:pad_y + new_h, pad_x:pad_x + new_w] = rgb.transpose(2, 0, 1) / 255.0
+        metas.append((ratio, pad_x, pad_y, w, h))
+
+    return blob, metas
+
+
+def _postprocess(output, meta, conf, iou_threshold):
+    """解析YOLOv8输出 (4 + 类别数, 候选框数)，执行置信度过滤和按类别NMS"""
+    predictions = output.T.astype(np.float32)
+    scores = predictions[:, 4:]
+    class_ids = scores.argmax(axis=1)
+    confidences = scores[np.arange(len(scores)), class_ids]
+
+    mask = confidences >= conf
+    if not mask.any():
+        return np.empty((0, 6), dtype=np.float32)
+    boxes, confidences, class_ids = predictions[mask, :4], confidences[mask], class_ids[mask]
+
+    # (cx, cy, w, h) 映射回原图坐标
+    ratio, pad_x, pad_y, w, h = meta
+    xyxy = np.empty_like(boxes)
+    xyxy[:, 0] = (boxes[:, 0] - boxes[:, 2] / 2 - pad_x) / ratio
+    xyxy[:, 1] = (boxes[:, 1] - boxes[:, 3] / 2 - pad_y) / ratio
+    xyxy[:, 2] = (boxes[:, 0] + boxes[:, 2] / 2 - pad_x) / ratio
+    xyxy[:, 3] = (boxes[:, 1] + boxes[:, 3] / 2 - pad_y) / ratio
+    xyxy[:, [0, 2]] = xyxy[:, [0, 2]].clip(0, w)
+    xyxy[:, [1, 3]] = xyxy[:, [1, 3]].clip(0, h)
+
+    # 按类别偏移坐标，使一次NMS等价于按类别分别NMS
+    offset = class_ids[:, None].astype(np.float32) * 4096
+    nms_boxes = np.concatenate([xyxy[:, :2] + offset, xyxy[:, 2:] - xyxy[:, :2]], axis=1)
+    keep = cv2.dnn.NMSBoxes(nms_boxes.tolist(), confidences.tolist(), conf, iou_threshold)
+    keep = np.array(keep, dtype=np.int64).reshape(-1)
+
+    return np.concatenate([
+        xyxy[keep],
+        confidences[keep, None],
+        class_ids[keep, None].astype(np.float32)
+    ], axis=1).astype(np.float32)
@@ -0,0 +1,190 @@
+import os
+import atexit
+import logging
+import threading
+import multiprocessing
+import numpy as np
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+
+# 工作进程内的全局状态（每个进程各自加载一份模型）
+_worker_backend = None
+_worker_buffers = OrderedDict()  # {shm_name: SharedMemory}
+_WORKER_MAX_BUFFERS = 64
+
+def _init_worker(backend_name, model_path, num_threads, precision):
+    """工作进程初始化：加载推理后端"""
+    global _worker_backend
+    from app.services.detection.inference_backends import create_backend
+    _worker_backend = create_backend(backend_name, model_path, num_threads=num_threads, precision=precision)
+
+
+def _worker_names():
+    """返回工作进程中模型的类别名称"""
+    return _worker_backend.names
+
+
+def _attach_buffer(name):
+    """映射主进程创建的共享内存（按名称缓存）"""
+    shm = _worker_buffers.get(name)
+    if shm is not None:
+        _worker_buffers.move_to_end(name)
+        return shm
+
+    # spawn启动的工作进程与主进程共用资源追踪器，工作进程退出不会删除共享内存，
+    # 这里不能注销登记，否则主进程释放时追踪器会找不到该登记
+    shm = shared_memory.SharedMemory(name=name)
+
+    _worker_buffers[name] = shm
+    while len(_worker_buffers) > _WORKER_MAX_BUFFERS:
+        _, stale = _worker_buffers.popitem(last=False)
+        stale.close()
+    return shm
+
+
+def _worker_predict(refs, conf):
+    """工作进程推理函数：从共享内存读取帧并返回紧凑的检测结果数组"""
+    frames = []
+    for name, shape, dtype in refs:
+        shm = _attach_buffer(name)
+        frames.append(np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf))
+    return _worker_backend.predict(frames, conf)
+
+
+class InferenceWorkerPool:
+    """
+    多进程推理工作池，每个进程加载独立的模型，帧数据通过共享内存传递
+
+    工作进程异常退出（内存不足、推理后端崩溃等）后进程池会整体失效，
+    此时重建进程池并重试该批推理；共享内存由主进程持有，新进程按名称重新映射。
+    """
+
+    def __init__(self, num_workers, backend_name, model_path, num_threads=None, precision='fp32'):
+        self.logger = logging.getLogger("InferenceWorkerPool")
+        self.num_workers = num_workers
+
+        # 默认将CPU核心平均分配给各工作进程
+        if not num_threads:
+            num_threads = max(1, (os.cpu_count() or 1) // num_workers)
+
+        self.initargs = (backend_name, model_path, num_threads, precision)
+        self.executor = self._create_executor()
+        self.executor_lock = threading.Lock()
+        self.restarts = 0
+        self.names = self.executor.submit(_worker_names).result()
+
+        # 每路摄像头两个共享内存槽位交替使用：
+        # 一个保存上次推理的帧（供结果绘制），另一个写入本次推理的帧
+        self.buffers = {}  # {(camera_id, slot): SharedMemory}
+        self.next_slot = {}  # {camera_id: slot}
+        self.staged = {}  # {数据地址: (shm_name, shape, dtype)}
+        self.lock = threading.Lock()
+
+        atexit.register(self.close)
+        self.logger.info(f"已启动 {num_workers} 个推理工作进程（每个进程 {num_threads} 个线程）")
+
+    def stage(self, camera_id, frame):
+        """将帧复制到该摄像头的共享内存槽位，返回共享内存上的数组视图"""
+        with self.lock:
+            slot = self.next_slot.get(camera_id, 0)
+            self.next_slot[camera_id] = 1 - slot
+
+            key = (camera_id, slot)
+            shm = self.buffers.get(key)
+            if shm is None or shm.size < frame.nbytes:
+                if shm is not None:
+                    self._release(shm)
+                shm = shared_memory.SharedMemory(create=True, size=frame.nbytes)
+                self.buffers[key] = shm
+
+            staged = np.ndarray(frame.shape, dtype=frame.dtype, buffer=shm.buf)
+            np.copyto(staged, frame)
+            self.staged[staged.__array_interface__['data'][0]] = (shm.name, frame.shape, frame.dtype.str)
+            return staged
+
+    def predict(self, frames, conf):
+        """将批量帧分发到各工作进程推理，按原顺序返回检测结果"""
+        refs = [self._ref_for(frame, index) for index, frame in enumerate(frames)]
+
+        executor = self.executor
+        try:
+            return self._predict(executor, refs, conf)
+        except BrokenProcessPool as e:
+            self.logger.error(f"推理工作进程异常退出，重建进程池: {e}")
+            executor = self._restart(executor)
+
+        # 同一批再次导致崩溃时放弃该批，进程池已重建，后续批次可以继续推理
+        try:
+            return self._predict(executor, refs, conf)
+        except BrokenProcessPool:
+            self._restart(executor)
+            raise
+
+    def _predict(self, executor, refs, conf):
+        chunk_size = -(-len(refs) // self.num_workers)
+        futures = [
+            executor.submit(_worker_predict, refs[start:start + chunk_size], conf)
+            for start in range(0, len(refs), chunk_size)
+        ]
+
+        detections = []
+        for future in futures:
+            detections.extend(future.result())
+        return detections
+
+    def _create_executor(self):
+        # 使用spawn启动，避免fork继承主进程中的线程和摄像头句柄
+        return ProcessPoolExecutor(
+            max_workers=self.num_workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker,
+            initargs=self.initargs
+        )
+
+    def _restart(self, broken):
+        """重建失效的进程池（多个线程同时发现失效时只重建一次），返回可用的进程池"""
+        with self.executor_lock:
+            if self.executor is broken:
+                broken.shutdown(wait=False, cancel_futures=True)
+                self.executor = self._create_executor()
+                self.restarts += 1
+                self.logger.warning(f"推理进程池已重建（累计 {self.restarts} 次）")
+            return self.executor
+
+    def close(self):
+        """关闭工作进程并释放共享内存"""
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        with self.lock:
+            for shm in self.buffers.values():
+                self._release(shm)
+            self.buffers.clear()
+            self.staged.clear()
+
+    def _ref_for(self, frame, index):
+        """获取帧对应的共享内存引用，未经stage的帧先按批内位置复制到临时槽位"""
+        ref = self.staged.get(frame.__array_interface__['data'][0])
+        if ref is not None and tuple(ref[1]) == frame.shape:
+            return ref
+        staged = self.stage(('temp', index), frame)
+        return self.staged[staged.__array_interface__['data'][0]]
+
+    def _release(self, shm):
+        """释放共享内存（需持有锁）"""
+        address = None
+        for addr, ref in self.staged.items():
+            if ref[0] == shm.name:
+                address = addr
+                break
+        if address is not None:
+            del self.staged[address]
+        try:
+            shm.close()
+        except BufferError:
+            # 仍有检测结果引用该内存，映射会在引用释放后回收
+            pass
+        try:
+            shm.unlink()
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,159 @@
+import os
+import time
+import logging
+import threading
+from contextlib import nullcontext
+from app.services.detection.motion_gate import MotionGate
+
+class InferenceScheduler:
+    """集中推理调度服务，按固定节奏将所有活动摄像头的最新帧合并为一个批次进行检测"""
+
+    def __init__(self, camera_manager, detector, interval=None, motion_gate=None):
+        self.camera_manager = camera_manager
+        self.detector = detector
+        self.motion_gate = motion_gate if motion_gate is not None else MotionGate()
+        self.logger = logging.getLogger("InferenceScheduler")
+        self.app = None
+
+        # 调度间隔（秒），每个周期最多对每路摄像头推理一帧
+        if interval is None:
+            interval = float(os.environ.get("INFERENCE_INTERVAL", 0.2))
+        self.interval = interval
+
+        # 每路摄像头的最新检测结果: {camera_id: result}
+        self.results = {}
+        self.lock = threading.Lock()
+
+        # 每路摄像头上次推理的帧序号，避免重复推理同一帧
+        self.last_seqs = {}
+
+        self.is_running = False
+        self.thread = None
+
+    def init_app(self, app):
+        """绑定Flask应用，检测结果触发警报时需要在应用上下文中访问数据库"""
+        self.app = app
+
+    def _app_context(self):
+        """获取调度线程使用的应用上下文"""
+        if self.app is None:
+            return nullcontext()
+        return self.app.app_context()
+
+    def start(self):
+        """启动调度线程"""
+        if self.is_running:
+            return
+
+        self.is_running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        self.logger.info(f"启动推理调度服务，间隔: {self.interval}s")
+
+    def stop(self):
+        """停止调度线程"""
+        self.is_running = False
+        self.logger.info("停止推理调度服务")
+
+    def _run(self):
+        """调度线程函数"""
+        while self.is_running:
+            started = time.time()
+            try:
+                with self._app_context():
+                    self.run_once()
+            except Exception as e:
+                self.logger.error(f"批量推理出错: {e}")
+
+            # 按配置的节奏执行，扣除本轮推理耗时
+            elapsed = time.time() - started
+            time.sleep(max(0.0, self.interval - elapsed))
+
+    def run_once(self):
+        """收集所有摄像头的新帧并执行一次批量推理"""
+        camera_ids, frames, seqs = [], [], []
+        skipped = []
+        now = time.time()
+
+        for camera_id, stream in list(self.camera_manager.cameras.items()):
+            if not stream.is_running:
+                continue
+
+            ret, frame, seq = stream.read_with_seq()
+            if not ret or self.last_seqs.get(camera_id) == seq:
+                continue
+
+            # 检测结果会被保留并按需绘制，需复制出环形缓冲区以免被覆盖
+            if self.motion_gate.should_detect(camera_id, frame, now):
+                camera_ids.append(camera_id)
+                frames.append(self.detector.stage_frame(camera_id, frame))
+                seqs.append(seq)
+            elif camera_id in self.results:
+                skipped.append((camera_id, frame.copy(), seq))
+            else:
+                # 没有可沿用的检测结果，只记录序号，不复制画面
+                skipped.append((camera_id, None, seq))
+
+        # 画面静止的摄像头沿用上次的检测结果，只更新画面
+        with self.lock:
+            for camera_id, frame, seq in skipped:
+                self.last_seqs[camera_id] = seq
+                previous = self.results.get(camera_id)
+                if previous is None or frame is None:
+                    continue
+                self.results[camera_id] = dict(previous, seq=seq, frame=frame, annotated=None)
+
+        if not frames:
+            return 0
+
+        detections_list = self.detector.detect_batch(frames, camera_ids)
+        timestamp = time.time()
+
+        with self.lock:
+            for camera_id, frame, seq, detections in zip(camera_ids, frames, seqs, detections_list):
+                self.last_seqs[camera_id] = seq
+                self.results[camera_id] = {
+                    'seq': seq,
+                    'frame': frame,
+                    'detections': detections,
+                    'annotated': None,  # 按需绘制
+                    'timestamp': timestamp  # 最近一次实际推理的时间
+                }
+
+        return len(frames)
+
+    def get_result(self, camera_id):
+        """获取摄像头的最新检测结果"""
+        try:
+            camera_id = int(camera_id)
+        except (TypeError, ValueError):
+            return None
+
+        with self.lock:
+            return self.results.get(camera_id)
+
+    def get_annotated_frame(self, camera_id, result=None):
+        """获取摄像头最新（或指定检测结果）的带检测框图像帧"""
+        if result is None:
+            result = self.get_result(camera_id)
+        if result is None:
+            return False, None
+
+        # 绘制结果在首次请求时生成并缓存，供后续请求复用
+        annotated = result['annotated']
+        if annotated is None:
+            annotated = self.detector.annotate(result['frame'], result['detections'])
+            result['annotated'] = annotated
+        return True, annotated
+
+    def remove_camera(self, camera_id):
+        """清除已删除摄像头的检测结果"""
+        try:
+            camera_id = int(camera_id)
+        except (TypeError, ValueError):
+            return
+
+        with self.lock:
+            self.results.pop(camera_id, None)
+            self.last_seqs.pop(camera_id, None)
+        self.motion_gate.reset(camera_id)
@@ -0,0 +1,94 @@
+import cv2
+import os
+import time
+import logging
+import threading
+
+class MotionGate:
+    """推理前的运动门控，根据低分辨率帧差判断画面是否变化，跳过静止画面的推理"""
+
+    def __init__(self, threshold=None, min_interval=None, refresh_interval=None, size=None):
+        self.logger = logging.getLogger("MotionGate")
+
+        # 运动分数阈值（缩小后灰度图的平均像素差，0-255）
+        if threshold is None:
+            threshold = float(os.environ.get("MOTION_THRESHOLD", 4.0))
+        # 同一摄像头两次推理的最小间隔（秒）
+        if min_interval is None:
+            min_interval = float(os.environ.get("DETECTION_MIN_INTERVAL", 0.5))
+        # 强制刷新间隔（秒），即使画面静止也会定期推理，以发现缓慢增长的烟雾
+        if refresh_interval is None:
+            refresh_interval = float(os.environ.get("DETECTION_REFRESH_INTERVAL", 10))
+        # 计算运动分数所用的缩略图尺寸 (width, height)
+        if size is None:
+            size = (64, 36)
+
+        self.threshold = threshold
+        self.min_interval = min_interval
+        self.refresh_interval = refresh_interval
+        self.size = size
+
+        # 每路摄像头的状态: {camera_id: {'reference': 缩略图, 'last_detect_time': 上次推理时间}}
+        self.states = {}
+        self.lock = threading.Lock()
+
+        # 统计
+        self.passed = 0
+        self.skipped = 0
+
+    def should_detect(self, camera_id, frame, now=None):
+        """判断是否需要对该帧进行推理"""
+        if now is None:
+            now = time.time()
+
+        with self.lock:
+            state = self.states.get(camera_id)
+
+            # 未达到最小推理间隔
+            if state is not None and now - state['last_detect_time'] < self.min_interval:
+                self.skipped += 1
+                return False
+
+            thumbnail = self._thumbnail(frame)
+
+            # 画面无明显变化且未到强制刷新时间时跳过推理
+            if (state is not None
+                    and now - state['last_detect_time'] < self.refresh_interval
+                    and thumbnail.shape == state['reference'].shape
+                    and self._motion_score(thumbnail, state['reference']) < self.threshold):
+                self.skipped += 1
+                return False
+
+            # 以本次推理的帧作为参考帧，缓慢变化会逐渐累积直到超过阈值
+            self.states[camera_id] = {
+                'reference': thumbnail,
+                'last_detect_time': now
+            }
+            self.passed += 1
+            return True
+
+    def reset(self, camera_id):
+        """清除摄像头状态"""
+        with self.lock:
+            self.states.pop(camera_id, None)
+
+    def get_stats(self):
+        """获取门控统计信息"""
+        with self.lock:
+            total = self.passed + self.skipped
+            return {
+                'passed': self.passed,
+                'skipped': self.skipped,
+                'skip_ratio': self.skipped / total if total else 0.0
+            }
+
+    def _thumbnail(self, frame):
+        """生成用于运动检测的缩小灰度图"""
+        small = cv2.resize(frame, self.size, interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return cv2.GaussianBlur(small, (3, 3), 0)
+
+    def _motion_score(self, thumbnail, reference):
+        """计算两帧缩略图的平均绝对差"""
+        return float(cv2.absdiff(thumbnail, reference).mean())
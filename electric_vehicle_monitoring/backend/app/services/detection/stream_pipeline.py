@@ -0,0 +1,200 @@
+import os
+import time
+import logging
+import threading
+
+class FrameBroadcaster:
+    """帧广播器，将同一份编码后的数据分发给任意数量的观看者"""
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.chunk = None  # 编码后的MJPEG分段数据
+        self.seq = 0  # 已发布的帧序号
+        self.subscribers = 0
+
+    def publish(self, chunk):
+        """发布新的一帧并唤醒所有等待的观看者"""
+        with self.condition:
+            self.chunk = chunk
+            self.seq += 1
+            self.condition.notify_all()
+
+    def wait_for_frame(self, last_seq, timeout=1.0):
+        """等待比last_seq更新的帧，超时返回(last_seq, None)"""
+        with self.condition:
+            if self.seq == last_seq:
+                self.condition.wait(timeout)
+            if self.seq == last_seq:
+                return last_seq, None
+            return self.seq, self.chunk
+
+    def add_subscriber(self):
+        with self.condition:
+            self.subscribers += 1
+
+    def remove_subscriber(self):
+        with self.condition:
+            self.subscribers -= 1
+
+    def wake_all(self):
+        """唤醒所有等待的观看者（用于停止流水线）"""
+        with self.condition:
+            self.condition.notify_all()
+
+
+class CameraPipeline:
+    """单路摄像头的后台处理流水线：采集 → 检测 → 绘制 → 编码，每帧只处理一次"""
+
+    def __init__(self, camera_id, stream, frame_cache, quality=70, fps=20, idle_timeout=30):
+        self.camera_id = camera_id
+        self.stream = stream
+        self.frame_cache = frame_cache
+        self.quality = quality
+        self.frame_interval = 1.0 / fps
+        self.idle_timeout = idle_timeout
+
+        # 原始画面和检测画面各有一个广播器，只在有观看者时才编码
+        self.broadcasters = {
+            False: FrameBroadcaster(),
+            True: FrameBroadcaster()
+        }
+        # 每个输出上次编码所用的源帧序号
+        self.source_seqs = {False: None, True: None}
+        self.stream_seq = None
+
+        self.is_running = False
+        self.last_active = time.time()
+        self.logger = logging.getLogger(f"CameraPipeline-{camera_id}")
+
+    def start(self):
+        """启动流水线线程"""
+        if self.is_running:
+            return
+
+        self.is_running = True
+        self.last_active = time.time()
+        threading.Thread(target=self._run, daemon=True).start()
+        self.logger.info("启动摄像头处理流水线")
+
+    def stop(self):
+        """停止流水线线程"""
+        self.is_running = False
+        for broadcaster in self.broadcasters.values():
+            broadcaster.wake_all()
+        self.logger.info("停止摄像头处理流水线")
+
+    def subscribe(self, detect=False):
+        """订阅流水线输出，逐帧返回编码后的MJPEG分段数据"""
+        broadcaster = self.broadcasters[detect]
+        broadcaster.add_subscriber()
+        try:
+            last_seq = broadcaster.seq
+            while self.is_running:
+                last_seq, chunk = broadcaster.wait_for_frame(last_seq)
+                if chunk is not None:
+                    yield chunk
+        finally:
+            broadcaster.remove_subscriber()
+            self.last_active = time.time()
+
+    def _run(self):
+        """流水线线程函数"""
+        while self.is_running:
+            started = time.time()
+            try:
+                if not self._has_subscribers():
+                    # 长时间无人观看时自动停止，释放资源
+                    if started - self.last_active > self.idle_timeout:
+                        self.stop()
+                        break
+                    time.sleep(self.frame_interval)
+                    continue
+                    
+                self.last_active = started
+                
+                # 阻塞等待摄像头新帧，每个新帧只唤醒一次
+                ret, _, seq = self.stream.wait_for_frame(self.stream_seq)
+                if not ret:
+                    time.sleep(self.frame_interval)
+                    continue
+                if seq == self.stream_seq:
+                    continue
+                self.stream_seq = seq
+                self._process_once()
+            except Exception as e:
+                self.logger.error(f"流水线处理出错: {e}")
+                time.sleep(self.frame_interval)
+                continue
+
+            # 限制最大输出帧率
+            elapsed = time.time() - started
+            time.sleep(max(0.0, self.frame_interval - elapsed))
+
+    def _has_subscribers(self):
+        return any(b.subscribers > 0 for b in self.broadcasters.values())
+
+    def _process_once(self):
+        """处理一帧：只为有观看者的输出编码一次并广播"""
+        for detect, broadcaster in self.broadcasters.items():
+            if broadcaster.subscribers == 0:
+                continue
+
+            # 检测由推理调度器统一完成，编码结果由帧缓存与快照接口共享
+            source_seq, frame_bytes = self.frame_cache.get_jpeg(self.camera_id, detect, self.quality)
+
+            # 源帧未变化时无需重复广播
+            if frame_bytes is None or self.source_seqs[detect] == source_seq:
+                continue
+
+            self.source_seqs[detect] = source_seq
+            broadcaster.publish(b'--frame\r\n'
+                                b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
+
+
+class StreamPipelineManager:
+    """摄像头流水线管理服务，保证每路摄像头只有一条处理流水线"""
+
+    def __init__(self, camera_manager, frame_cache):
+        self.camera_manager = camera_manager
+        self.frame_cache = frame_cache
+        self.pipelines = {}  # {camera_id: CameraPipeline}
+        self.lock = threading.Lock()
+        self.logger = logging.getLogger("StreamPipelineManager")
+
+        # 流水线配置
+        self.quality = int(os.environ.get("STREAM_JPEG_QUALITY", 70))
+        self.fps = float(os.environ.get("STREAM_FPS", 20))
+        self.idle_timeout = float(os.environ.get("STREAM_IDLE_TIMEOUT", 30))
+
+    def get_pipeline(self, camera_id):
+        """获取（必要时创建）摄像头的处理流水线"""
+        stream = self.camera_manager.get_stream(camera_id)
+        if not stream:
+            return None
+
+        camera_id = stream.camera_id
+        with self.lock:
+            pipeline = self.pipelines.get(camera_id)
+            if pipeline is None or not pipeline.is_running or pipeline.stream is not stream:
+                if pipeline is not None:
+                    pipeline.stop()
+                pipeline = CameraPipeline(
+                    camera_id, stream, self.frame_cache,
+                    quality=self.quality, fps=self.fps, idle_timeout=self.idle_timeout
+                )
+                self.pipelines[camera_id] = pipeline
+                pipeline.start()
+            return pipeline
+
+    def remove_pipeline(self, camera_id):
+        """停止并移除摄像头的处理流水线"""
+        try:
+            camera_id = int(camera_id)
+        except (TypeError, ValueError):
+            return
+
+        with self.lock:
+            pipeline = self.pipelines.pop(camera_id, None)
+        if pipeline is not None:
+            pipeline.stop()
+
@@ -4,8 +4,10 @@ import os
 import time
 import logging
 from pathlib import Path
-from ultralytics import YOLO
 from app.services.alerts.alert_service import AlertService
+from app.services.alerts.fusion_service import get_fusion_service
+from app.services.detection.inference_backends import create_backend
+from app.services.detection.inference_pool import InferenceWorkerPool
 from datetime import datetime
 
 class YoloDetector:
@@ -16,25 +18,47 @@ class YoloDetector:
         logging.basicConfig(level=logging.INFO)
         self.logger = logging.getLogger("YoloDetector")
         
-        # 设置模型路径
+        # 设置模型路径和推理后端（ultralytics / onnxruntime / openvino）
         model_path = os.environ.get("YOLO_MODEL_PATH", "models/yolov8n.pt")
-        self.logger.info(f"Loading YOLO model from {model_path}")
+        backend_name = os.environ.get("YOLO_BACKEND", "ultralytics").lower()
+        num_threads = int(os.environ.get("YOLO_NUM_THREADS", 0)) or None
+        precision = os.environ.get("YOLO_PRECISION", "fp32").lower()
+        self.logger.info(f"Loading YOLO model from {model_path} (backend: {backend_name}, precision: {precision})")
+        
+        # 推理工作进程数，大于0时在独立进程中推理以绕开GIL
+        num_workers = int(os.environ.get("INFERENCE_WORKERS", 0))
+        self.worker_pool = None
         
         # 初始化用于电动车充电安全检测的YOLO模型
         try:
-            self.model = YOLO(model_path)
+            if num_workers > 0:
+                self.worker_pool = InferenceWorkerPool(
+                    num_workers, backend_name, model_path, num_threads=num_threads, precision=precision
+                )
+                self.backend = self.worker_pool
+            else:
+                self.backend = create_backend(backend_name, model_path, num_threads=num_threads, precision=precision)
             self.logger.info("YOLO model loaded successfully")
         except Exception as e:
             self.logger.error(f"Failed to load YOLO model: {e}")
             # 使用默认的YOLO模型，如果自定义模型加载失败
-            self.model = YOLO("yolov8n.pt")
+            self.backend = create_backend("ultralytics", "yolov8n.pt", num_threads=num_threads)
         
         # 事件处理服务
         self.alert_service = AlertService()
         
+        # 检测结果同时送入多源融合服务，与同一位置的传感器事件关联
+        self.fusion = get_fusion_service()
+        
+        # 类别名称映射 {cls_id: name}
+        self.class_names = self.backend.names
+        
         # 设置检测阈值
         self.conf_threshold = float(os.environ.get("DETECTION_CONF_THRESHOLD", 0.5))
         
+        # 单次前向推理的最大批量
+        self.batch_size = max(1, int(os.environ.get("INFERENCE_BATCH_SIZE", 16)))
+        
         # 设置保存检测结果的路径
         self.save_dir = os.environ.get("DETECTION_SAVE_DIR", "detection_results")
         os.makedirs(self.save_dir, exist_ok=True)
@@ -48,15 +72,18 @@ class YoloDetector:
             'smoke': 81,        # 烟雾（可能需要自定义模型）
         }
         
-        # 上次检测到异常的时间，用于控制触发频率
+        # 同一摄像头同一类别两次上报警报的最小间隔（秒），
+        # 间隔内的检测不再进入警报服务（合并计数需要查询数据库）
+        self.alert_interval = float(os.environ.get("DETECTION_ALERT_INTERVAL", 30))
         self.last_alert_time = {}
 
-    def detect_objects(self, frame):
+    def detect_objects(self, frame, camera_id=None):
         """
         对图像帧进行目标检测
         
         Args:
             frame: 输入的图像帧
+            camera_id: 摄像头ID（可选，用于报警来源）
             
         Returns:
             处理后的图像帧
@@ -64,61 +91,103 @@ class YoloDetector:
         if frame is None:
             return None
             
-        # 进行检测
-        try:
-            results = self.model(frame, conf=self.conf_threshold)
-            
-            # 获取检测结果
-            result = results[0]
-            
-            # 处理检测到的目标
-            self._process_detections(frame, result)
+        detections = self.detect_batch([frame], [camera_id])[0]
+        return self.annotate(frame, detections)
+    
+    def detect_batch(self, frames, camera_ids=None):
+        """
+        对多帧图像进行批量目标检测
+        
+        Args:
+            frames: 图像帧列表
+            camera_ids: 与frames一一对应的摄像头ID列表（可选）
             
-            # 获取带有检测框的图像
-            annotated_frame = result.plot()
+        Returns:
+            每帧对应的检测结果数组列表，每行为 [x1, y1, x2, y2, conf, cls]
+        """
+        if camera_ids is None:
+            camera_ids = [None] * len(frames)
             
-            return annotated_frame
+        all_detections = []
+        for start in range(0, len(frames), self.batch_size):
+            chunk = frames[start:start + self.batch_size]
+            try:
+                all_detections.extend(self.backend.predict(chunk, self.conf_threshold))
+            except Exception as e:
+                self.logger.error(f"Error during batch object detection: {e}")
+                all_detections.extend(np.empty((0, 6), dtype=np.float32) for _ in chunk)
+        
+        # 处理检测到的目标
+        for frame, detections, camera_id in zip(frames, all_detections, camera_ids):
+            self._process_detections(frame, detections, camera_id)
             
-        except Exception as e:
-            self.logger.error(f"Error during object detection: {e}")
+        return all_detections
+    
+    def stage_frame(self, camera_id, frame):
+        """
+        复制一份待推理的帧，该副本会随检测结果一起保留
+        
+        使用推理工作池时复制到共享内存，工作进程可直接读取而无需再次序列化
+        """
+        if self.worker_pool is not None:
+            return self.worker_pool.stage(camera_id, frame)
+        return frame.copy()
+    
+    def annotate(self, frame, detections):
+        """在图像帧上绘制检测框"""
+        if frame is None or len(detections) == 0:
             return frame
+            
+        annotated_frame = frame.copy()
+        for x1, y1, x2, y2, conf, cls_id in detections:
+            cls_name = self.class_names.get(int(cls_id), str(int(cls_id)))
+            color = (0, 0, 255) if cls_name in ('fire', 'smoke') else (0, 255, 0)
+            p1, p2 = (int(x1), int(y1)), (int(x2), int(y2))
+            cv2.rectangle(annotated_frame, p1, p2, color, 2)
+            cv2.putText(annotated_frame, f"{cls_name} {conf:.2f}", (p1[0], max(p1[1] - 5, 10)),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 1, cv2.LINE_AA)
+        return annotated_frame
     
-    def _process_detections(self, frame, result):
+    def _process_detections(self, frame, detections, camera_id=None):
         """处理检测结果，查找异常情况"""
         timestamp = datetime.now()
+        source_id = f"camera_{camera_id}" if camera_id is not None else "camera_1"
         
-        # 获取检测到的边界框、置信度和类别
-        boxes = result.boxes.cpu().numpy()
-        
-        # 检测异常情况
-        for box in boxes:
-            cls_id = int(box.cls[0])
-            conf = box.conf[0]
-            
+        # 同一帧中同一类别的多个检测框合并为一次上报，保留置信度最高的框
+        found = {}
+        for x1, y1, x2, y2, conf, cls_id in detections:
             # 获取检测到的类别名称
-            cls_name = result.names[cls_id]
+            cls_name = self.class_names.get(int(cls_id))
             
             # 检查是否有异常情况
             if cls_name == 'fire' or cls_name == 'smoke':
-                alert_type = 'FIRE' if cls_name == 'fire' else 'SMOKE'
-                
-                # 控制触发频率，避免同一事件重复触发
-                current_time = time.time()
-                if cls_name in self.last_alert_time and current_time - self.last_alert_time[cls_name] < 30:
-                    continue
-                
-                self.last_alert_time[cls_name] = current_time
-                
-                # 保存检测到的图像
-                img_filename = f"{cls_name}_{timestamp.strftime('%Y%m%d_%H%M%S')}.jpg"
+                best = found.get(cls_name)
+                if best is None or conf > best[4]:
+                    found[cls_name] = (x1, y1, x2, y2, conf)
+        
+        current_time = time.time()
+        for cls_name, (x1, y1, x2, y2, conf) in found.items():
+            # 控制上报频率，间隔内的重复检测直接跳过
+            alert_key = (source_id, cls_name)
+            if current_time - self.last_alert_time.get(alert_key, 0) < self.alert_interval:
+                continue
+            self.last_alert_time[alert_key] = current_time
+            
+            alert_type = 'FIRE' if cls_name == 'fire' else 'SMOKE'
+            severity = 5 if alert_type == 'FIRE' else 4
+            
+            # 重复警报由警报服务合并计数，此时无需再保存图像
+            img_path = None
+            if not self.alert_service.is_duplicate(alert_type, "camera", source_id, severity):
+                img_filename = f"{cls_name}_{source_id}_{timestamp.strftime('%Y%m%d_%H%M%S')}.jpg"
                 img_path = os.path.join(self.save_dir, img_filename)
                 cv2.imwrite(img_path, frame)
+            
+            # 触发警报
+            bbox = [float(x1), float(y1), float(x2), float(y2)]  # 边界框坐标
+            self._trigger_alert(alert_type, conf, cls_name, img_path, bbox, source_id, severity)
                 
-                # 触发警报
-                bbox = box.xyxy[0].tolist()  # 边界框坐标
-                self._trigger_alert(alert_type, conf, cls_name, img_path, bbox)
-                
-    def _trigger_alert(self, alert_type, confidence, detected_class, image_path, bbox):
+    def _trigger_alert(self, alert_type, confidence, detected_class, image_path, bbox, source_id="camera_1", severity=4):
         """触发警报"""
         try:
             # 准备警报详情
@@ -134,14 +203,16 @@ class YoloDetector:
                 alert_type=alert_type,
                 message=f"检测到{detected_class}，置信度：{confidence:.2f}",
                 source_type="camera",
-                source_id="camera_1",  # 可以改为实际的摄像头ID
+                source_id=source_id,
                 details=details,
                 image_url=image_path,
-                severity=5 if alert_type == 'FIRE' else 4
+                severity=severity
             )
             
             self.logger.info(f"Alert triggered: {alert_type} - {detected_class}")
             
+            self.fusion.observe(f"camera:{detected_class}", source_id, confidence)
+            
         except Exception as e:
             self.logger.error(f"Error triggering alert: {e}")
 
@@ -0,0 +1,203 @@
+import os
+import logging
+import threading
+from collections import deque, OrderedDict
+from app.json_provider import dumps
+
+# 可订阅的主题
+TOPIC_ALERTS = 'alerts'
+TOPIC_SENSORS = 'sensors'
+TOPICS = (TOPIC_ALERTS, TOPIC_SENSORS)
+
+class Subscription:
+    """
+    单个客户端的事件订阅
+
+    普通事件进入有界队列，队列满时丢弃最旧的事件并在下一次读取时发送 resync 事件，
+    提示客户端重新拉取完整数据。带合并键的事件（如传感器最新值）只保留每个键的最新一条，
+    慢客户端不会因高频读数而积压；合并键数量超过上限时丢弃最旧的键，同样计为丢弃。
+    """
+
+    def __init__(self, topics, max_queue):
+        self.topics = set(topics)
+        self.max_queue = max_queue
+        self.queue = deque()
+        self.latest = OrderedDict()  # {合并键: 事件}
+        self.dropped = 0
+        self.closed = False
+        self.condition = threading.Condition()
+
+    def push(self, event, coalesce_key=None):
+        with self.condition:
+            if coalesce_key is not None:
+                self.latest.pop(coalesce_key, None)
+                self.latest[coalesce_key] = event
+                if len(self.latest) > self.max_queue:
+                    self.latest.popitem(last=False)
+                    self.dropped += 1
+            else:
+                if len(self.queue) >= self.max_queue:
+                    self.queue.popleft()
+                    self.dropped += 1
+                self.queue.append(event)
+            self.condition.notify()
+
+    def get(self, timeout):
+        """
+        等待并取出所有待发送事件
+
+        Returns:
+            事件列表，超时时为空列表
+        """
+        with self.condition:
+            if not self.queue and not self.latest and not self.closed:
+                self.condition.wait(timeout)
+
+            events = list(self.queue)
+            self.queue.clear()
+            events.extend(self.latest.values())
+            self.latest.clear()
+
+            if self.dropped:
+                events.insert(0, {'id': None, 'topic': None, 'type': 'resync', 'data': {'dropped': self.dropped}})
+                self.dropped = 0
+            return events
+
+    def mark_dropped(self, count):
+        """记录未能送达的事件（如重连时需要补发的事件已不在历史记录中），下次读取时发送 resync 事件"""
+        with self.condition:
+            self.dropped += count
+            self.condition.notify()
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify()
+
+
+class EventBus:
+    """
+    进程内事件总线
+
+    警报服务和传感器写入路径发布事件，SSE连接按主题订阅。
+    没有订阅者时发布操作直接返回，空闲时连接线程阻塞等待，不产生轮询开销。
+    最近的非合并事件保留在历史记录中，客户端重连时按 Last-Event-ID 补发。
+    """
+
+    def __init__(self, max_queue=None, history_size=None):
+        self.logger = logging.getLogger("EventBus")
+
+        # 每个订阅者最多积压的事件数量
+        if max_queue is None:
+            max_queue = int(os.environ.get("EVENT_BUS_MAX_QUEUE", 1000))
+        # 用于断线重连补发的历史事件数量
+        if history_size is None:
+            history_size = int(os.environ.get("EVENT_BUS_HISTORY", 500))
+
+        self.max_queue = max_queue
+        self.subscribers = set()
+        self.topic_counts = {topic: 0 for topic in TOPICS}
+        self.history = deque(maxlen=history_size)
+        self.evicted_id = None  # 最近一个移出历史记录的事件ID
+        self.next_id = 1
+        self.lock = threading.Lock()
+
+        # 统计
+        self.published = 0
+
+    def has_subscribers(self, topic):
+        """主题是否有订阅者（发布方可据此跳过事件序列化）"""
+        return self.topic_counts.get(topic, 0) > 0
+
+    def subscribe(self, topics, last_event_id=None):
+        """
+        创建订阅
+
+        Args:
+            topics: 主题列表
+            last_event_id: 客户端收到的最后一个事件ID，重连时补发之后的历史事件
+        """
+        subscription = Subscription(topics, self.max_queue)
+        with self.lock:
+            self.subscribers.add(subscription)
+            for topic in subscription.topics:
+                self.topic_counts[topic] = self.topic_counts.get(topic, 0) + 1
+
+            if last_event_id is not None:
+                # 断线期间的部分事件已移出历史记录，无法补发，通知客户端重新拉取
+                # （合并事件不进入历史记录，不能用历史记录中ID的间隔判断）
+                if self.evicted_id is not None and self.evicted_id > last_event_id:
+                    subscription.mark_dropped(1)
+                for event in self.history:
+                    if event['id'] > last_event_id and event['topic'] in subscription.topics:
+                        subscription.push(event)
+
+        self.logger.info(f"新的事件订阅: {sorted(subscription.topics)}，当前 {len(self.subscribers)} 个订阅")
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            if subscription not in self.subscribers:
+                return
+            self.subscribers.discard(subscription)
+            for topic in subscription.topics:
+                self.topic_counts[topic] -= 1
+        subscription.close()
+
+    def publish(self, topic, event_type, data, coalesce_key=None):
+        """
+        发布事件
+
+        Args:
+            topic: 主题
+            event_type: 事件类型（SSE的event字段）
+            data: 可JSON序列化的事件数据
+            coalesce_key: 合并键，慢客户端只收到同一键的最新事件（不记录历史）
+        """
+        if not self.has_subscribers(topic):
+            return
+
+        with self.lock:
+            event = {'id': self.next_id, 'topic': topic, 'type': event_type, 'data': data}
+            self.next_id += 1
+            self.published += 1
+            if coalesce_key is None:
+                if self.history and len(self.history) == self.history.maxlen:
+                    self.evicted_id = self.history[0]['id']
+                self.history.append(event)
+
+            for subscription in self.subscribers:
+                if topic in subscription.topics:
+                    subscription.push(event, coalesce_key)
+
+    def get_stats(self):
+        with self.lock:
+            return {
+                'subscribers': len(self.subscribers),
+                'topics': dict(self.topic_counts),
+                'published': self.published,
+                'history': len(self.history)
+            }
+
+
+def format_sse(event):
+    """将事件格式化为SSE消息"""
+    lines = []
+    if event.get('id') is not None:
+        lines.append(f"id: {event['id']}")
+    lines.append(f"event: {event['type']}")
+    lines.append(f"data: {dumps(event['data'])}")
+    return "\n".join(lines) + "\n\n"
+
+
+# 进程内共享的事件总线
+_event_bus = None
+_event_bus_lock = threading.Lock()
+
+def get_event_bus():
+    """获取全局事件总线"""
+    global _event_bus
+    with _event_bus_lock:
+        if _event_bus is None:
+            _event_bus = EventBus()
+        return _event_bus
@@ -0,0 +1,285 @@
+import os
+import math
+import logging
+import threading
+from collections import deque
+from datetime import datetime
+from app.models.sensor_data import SensorType
+
+# 异常类型
+ANOMALY_SPIKE = 'spike'  # 读数偏离滚动窗口均值过多
+ANOMALY_RATE = 'rate'    # 上升速率超过限制
+ANOMALY_TREND = 'trend'  # 按当前趋势预计将达到临界值
+
+# 各传感器类型的默认异常检测规则，可在阈值配置中按类型或设备覆盖：
+#   z_score   - 偏离滚动均值的标准差倍数
+#   min_std   - 标准差下限，避免读数平稳时微小波动被判为异常
+#   max_slope - 每分钟最大上升量（None表示不检查）
+DEFAULT_ANOMALY_RULES = {
+    SensorType.CURRENT.value: {'z_score': 4.0, 'min_std': 0.5, 'max_slope': None},
+    SensorType.VOLTAGE.value: {'z_score': 5.0, 'min_std': 2.0, 'max_slope': None},
+    SensorType.TEMPERATURE.value: {'z_score': 4.0, 'min_std': 0.5, 'max_slope': 3.0},
+    SensorType.SMOKE.value: {'z_score': 4.0, 'min_std': 10.0, 'max_slope': 100.0},
+    SensorType.HUMIDITY.value: {'z_score': 5.0, 'min_std': 2.0, 'max_slope': None},
+    SensorType.POWER.value: {'z_score': 4.0, 'min_std': 50.0, 'max_slope': None}
+}
+
+RULE_KEYS = ('z_score', 'min_std', 'max_slope', 'critical')
+
+class RollingStats:
+    """
+    单个设备单个传感器类型的滚动统计
+
+    每条读数以O(1)（摊销）更新：
+    - EWMA均值和方差
+    - 最近N条读数的均值和标准差（滑动Welford算法）
+    - 最近一段时间内读数对时间的线性回归斜率
+    """
+
+    def __init__(self, window_size, slope_seconds, alpha):
+        self.window_size = window_size
+        self.slope_seconds = slope_seconds
+        self.alpha = alpha
+
+        self.count = 0
+        self.ewma = None
+        self.ewm_var = 0.0
+
+        # 滑动窗口均值/方差
+        self.window = deque()
+        self.mean = 0.0
+        self.m2 = 0.0
+
+        # 斜率回归：时间相对origin计算，定期平移origin以保持精度
+        self.points = deque()  # (t, value)
+        self.origin = None
+        self.sum_t = 0.0
+        self.sum_v = 0.0
+        self.sum_tt = 0.0
+        self.sum_tv = 0.0
+        self.last_time = None
+
+    def std(self):
+        n = len(self.window)
+        return math.sqrt(self.m2 / (n - 1)) if n > 1 else 0.0
+
+    def ewm_std(self):
+        return math.sqrt(self.ewm_var)
+
+    def slope(self):
+        """每秒的变化量，样本不足时返回None"""
+        n = len(self.points)
+        if n < 2:
+            return None
+        denominator = n * self.sum_tt - self.sum_t * self.sum_t
+        if denominator <= 0:
+            return None
+        return (n * self.sum_tv - self.sum_t * self.sum_v) / denominator
+
+    def update(self, value, seconds):
+        """加入一条读数（seconds为时间戳的秒数）"""
+        self.count += 1
+
+        # EWMA
+        if self.ewma is None:
+            self.ewma = value
+        else:
+            diff = value - self.ewma
+            self.ewma += self.alpha * diff
+            self.ewm_var = (1 - self.alpha) * (self.ewm_var + self.alpha * diff * diff)
+
+        # 滑动窗口
+        self.window.append(value)
+        n = len(self.window)
+        diff = value - self.mean
+        self.mean += diff / n
+        self.m2 += diff * (value - self.mean)
+        if n > self.window_size:
+            old = self.window.popleft()
+            n -= 1
+            diff = old - self.mean
+            self.mean -= diff / n
+            self.m2 = max(self.m2 - diff * (old - self.mean), 0.0)
+
+        # 迟到的读数不参与斜率计算
+        if self.last_time is not None and seconds < self.last_time:
+            return
+        self.last_time = seconds
+
+        if self.origin is None or seconds - self.origin > self.slope_seconds * 16:
+            self._rebase(seconds)
+
+        t = seconds - self.origin
+        self.points.append((t, value))
+        self.sum_t += t
+        self.sum_v += value
+        self.sum_tt += t * t
+        self.sum_tv += t * value
+
+        while self.points and self.points[0][0] < t - self.slope_seconds:
+            old_t, old_value = self.points.popleft()
+            self.sum_t -= old_t
+            self.sum_v -= old_value
+            self.sum_tt -= old_t * old_t
+            self.sum_tv -= old_t * old_value
+
+    def _rebase(self, seconds):
+        """将时间原点移到最早的样本，重新计算回归累加量"""
+        origin = self.points[0][0] + self.origin if self.points else seconds
+        shift = origin - self.origin if self.origin is not None else 0.0
+        self.points = deque((t - shift, value) for t, value in self.points)
+        self.origin = origin
+        self.sum_t = sum(t for t, _ in self.points)
+        self.sum_v = sum(value for _, value in self.points)
+        self.sum_tt = sum(t * t for t, _ in self.points)
+        self.sum_tv = sum(t * value for t, value in self.points)
+
+    def to_dict(self):
+        slope = self.slope()
+        return {
+            'count': self.count,
+            'ewma': self.ewma,
+            'ewm_std': self.ewm_std(),
+            'mean': self.mean if self.window else None,
+            'std': self.std(),
+            'window': len(self.window),
+            'slope_per_minute': slope * 60 if slope is not None else None
+        }
+
+
+class AnomalyDetector:
+    """
+    传感器变化率与滚动窗口异常检测
+
+    在内存中为每个 (传感器类型, 设备ID) 维护滚动统计，读数写入时内联检查：
+    - spike: 读数偏离滚动均值超过 z_score 倍标准差
+    - rate:  窗口内回归斜率超过每分钟最大上升量
+    - trend: 按EWMA和当前斜率，预计在预测时长内达到临界值
+    不查询历史数据，服务重启后统计从新读数重新积累。
+    """
+
+    def __init__(self, thresholds=None, device_thresholds=None):
+        self.logger = logging.getLogger("AnomalyDetector")
+
+        # 滚动窗口读数数量
+        self.window_size = int(os.environ.get("SENSOR_ANOMALY_WINDOW", 60))
+        # 斜率计算的时间窗口（秒）
+        self.slope_seconds = float(os.environ.get("SENSOR_ANOMALY_SLOPE_SECONDS", 120))
+        # EWMA平滑系数
+        self.alpha = float(os.environ.get("SENSOR_ANOMALY_EWMA_ALPHA", 0.1))
+        # 开始检测前需要积累的读数数量
+        self.min_samples = int(os.environ.get("SENSOR_ANOMALY_MIN_SAMPLES", 10))
+        # 趋势预测时长（秒）
+        self.horizon = float(os.environ.get("SENSOR_ANOMALY_HORIZON", 300))
+
+        self.series = {}  # {(sensor_type, device_id): RollingStats}
+        self.rules = {}
+        self.device_rules = {}
+        self.lock = threading.Lock()
+
+        self.configure(thresholds or {}, device_thresholds)
+
+    def configure(self, thresholds, device_thresholds=None):
+        """根据阈值配置编译检测规则（阈值配置中的同名键覆盖默认规则）"""
+        rules = {}
+        for sensor_type in set(DEFAULT_ANOMALY_RULES) | set(thresholds):
+            rules[sensor_type] = self._merge_rule(sensor_type, thresholds.get(sensor_type, {}))
+
+        device_rules = {}
+        for device_id, overrides in (device_thresholds or {}).items():
+            for sensor_type, config in overrides.items():
+                base = dict(thresholds.get(sensor_type, {}), **config)
+                device_rules[(sensor_type, device_id)] = self._merge_rule(sensor_type, base)
+
+        self.rules = rules
+        self.device_rules = device_rules
+
+    @staticmethod
+    def _merge_rule(sensor_type, config):
+        rule = dict(DEFAULT_ANOMALY_RULES.get(sensor_type, {'z_score': None, 'min_std': 0.0, 'max_slope': None}))
+        rule.update((key, config[key]) for key in RULE_KEYS if key in config)
+        return rule
+
+    def observe(self, sensor_type, device_id, value, timestamp=None):
+        """
+        加入一条读数并检查异常
+
+        Returns:
+            异常列表，每项为 {'kind', 'value', ...统计信息}
+        """
+        key = (sensor_type, device_id)
+        rule = self.device_rules.get(key) or self.rules.get(sensor_type)
+        if rule is None:
+            return []
+
+        seconds = (timestamp or datetime.utcnow()).timestamp()
+
+        with self.lock:
+            stats = self.series.get(key)
+            if stats is None:
+                stats = self.series[key] = RollingStats(self.window_size, self.slope_seconds, self.alpha)
+
+            # 突变基于加入当前读数之前的窗口判断，避免异常值拉高自身的基线
+            anomalies = []
+            if stats.count >= self.min_samples and rule.get('z_score'):
+                std = max(stats.std(), rule.get('min_std') or 0.0)
+                if std > 0 and abs(value - stats.mean) > rule['z_score'] * std:
+                    anomalies.append({
+                        'kind': ANOMALY_SPIKE,
+                        'value': value,
+                        'mean': stats.mean,
+                        'std': std,
+                        'z_score': (value - stats.mean) / std
+                    })
+
+            stats.update(value, seconds)
+
+            if stats.count < self.min_samples:
+                return anomalies
+
+            slope = stats.slope()
+            if slope is None or slope <= 0:
+                return anomalies
+
+            slope_per_minute = slope * 60
+            max_slope = rule.get('max_slope')
+            if max_slope is not None and slope_per_minute > max_slope:
+                anomalies.append({
+                    'kind': ANOMALY_RATE,
+                    'value': value,
+                    'slope_per_minute': slope_per_minute,
+                    'max_slope': max_slope
+                })
+
+            # 已超过临界值的读数由静态阈值处理
+            critical = rule.get('critical')
+            if critical is not None and value < critical:
+                projected = stats.ewma + slope * self.horizon
+                if projected >= critical:
+                    anomalies.append({
+                        'kind': ANOMALY_TREND,
+                        'value': value,
+                        'ewma': stats.ewma,
+                        'slope_per_minute': slope_per_minute,
+                        'critical': critical,
+                        'seconds_to_critical': max((critical - stats.ewma) / slope, 0.0)
+                    })
+
+            return anomalies
+
+    def get_stats(self, sensor_type=None, device_id=None):
+        """
+        获取滚动统计
+
+        Returns:
+            {sensor_type: {device_id: 统计字典}}
+        """
+        result = {}
+        with self.lock:
+            for (series_type, series_device), stats in self.series.items():
+                if sensor_type and series_type != sensor_type:
+                    continue
+                if device_id and series_device != device_id:
+                    continue
+                result.setdefault(series_type, {})[series_device] = stats.to_dict()
+        return result
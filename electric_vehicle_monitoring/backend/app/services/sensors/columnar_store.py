@@ -0,0 +1,381 @@
+import os
+import json
+import logging
+import threading
+import numpy as np
+from datetime import datetime, timedelta
+from urllib.parse import quote, unquote
+
+US_PER_DAY = 86400 * 1000000
+EPOCH = datetime(1970, 1, 1)
+
+def to_epoch_us(timestamps):
+    """将datetime列表转换为自1970年起的微秒数数组（UTC，无时区）"""
+    return np.array(timestamps, dtype='datetime64[us]').astype(np.int64)
+
+
+def from_epoch_us(value):
+    """将微秒数转换为datetime"""
+    return EPOCH + timedelta(microseconds=int(value))
+
+
+class ColumnarSeries:
+    """
+    单个 (传感器类型, 设备ID) 的时间序列
+
+    每天一个分段，时间戳 (int64微秒) 和数值 (float64) 分别追加写入两个二进制文件，
+    读取时通过内存映射直接切片，无需逐行解析。
+    """
+
+    def __init__(self, path, sensor_type, device_id):
+        self.path = path
+        self.sensor_type = sensor_type
+        self.device_id = device_id
+        self.meta = {'sensor_type': sensor_type, 'device_id': device_id}
+
+        # {day: {'count': 行数, 'sorted': 时间戳是否有序（None表示未知）, 'last_ts': 最后一个时间戳}}
+        self.segments = {}
+        self._load()
+
+    def append(self, ts, values, meta=None):
+        """追加读数（ts为微秒数组），按天写入对应分段（需持有存储锁）"""
+        os.makedirs(self.path, exist_ok=True)
+        if meta:
+            self._update_meta(meta)
+
+        days = ts // US_PER_DAY
+        for day in np.unique(days):
+            mask = days == day
+            day_ts, day_values = ts[mask], values[mask]
+            day = int(day)
+
+            # 先写数值再写时间戳，读取时以两者中较短的为准
+            with open(self._file(day, 'val'), 'ab') as f:
+                f.write(day_values.astype(np.float64).tobytes())
+            with open(self._file(day, 'ts'), 'ab') as f:
+                f.write(day_ts.astype(np.int64).tobytes())
+
+            segment = self.segments.get(day)
+            if segment is None:
+                segment = {'count': 0, 'sorted': True, 'last_ts': None}
+                self.segments[day] = segment
+
+            if segment['sorted'] is not False:
+                in_order = bool(np.all(np.diff(day_ts) >= 0))
+                if segment['last_ts'] is not None and day_ts[0] < segment['last_ts']:
+                    in_order = False
+                if not in_order:
+                    segment['sorted'] = False
+            segment['count'] += len(day_ts)
+            segment['last_ts'] = int(day_ts.max()) if segment['last_ts'] is None else max(segment['last_ts'], int(day_ts.max()))
+
+    def read(self, start_us, end_us):
+        """读取 [start_us, end_us] 范围内的读数，返回 (时间戳数组, 数值数组)"""
+        ts_parts, value_parts = [], []
+        for day in sorted(self.segments):
+            if day < start_us // US_PER_DAY or day > end_us // US_PER_DAY:
+                continue
+
+            try:
+                ts, values = self.map_day(day)
+            except FileNotFoundError:
+                # 分段已被保留策略删除
+                continue
+            if not len(ts):
+                continue
+
+            if self._is_sorted(day, ts):
+                lo = np.searchsorted(ts, start_us, side='left')
+                hi = np.searchsorted(ts, end_us, side='right')
+                ts_parts.append(ts[lo:hi])
+                value_parts.append(values[lo:hi])
+            else:
+                mask = (ts >= start_us) & (ts <= end_us)
+                ts_parts.append(ts[mask])
+                value_parts.append(values[mask])
+
+        if not ts_parts:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+        return np.concatenate(ts_parts), np.concatenate(value_parts)
+
+    def last(self):
+        """返回最新一条读数 (时间戳微秒, 数值)，没有数据时返回None"""
+        for day in sorted(self.segments, reverse=True):
+            ts, values = self.map_day(day)
+            if len(ts):
+                index = len(ts) - 1 if self._is_sorted(day, ts) else int(np.argmax(ts))
+                return int(ts[index]), float(values[index])
+        return None
+
+    def days(self):
+        return sorted(self.segments)
+
+    def segment_files(self, day):
+        return [self._file(day, 'ts'), self._file(day, 'val')]
+
+    def remove_day(self, day):
+        """删除一天的分段文件（需持有存储锁）"""
+        for path in self.segment_files(day):
+            if os.path.exists(path):
+                os.remove(path)
+        self.segments.pop(day, None)
+
+    def _load(self):
+        """扫描目录中已有的分段"""
+        meta_path = os.path.join(self.path, 'meta.json')
+        if os.path.exists(meta_path):
+            with open(meta_path, 'r') as f:
+                self.meta.update(json.load(f))
+
+        if not os.path.isdir(self.path):
+            return
+        for name in os.listdir(self.path):
+            if not name.endswith('.ts'):
+                continue
+            day = (datetime.strptime(name[:-3], '%Y-%m-%d') - EPOCH).days
+            count = min(os.path.getsize(self._file(day, 'ts')),
+                        os.path.getsize(self._file(day, 'val'))) // 8
+            self.segments[day] = {'count': count, 'sorted': None, 'last_ts': None}
+
+    def map_day(self, day):
+        """内存映射一天的分段，返回长度一致的 (时间戳, 数值) 数组"""
+        ts_path, value_path = self._file(day, 'ts'), self._file(day, 'val')
+        count = min(os.path.getsize(ts_path), os.path.getsize(value_path)) // 8
+        if count == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+        ts = np.memmap(ts_path, dtype=np.int64, mode='r', shape=(count,))
+        values = np.memmap(value_path, dtype=np.float64, mode='r', shape=(count,))
+        return ts, values
+
+    def _is_sorted(self, day, ts):
+        """分段时间戳是否有序（重启后首次读取时检查一次）"""
+        segment = self.segments[day]
+        if segment['sorted'] is None:
+            segment['sorted'] = bool(np.all(np.diff(ts) >= 0))
+            segment['last_ts'] = int(ts.max())
+        return segment['sorted']
+
+    def _update_meta(self, meta):
+        """记录序列最近的单位和位置信息"""
+        changed = {k: v for k, v in meta.items() if v is not None and self.meta.get(k) != v}
+        if not changed and os.path.exists(os.path.join(self.path, 'meta.json')):
+            return
+        self.meta.update(changed)
+        with open(os.path.join(self.path, 'meta.json'), 'w') as f:
+            json.dump(self.meta, f, ensure_ascii=False)
+
+    def _file(self, day, suffix):
+        name = (EPOCH + timedelta(days=day)).strftime('%Y-%m-%d')
+        return os.path.join(self.path, f"{name}.{suffix}")
+
+
+class ColumnarSensorStore:
+    """
+    列式传感器数据存储
+
+    按 (传感器类型, 设备ID) 分别保存只追加的时间戳/数值数组，
+    范围查询和统计均为对内存映射数组的向量化切片。
+    单位和位置按序列保存最近一次的值，状态和元数据不保存。
+    """
+
+    def __init__(self, root=None):
+        self.logger = logging.getLogger("ColumnarSensorStore")
+        if root is None:
+            root = os.environ.get("SENSOR_COLUMNAR_DIR", "data/sensor_columns")
+        self.root = root
+        self.series = {}  # {(sensor_type, device_id): ColumnarSeries}
+        self.lock = threading.Lock()
+        self._load()
+
+    def append(self, readings):
+        """追加一批读数（字典，键为 sensor_data 表的列名）"""
+        groups = {}
+        for reading in readings:
+            key = (reading['sensor_type'], reading['device_id'])
+            groups.setdefault(key, []).append(reading)
+
+        with self.lock:
+            for key, group in groups.items():
+                series = self.series.get(key)
+                if series is None:
+                    series = ColumnarSeries(self._series_path(*key), *key)
+                    self.series[key] = series
+
+                timestamps = [reading.get('timestamp') or datetime.utcnow() for reading in group]
+                series.append(
+                    to_epoch_us(timestamps),
+                    np.fromiter((reading['value'] for reading in group), dtype=np.float64, count=len(group)),
+                    meta={'unit': group[-1].get('unit'), 'location': group[-1].get('location')}
+                )
+
+    def query(self, start_time, end_time=None, sensor_type=None, device_id=None, limit=100, before=None):
+        """
+        查询时间范围内的读数，按时间倒序返回前limit条（格式同 SensorData.to_dict，timestamp为datetime）
+
+        before 用于游标分页，只返回时间早于该时间的读数
+        """
+        start_us = int(to_epoch_us([start_time])[0])
+        end_us = int(to_epoch_us([end_time])[0]) if end_time else np.iinfo(np.int64).max
+        if before is not None:
+            end_us = min(end_us, int(to_epoch_us([before])[0]) - 1)
+
+        ts_parts, value_parts, series_parts, selected = [], [], [], []
+        for series in self._select(sensor_type, device_id):
+            ts, values = series.read(start_us, end_us)
+            if len(ts):
+                # 每个序列只需保留最新的limit条
+                if limit and len(ts) > limit:
+                    top = np.argpartition(ts, len(ts) - limit)[len(ts) - limit:]
+                    ts, values = ts[top], values[top]
+                ts_parts.append(ts)
+                value_parts.append(values)
+                series_parts.append(np.full(len(ts), len(selected), dtype=np.int32))
+                selected.append(series)
+
+        if not ts_parts:
+            return []
+
+        ts = np.concatenate(ts_parts)
+        values = np.concatenate(value_parts)
+        series_index = np.concatenate(series_parts)
+        order = np.argsort(ts, kind='stable')[::-1]
+        if limit:
+            order = order[:limit]
+
+        return [self._to_reading(selected[series_index[i]], ts[i], values[i]) for i in order]
+
+    def iter_range(self, start_time, end_time, sensor_type=None, device_id=None):
+        """
+        按时间正序逐天生成范围内的读数（格式同 SensorData.to_dict，timestamp为datetime），内存占用以一天的数据为上限
+        """
+        start_us = int(to_epoch_us([start_time])[0])
+        end_us = int(to_epoch_us([end_time])[0])
+        selected = self._select(sensor_type, device_id)
+        days = sorted({day for series in selected for day in series.days()
+                       if start_us // US_PER_DAY <= day <= end_us // US_PER_DAY})
+
+        for day in days:
+            day_start = max(start_us, day * US_PER_DAY)
+            day_end = min(end_us, (day + 1) * US_PER_DAY - 1)
+
+            ts_parts, value_parts, series_parts, day_series = [], [], [], []
+            for series in selected:
+                if day not in series.segments:
+                    continue
+                ts, values = series.read(day_start, day_end)
+                if len(ts):
+                    ts_parts.append(ts)
+                    value_parts.append(values)
+                    series_parts.append(np.full(len(ts), len(day_series), dtype=np.int32))
+                    day_series.append(series)
+
+            if not ts_parts:
+                continue
+
+            ts = np.concatenate(ts_parts)
+            values = np.concatenate(value_parts)
+            series_index = np.concatenate(series_parts)
+            for i in np.argsort(ts, kind='stable'):
+                yield self._to_reading(day_series[series_index[i]], ts[i], values[i])
+
+    def average(self, sensor_type, start_time, end_time=None, device_id=None):
+        """计算时间范围内读数的平均值，没有数据时返回None"""
+        start_us = int(to_epoch_us([start_time])[0])
+        end_us = int(to_epoch_us([end_time])[0]) if end_time else np.iinfo(np.int64).max
+
+        total, count = 0.0, 0
+        for series in self._select(sensor_type, device_id):
+            _, values = series.read(start_us, end_us)
+            total += float(values.sum())
+            count += len(values)
+        return total / count if count else None
+
+    def latest(self):
+        """返回每个序列的最新读数列表（timestamp为datetime）"""
+        readings = []
+        for series in list(self.series.values()):
+            last = series.last()
+            if last is not None:
+                readings.append(self._to_reading(series, *last))
+        return readings
+
+    def expired_days(self, cutoff):
+        """返回早于cutoff日期的分段日期（自1970年起的天数）"""
+        cutoff_day = (cutoff - EPOCH).days
+        with self.lock:
+            return sorted({day for series in self.series.values() for day in series.days() if day < cutoff_day})
+
+    def drop_day(self, day, archive_dir=None):
+        """
+        删除一天的所有分段，archive_dir不为空时先将其压缩归档
+
+        Returns:
+            (删除的读数数量, 归档文件列表)
+        """
+        with self.lock:
+            rows, files = 0, []
+            for (sensor_type, device_id), series in self.series.items():
+                if day not in series.segments:
+                    continue
+
+                ts, values = series.map_day(day)
+                rows += len(ts)
+                if archive_dir and len(ts):
+                    path = os.path.join(archive_dir, sensor_type, quote(device_id, safe=''),
+                                        f"{from_epoch_us(day * US_PER_DAY).date()}.npz")
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    np.savez_compressed(path, timestamp=np.asarray(ts), value=np.asarray(values))
+                    files.append(path)
+                del ts, values
+                series.remove_day(day)
+            return rows, files
+
+    def get_stats(self):
+        """获取存储统计信息"""
+        with self.lock:
+            return {
+                'series': len(self.series),
+                'segments': sum(len(series.segments) for series in self.series.values()),
+                'rows': sum(segment['count'] for series in self.series.values()
+                            for segment in series.segments.values())
+            }
+
+    def _select(self, sensor_type=None, device_id=None):
+        """按类型和设备筛选序列"""
+        return [
+            series for (series_type, series_device), series in list(self.series.items())
+            if (not sensor_type or series_type == sensor_type)
+            and (not device_id or series_device == device_id)
+        ]
+
+    def _load(self):
+        """加载已有的序列目录 <root>/<sensor_type>/<device_id>/"""
+        if not os.path.isdir(self.root):
+            return
+        for sensor_type in os.listdir(self.root):
+            type_dir = os.path.join(self.root, sensor_type)
+            if not os.path.isdir(type_dir):
+                continue
+            for device_dir in os.listdir(type_dir):
+                device_id = unquote(device_dir)
+                self.series[(sensor_type, device_id)] = ColumnarSeries(
+                    os.path.join(type_dir, device_dir), sensor_type, device_id
+                )
+        self.logger.info(f"已加载 {len(self.series)} 个传感器时间序列: {self.root}")
+
+    def _series_path(self, sensor_type, device_id):
+        return os.path.join(self.root, sensor_type, quote(device_id, safe=''))
+
+    @staticmethod
+    def _to_reading(series, ts, value):
+        return {
+            'id': None,
+            'sensor_type': series.sensor_type,
+            'value': float(value),
+            'device_id': series.device_id,
+            'location': series.meta.get('location'),
+            'timestamp': from_epoch_us(ts),
+            'unit': series.meta.get('unit'),
+            'status': None,
+            'metadata': None
+        }
@@ -0,0 +1,116 @@
+import logging
+import threading
+from datetime import datetime
+
+class LatestReadingCache:
+    """
+    传感器最新读数缓存
+
+    按 (传感器类型, 设备ID) 保存最新一条读数，所有写入路径在写入时更新，
+    查询最新数据时直接读取内存，首次访问时从存储加载初始值。
+    """
+
+    def __init__(self, loader, listener=None):
+        self.logger = logging.getLogger("LatestReadingCache")
+        self.loader = loader  # 从存储加载每个设备最新读数的函数
+        self.listener = listener  # 最新读数变化时的回调，参数为变化的读数字典列表
+        self.readings = {}  # {(sensor_type, device_id): 读数字典}
+        self.loaded = False
+        self.lock = threading.Lock()
+
+    def update(self, readings):
+        """
+        用一批读数更新缓存，只保留每个设备时间最新的读数
+
+        Args:
+            readings: 读数字典列表，键为 sensor_data 表的列名
+        """
+        updated = self._apply(readings)
+        if updated and self.listener is not None:
+            self.listener(updated)
+
+    def _apply(self, readings):
+        """写入缓存，返回成为最新值的读数列表（每个设备一条）"""
+        updated = {}
+        with self.lock:
+            for reading in readings:
+                key = (reading['sensor_type'], reading['device_id'])
+                current = self.readings.get(key)
+                timestamp = reading.get('timestamp') or datetime.utcnow()
+                if current is not None and current['timestamp'] > timestamp:
+                    continue
+
+                self.readings[key] = {
+                    'id': reading.get('id'),
+                    'sensor_type': reading['sensor_type'],
+                    'value': reading['value'],
+                    'device_id': reading['device_id'],
+                    'location': reading.get('location'),
+                    'timestamp': timestamp,
+                    'unit': reading.get('unit'),
+                    'status': reading.get('status'),
+                    'metadata': reading.get('metadata')
+                }
+                updated[key] = self.readings[key]
+        return list(updated.values())
+
+    def get_latest(self, sensor_type=None, device_id=None):
+        """
+        获取最新读数
+
+        Returns:
+            {sensor_type: {device_id: 读数字典}}
+        """
+        self._ensure_loaded()
+
+        result = {}
+        with self.lock:
+            for (reading_type, reading_device), reading in self.readings.items():
+                if sensor_type and reading_type != sensor_type:
+                    continue
+                if device_id and reading_device != device_id:
+                    continue
+                result.setdefault(reading_type, {})[reading_device] = self.to_dict(reading)
+        return result
+
+    def get_latest_by_type(self, device_id=None):
+        """
+        获取每种传感器类型时间最新的一条读数（可限定设备）
+
+        Returns:
+            {sensor_type: 读数字典}
+        """
+        self._ensure_loaded()
+
+        latest = {}
+        with self.lock:
+            for (reading_type, reading_device), reading in self.readings.items():
+                if device_id and reading_device != device_id:
+                    continue
+                current = latest.get(reading_type)
+                if current is None or reading['timestamp'] > current['timestamp']:
+                    latest[reading_type] = reading
+        return {reading_type: self.to_dict(reading) for reading_type, reading in latest.items()}
+
+    def get_location(self, sensor_type, device_id):
+        """获取设备最新读数中记录的位置（未缓存时返回None）"""
+        reading = self.readings.get((sensor_type, device_id))
+        return reading['location'] if reading else None
+
+    def _ensure_loaded(self):
+        """首次访问时从存储加载每个设备的最新读数（需在应用上下文中调用）"""
+        if self.loaded:
+            return
+
+        readings = self.loader()
+        # 加载期间写入的更新读数优先，只接受时间更新的读数；初始值不通知监听者
+        self._apply(readings)
+        self.loaded = True
+        self.logger.info(f"已加载 {len(readings)} 个设备的最新传感器读数")
+
+    @staticmethod
+    def to_dict(reading):
+        """转换为与 SensorData.to_dict() 相同的格式"""
+        result = dict(reading)
+        result['timestamp'] = reading['timestamp'].isoformat()
+        return result
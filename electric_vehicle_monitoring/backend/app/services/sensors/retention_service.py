@@ -0,0 +1,407 @@
+import os
+import json
+import time
+import logging
+import threading
+import numpy as np
+from datetime import datetime, timedelta
+from app.models.sensor_data import SensorData, SensorDataChunk
+from app import db
+
+# 原始读数的列（按 sensor_data 表列名）
+STRING_COLUMNS = ('sensor_type', 'device_id', 'location', 'unit', 'status', 'metadata')
+
+# 汇总数据的默认保留天数（0 表示永久保留）
+ROLLUP_RETENTION_DEFAULTS = {'1m': 30, '1h': 365, '1d': 0}
+
+class NpzChunkWriter:
+    """将一天的原始读数写入压缩NPZ文件，每个文件最多 part_rows 行"""
+
+    def __init__(self, base_path, part_rows):
+        self.base_path = base_path
+        self.part_rows = part_rows
+        self.paths = []
+        self.columns = None
+        self.rows = 0
+        self._reset()
+
+    def write(self, columns):
+        """追加一批列数据"""
+        for name, values in columns.items():
+            self.columns[name].append(values)
+        self.rows += len(columns['id'])
+        if self.rows >= self.part_rows:
+            self._flush()
+
+    def close(self):
+        """写入剩余数据，返回全部文件路径"""
+        if self.rows:
+            self._flush()
+        return self.paths
+
+    def _reset(self):
+        self.columns = {name: [] for name in ('id', 'timestamp', 'value') + STRING_COLUMNS}
+        self.rows = 0
+
+    def _flush(self):
+        path = f"{self.base_path}.part{len(self.paths):03d}.npz"
+        arrays = {
+            'id': np.concatenate(self.columns['id']),
+            'timestamp': np.concatenate(self.columns['timestamp']),
+            'value': np.concatenate(self.columns['value'])
+        }
+        # 字符串列按字典编码保存：codes 为取值下标（-1 表示空值），values 为取值表
+        for name in STRING_COLUMNS:
+            codes, values = _dictionary_encode([v for chunk in self.columns[name] for v in chunk])
+            arrays[f"{name}_codes"] = codes
+            arrays[f"{name}_values"] = values
+
+        with open(path, 'wb') as f:
+            np.savez_compressed(f, **arrays)
+            f.flush()
+            os.fsync(f.fileno())
+        self.paths.append(path)
+        self._reset()
+
+
+class ParquetChunkWriter:
+    """将一天的原始读数写入单个Parquet文件（需要安装pyarrow）"""
+
+    def __init__(self, base_path, part_rows):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self.pa = pa
+        self.path = f"{base_path}.parquet"
+        self.schema = pa.schema(
+            [('id', pa.int64()), ('timestamp', pa.timestamp('us')), ('value', pa.float64())]
+            + [(name, pa.dictionary(pa.int32(), pa.string())) for name in STRING_COLUMNS]
+        )
+        self.writer = pq.ParquetWriter(self.path, self.schema, compression='zstd')
+
+    def write(self, columns):
+        """追加一批列数据（写为一个行组）"""
+        arrays = [
+            self.pa.array(columns['id'], type=self.pa.int64()),
+            self.pa.array(columns['timestamp'], type=self.pa.timestamp('us')),
+            self.pa.array(columns['value'], type=self.pa.float64())
+        ] + [
+            self.pa.array(columns[name], type=self.pa.string()).dictionary_encode()
+            for name in STRING_COLUMNS
+        ]
+        self.writer.write_table(self.pa.Table.from_arrays(arrays, schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+        return [self.path]
+
+
+ARCHIVE_WRITERS = {
+    'npz': NpzChunkWriter,
+    'parquet': ParquetChunkWriter
+}
+
+
+class SensorRetentionService:
+    """
+    传感器原始数据保留策略
+
+    原始读数按天分块：超过保留期的整天数据先确认已汇总（缺失时按原始数据重建汇总），
+    再归档为压缩列式文件，最后按主键范围整块删除，并在分块目录中记录。
+    近期数据保留在数据库中，更早的历史查询由汇总表提供。
+    使用列式存储时，过期的按天分段文件直接压缩归档后删除。
+    """
+
+    def __init__(self, storage, rollups, app_context, retention_days=None, archive_format=None,
+                 archive_dir=None, interval=None, batch_size=None, part_rows=None):
+        self.logger = logging.getLogger("SensorRetentionService")
+        self.storage = storage
+        self.rollups = rollups
+        self.app_context = app_context  # 返回后台线程使用的应用上下文
+
+        # 原始数据保留天数（0 表示不清理）
+        if retention_days is None:
+            retention_days = int(os.environ.get("SENSOR_RETENTION_DAYS", 30))
+        # 归档格式：npz / parquet / none（不归档直接删除）
+        if archive_format is None:
+            archive_format = os.environ.get("SENSOR_ARCHIVE_FORMAT", "npz")
+        if archive_dir is None:
+            archive_dir = os.environ.get("SENSOR_ARCHIVE_DIR", "archive/sensor_data")
+        # 检查间隔（秒）
+        if interval is None:
+            interval = float(os.environ.get("SENSOR_RETENTION_INTERVAL", 3600))
+        # 归档时每批读取的行数
+        if batch_size is None:
+            batch_size = int(os.environ.get("SENSOR_ARCHIVE_BATCH_SIZE", 50000))
+        # 每个NPZ文件的最大行数
+        if part_rows is None:
+            part_rows = int(os.environ.get("SENSOR_ARCHIVE_PART_ROWS", 1000000))
+
+        if archive_format != 'none' and archive_format not in ARCHIVE_WRITERS:
+            raise ValueError(f"不支持的归档格式: {archive_format}")
+
+        self.retention_days = retention_days
+        self.archive_format = archive_format
+        self.archive_dir = archive_dir
+        self.interval = interval
+        self.batch_size = batch_size
+        self.part_rows = part_rows
+
+        # 各粒度汇总数据的保留天数
+        self.rollup_retention = {
+            resolution: int(os.environ.get(f"SENSOR_ROLLUP_{resolution.upper()}_RETENTION_DAYS", days))
+            for resolution, days in ROLLUP_RETENTION_DEFAULTS.items()
+        }
+
+        self.thread = None
+        self.is_running = False
+        self.stop_event = threading.Event()
+        self.lock = threading.Lock()  # 同一时间只执行一次清理
+
+        # 统计信息
+        self.stats = {
+            'runs': 0,
+            'chunks_archived': 0,
+            'rows_removed': 0,
+            'rollups_rebuilt': 0,
+            'last_run_at': None,
+            'last_run_duration': 0.0,
+            'last_error': None
+        }
+
+    def start(self):
+        """启动后台清理线程"""
+        if self.is_running or self.retention_days <= 0:
+            return
+
+        self.is_running = True
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._run, name="sensor-retention", daemon=True)
+        self.thread.start()
+        self.logger.info(f"启动传感器数据保留策略，原始数据保留 {self.retention_days} 天，归档格式: {self.archive_format}")
+
+    def stop(self):
+        """停止后台清理线程"""
+        self.is_running = False
+        self.stop_event.set()
+
+    def get_stats(self):
+        """获取清理统计信息"""
+        stats = dict(self.stats)
+        stats['retention_days'] = self.retention_days
+        stats['archive_format'] = self.archive_format
+        stats['rollup_retention_days'] = dict(self.rollup_retention)
+        return stats
+
+    def run_once(self, now=None):
+        """
+        清理所有已过期的整天分块（需在应用上下文中调用）
+
+        Returns:
+            处理的分块列表
+        """
+        if now is None:
+            now = datetime.utcnow()
+
+        with self.lock:
+            start = time.time()
+            cutoff = now.replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=self.retention_days)
+
+            chunks = []
+            if self.storage.name == 'columnar':
+                for day in self.storage.expired_days(cutoff):
+                    chunks.append(self._process_columnar_chunk(day))
+            else:
+                day_start = self._next_expired_day(None, cutoff)
+                while day_start is not None:
+                    chunks.append(self._process_chunk(day_start))
+                    day_start = self._next_expired_day(day_start + timedelta(days=1), cutoff)
+
+            self._purge_rollups(now)
+
+            self.stats['runs'] += 1
+            self.stats['last_run_at'] = now.isoformat()
+            self.stats['last_run_duration'] = round(time.time() - start, 3)
+            return chunks
+
+    def _run(self):
+        """后台清理线程"""
+        while self.is_running:
+            # 回滚也需要在应用上下文中进行，否则异常会终止清理线程
+            with self.app_context():
+                try:
+                    chunks = self.run_once()
+                    if chunks:
+                        self.logger.info(f"已清理 {len(chunks)} 天的传感器原始数据")
+                    self.stats['last_error'] = None
+                except Exception as e:
+                    db.session.rollback()
+                    self.stats['last_error'] = str(e)
+                    self.logger.error(f"传感器数据清理失败: {e}")
+
+            self.stop_event.wait(self.interval)
+
+    def _next_expired_day(self, since, cutoff):
+        """通过时间索引找到下一个早于cutoff的数据所在日期"""
+        query = db.session.query(db.func.min(SensorData.timestamp)).filter(SensorData.timestamp < cutoff)
+        if since is not None:
+            query = query.filter(SensorData.timestamp >= since)
+
+        oldest = query.scalar()
+        if oldest is None:
+            return None
+        return oldest.replace(hour=0, minute=0, second=0, microsecond=0)
+
+    def _process_chunk(self, day_start):
+        """处理一天的分块：确认汇总、归档、按主键范围删除并登记"""
+        day_end = day_start + timedelta(days=1)
+
+        chunk = SensorDataChunk.query.filter_by(day=day_start.date()).first()
+
+        # 汇总表启用之前写入的数据需要先补建汇总；
+        # 已归档过的日期只剩晚到数据，这些数据写入时已汇总，不能按剩余数据重建
+        if chunk is None:
+            row_count = db.session.query(db.func.count(SensorData.id)).filter(
+                SensorData.timestamp >= day_start,
+                SensorData.timestamp < day_end
+            ).scalar()
+            if self.rollups.count_rolled_up(day_start) != row_count:
+                self._rebuild_rollups(day_start, day_end)
+
+        ids, archive_files = self._archive(day_start, day_end)
+        removed = self._delete_ids(ids)
+
+        id_range = (int(ids[0]), int(ids[-1])) if len(ids) else None
+        return self._record_chunk(chunk, day_start.date(), removed, archive_files, id_range)
+
+    def _process_columnar_chunk(self, day):
+        """处理列式存储中一天的分段：写入时已汇总，直接归档并删除分段文件"""
+        archive_dir = self.archive_dir if self.archive_format != 'none' else None
+        removed, archive_files = self.storage.drop_day(day, archive_dir)
+
+        chunk = SensorDataChunk.query.filter_by(day=day).first()
+        return self._record_chunk(chunk, day, removed, archive_files, None, archive_format='npz')
+
+    def _record_chunk(self, chunk, day, removed, archive_files, id_range, archive_format=None):
+        """在分块目录中登记已处理的分块并提交事务"""
+        if chunk is None:
+            chunk = SensorDataChunk(day=day, row_count=0, archive_files=[])
+            db.session.add(chunk)
+
+        # 同一天的晚到数据会在后续清理中追加到已有分块
+        chunk.status = 'archived' if archive_files else 'dropped'
+        chunk.row_count += removed
+        if id_range is not None:
+            chunk.first_id = id_range[0] if chunk.first_id is None else min(chunk.first_id, id_range[0])
+            chunk.last_id = id_range[1] if chunk.last_id is None else max(chunk.last_id, id_range[1])
+        chunk.archive_format = (archive_format or self.archive_format) if archive_files else None
+        chunk.archive_files = list(chunk.archive_files or []) + archive_files
+        chunk.archived_at = datetime.utcnow()
+        db.session.commit()
+
+        self.stats['chunks_archived'] += 1
+        self.stats['rows_removed'] += removed
+        self.logger.info(f"已归档传感器数据分块 {day}: {removed} 条")
+        return chunk.to_dict()
+
+    def _iter_batches(self, day_start, day_end):
+        """按主键顺序分批读取一天的原始读数，返回列数据字典"""
+        table = SensorData.__table__
+        last_id = 0
+        while True:
+            rows = db.session.execute(
+                db.select(table).where(
+                    table.c.timestamp >= day_start,
+                    table.c.timestamp < day_end,
+                    table.c.id > last_id
+                ).order_by(table.c.id).limit(self.batch_size)
+            ).all()
+            if not rows:
+                return
+
+            last_id = rows[-1].id
+            yield {
+                'id': np.fromiter((row.id for row in rows), dtype=np.int64, count=len(rows)),
+                'timestamp': np.array([row.timestamp for row in rows], dtype='datetime64[us]'),
+                'value': np.fromiter((row.value for row in rows), dtype=np.float64, count=len(rows)),
+                'sensor_type': [row.sensor_type for row in rows],
+                'device_id': [row.device_id for row in rows],
+                'location': [row.location for row in rows],
+                'unit': [row.unit for row in rows],
+                'status': [row.status for row in rows],
+                'metadata': [
+                    json.dumps(row._mapping['metadata']) if row._mapping['metadata'] is not None else None
+                    for row in rows
+                ]
+            }
+
+    def _rebuild_rollups(self, day_start, day_end):
+        """按原始读数重建某一天的汇总数据"""
+        with self.rollups.lock:
+            self.rollups.clear(day_start, day_end)
+            for columns in self._iter_batches(day_start, day_end):
+                self.rollups.apply([
+                    {'sensor_type': sensor_type, 'device_id': device_id, 'value': float(value), 'timestamp': timestamp}
+                    for sensor_type, device_id, value, timestamp in zip(
+                        columns['sensor_type'], columns['device_id'],
+                        columns['value'], columns['timestamp'].astype(datetime)
+                    )
+                ])
+            db.session.commit()
+        self.stats['rollups_rebuilt'] += 1
+        self.logger.info(f"已重建传感器数据汇总 {day_start.date()}")
+
+    def _archive(self, day_start, day_end):
+        """将一天的原始读数写入归档文件，返回 (已排序的读数ID数组, 归档文件列表)"""
+        writer = None
+        if self.archive_format != 'none':
+            directory = os.path.join(self.archive_dir, day_start.strftime('%Y'))
+            os.makedirs(directory, exist_ok=True)
+            # 晚到数据的再次归档使用带时间戳的文件名，避免覆盖已有归档
+            base_path = os.path.join(directory, f"{day_start.date()}-{int(time.time())}")
+            writer = ARCHIVE_WRITERS[self.archive_format](base_path, self.part_rows)
+
+        ids = []
+        for columns in self._iter_batches(day_start, day_end):
+            ids.append(columns['id'])
+            if writer is not None:
+                writer.write(columns)
+
+        archive_files = writer.close() if writer is not None else []
+        ids = np.concatenate(ids) if ids else np.empty(0, dtype=np.int64)
+        return ids, archive_files
+
+    def _delete_ids(self, ids):
+        """将有序ID合并为连续区间，按主键范围删除（不提交事务）"""
+        if not len(ids):
+            return 0
+
+        table = SensorData.__table__
+        breaks = np.flatnonzero(np.diff(ids) != 1) + 1
+        starts = np.concatenate([[ids[0]], ids[breaks]])
+        ends = np.concatenate([ids[breaks - 1], [ids[-1]]])
+
+        removed = 0
+        for first_id, last_id in zip(starts.tolist(), ends.tolist()):
+            result = db.session.execute(table.delete().where(table.c.id.between(first_id, last_id)))
+            removed += result.rowcount
+        return removed
+
+    def _purge_rollups(self, now):
+        """按各粒度的保留天数清理汇总数据"""
+        for resolution, days in self.rollup_retention.items():
+            if days > 0:
+                self.rollups.purge(resolution, now - timedelta(days=days))
+        db.session.commit()
+
+
+def _dictionary_encode(values):
+    """字典编码字符串列，返回 (int32下标数组, 字符串取值数组)"""
+    lookup = {}
+    codes = np.empty(len(values), dtype=np.int32)
+    for i, value in enumerate(values):
+        if value is None:
+            codes[i] = -1
+        else:
+            codes[i] = lookup.setdefault(value, len(lookup))
+    return codes, np.array(list(lookup), dtype=str)
@@ -0,0 +1,201 @@
+import os
+import logging
+import threading
+from datetime import datetime, timedelta
+from sqlalchemy import select
+from app.models.sensor_data import SensorRollup
+from app import db
+
+# 汇总粒度及对应的时间桶长度，按从细到粗排列
+RESOLUTIONS = {
+    '1m': timedelta(minutes=1),
+    '1h': timedelta(hours=1),
+    '1d': timedelta(days=1)
+}
+
+class SensorRollupService:
+    """
+    传感器数据降采样汇总服务
+
+    原始读数写入数据库时，在同一事务中按 (粒度, 传感器类型, 设备ID, 时间桶)
+    累加到汇总表；查询长时间范围时直接读取汇总数据，无需扫描原始读数。
+    """
+
+    def __init__(self, max_points=None, raw_max_range=None):
+        self.logger = logging.getLogger("SensorRollupService")
+
+        # 自动选择粒度时每条曲线的最大数据点数
+        if max_points is None:
+            max_points = int(os.environ.get("SENSOR_ROLLUP_MAX_POINTS", 1500))
+        # 不超过该时间范围（秒）的查询直接返回原始读数
+        if raw_max_range is None:
+            raw_max_range = float(os.environ.get("SENSOR_RAW_MAX_RANGE", 3600))
+
+        self.max_points = max_points
+        self.raw_max_range = timedelta(seconds=raw_max_range)
+
+        # 汇总行的"读取-合并-写入"需串行执行，避免并发插入同一时间桶
+        self.lock = threading.Lock()
+
+    def apply(self, readings):
+        """
+        将一批读数累加到汇总表（不提交事务，由调用方与原始读数一起提交）
+
+        调用方需持有 self.lock 直到事务提交。
+
+        Args:
+            readings: 读数字典列表，至少包含 sensor_type, device_id, value, timestamp
+        """
+        for resolution in RESOLUTIONS:
+            buckets = self._aggregate(readings, resolution)
+            if buckets:
+                self._merge(resolution, buckets)
+
+    def clear(self, start_time, end_time):
+        """删除时间桶落在 [start_time, end_time) 内的汇总行（用于按原始数据重建）"""
+        return SensorRollup.query.filter(
+            SensorRollup.bucket_start >= start_time,
+            SensorRollup.bucket_start < end_time
+        ).delete(synchronize_session=False)
+
+    def count_rolled_up(self, day_start):
+        """返回某一天的日汇总所覆盖的读数数量"""
+        return db.session.query(db.func.coalesce(db.func.sum(SensorRollup.count), 0)).filter(
+            SensorRollup.resolution == '1d',
+            SensorRollup.bucket_start == day_start
+        ).scalar()
+
+    def purge(self, resolution, before):
+        """删除指定粒度中早于 before 的汇总行"""
+        return SensorRollup.query.filter(
+            SensorRollup.resolution == resolution,
+            SensorRollup.bucket_start < before
+        ).delete(synchronize_session=False)
+
+    def choose_resolution(self, start_time, end_time):
+        """根据查询时间范围选择粒度，返回 'raw' 或汇总粒度"""
+        span = end_time - start_time
+        if span <= self.raw_max_range:
+            return 'raw'
+
+        for resolution, width in RESOLUTIONS.items():
+            if span / width <= self.max_points:
+                return resolution
+        return '1d'
+
+    def query(self, resolution, start_time, end_time, sensor_type=None, device_id=None, limit=None):
+        """
+        查询指定粒度的汇总数据，按时间倒序返回
+
+        只查询所需的列，直接构造与 SensorRollup.to_dict 相同的字典（timestamp为datetime）
+        """
+        query = select(
+            SensorRollup.sensor_type, SensorRollup.device_id, SensorRollup.bucket_start, SensorRollup.count,
+            SensorRollup.min_value, SensorRollup.max_value, SensorRollup.sum_value, SensorRollup.last_value
+        ).where(
+            SensorRollup.resolution == resolution,
+            SensorRollup.bucket_start >= self.bucket_start(start_time, resolution),
+            SensorRollup.bucket_start <= end_time
+        )
+        if sensor_type:
+            query = query.where(SensorRollup.sensor_type == sensor_type)
+        if device_id:
+            query = query.where(SensorRollup.device_id == device_id)
+
+        query = query.order_by(SensorRollup.bucket_start.desc())
+        if limit:
+            query = query.limit(limit)
+
+        rollups = []
+        for sensor_type, device_id, bucket_start, count, min_value, max_value, sum_value, last_value in db.session.execute(query):
+            avg_value = sum_value / count if count else None
+            rollups.append({
+                'sensor_type': sensor_type,
+                'device_id': device_id,
+                'resolution': resolution,
+                'timestamp': bucket_start,
+                'value': avg_value,
+                'count': count,
+                'min': min_value,
+                'max': max_value,
+                'avg': avg_value,
+                'last': last_value
+            })
+        return rollups
+
+    @staticmethod
+    def bucket_start(timestamp, resolution):
+        """计算时间戳所在时间桶的起始时间"""
+        if resolution == '1m':
+            return timestamp.replace(second=0, microsecond=0)
+        if resolution == '1h':
+            return timestamp.replace(minute=0, second=0, microsecond=0)
+        return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+
+    def _aggregate(self, readings, resolution):
+        """在内存中将读数按时间桶汇总"""
+        buckets = {}
+        for reading in readings:
+            timestamp = reading.get('timestamp') or datetime.utcnow()
+            value = reading['value']
+            key = (reading['sensor_type'], reading['device_id'], self.bucket_start(timestamp, resolution))
+
+            bucket = buckets.get(key)
+            if bucket is None:
+                buckets[key] = {
+                    'count': 1,
+                    'min': value,
+                    'max': value,
+                    'sum': value,
+                    'last': value,
+                    'last_timestamp': timestamp
+                }
+                continue
+
+            bucket['count'] += 1
+            bucket['sum'] += value
+            if value < bucket['min']:
+                bucket['min'] = value
+            if value > bucket['max']:
+                bucket['max'] = value
+            if timestamp >= bucket['last_timestamp']:
+                bucket['last'] = value
+                bucket['last_timestamp'] = timestamp
+        return buckets
+
+    def _merge(self, resolution, buckets):
+        """将内存汇总结果合并到已有的汇总行，不存在时新建"""
+        existing = {
+            (row.sensor_type, row.device_id, row.bucket_start): row
+            for row in SensorRollup.query.filter(
+                SensorRollup.resolution == resolution,
+                SensorRollup.sensor_type.in_({key[0] for key in buckets}),
+                SensorRollup.device_id.in_({key[1] for key in buckets}),
+                SensorRollup.bucket_start.in_({key[2] for key in buckets})
+            )
+        }
+
+        for key, bucket in buckets.items():
+            row = existing.get(key)
+            if row is None:
+                db.session.add(SensorRollup(
+                    resolution=resolution,
+                    sensor_type=key[0],
+                    device_id=key[1],
+                    bucket_start=key[2],
+                    count=bucket['count'],
+                    min_value=bucket['min'],
+                    max_value=bucket['max'],
+                    sum_value=bucket['sum'],
+                    last_value=bucket['last'],
+                    last_timestamp=bucket['last_timestamp']
+                ))
+                continue
+
+            row.count += bucket['count']
+            row.sum_value += bucket['sum']
+            row.min_value = bucket['min'] if row.min_value is None else min(row.min_value, bucket['min'])
+            row.max_value = bucket['max'] if row.max_value is None else max(row.max_value, bucket['max'])
+            if row.last_timestamp is None or bucket['last_timestamp'] >= row.last_timestamp:
+                row.last_value = bucket['last']
+                row.last_timestamp = bucket['last_timestamp']
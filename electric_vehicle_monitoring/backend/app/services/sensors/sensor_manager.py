@@ -1,12 +1,48 @@
 import os
 import json
+import atexit
 import logging
 import threading
 import time
-from datetime import datetime
+import numpy as np
+from contextlib import nullcontext
+from datetime import datetime, timedelta
 from app.models.sensor_data import SensorData, SensorType
 from app import db
 from app.services.alerts.alert_service import AlertService
+from app.services.alerts.fusion_service import get_fusion_service
+from app.services.events.event_bus import get_event_bus, TOPIC_SENSORS
+from app.services.sensors.write_buffer import SensorWriteBuffer
+from app.services.sensors.rollup_service import SensorRollupService
+from app.services.sensors.latest_cache import LatestReadingCache
+from app.services.sensors.retention_service import SensorRetentionService
+from app.services.sensors.sensor_storage import create_storage
+from app.services.sensors.threshold_engine import ThresholdEngine, LEVEL_NAMES
+from app.services.sensors.anomaly_detector import AnomalyDetector, ANOMALY_SPIKE, ANOMALY_RATE, ANOMALY_TREND
+
+# 各传感器类型的警报配置: (警报类型, 消息模板, 临界级别严重程度, 其他级别严重程度)
+SENSOR_ALERTS = {
+    SensorType.CURRENT.value: ('OVERCURRENT', "电流异常: {value}A", 4, 3),
+    SensorType.VOLTAGE.value: ('SYSTEM_ERROR', "电压异常: {value}V", 4, 3),
+    SensorType.TEMPERATURE.value: ('OVERHEAT', "温度过高: {value}°C", 5, 4),
+    SensorType.SMOKE.value: ('SMOKE', "检测到烟雾: {value}ppm", 5, 4)
+}
+
+# 送入融合服务的事件置信度，按超限级别或异常类型（低于最小值不视为火灾征兆）
+FUSION_CONFIDENCE = {
+    'critical': 1.0,
+    'warning': 0.7,
+    ANOMALY_TREND: 0.8,
+    ANOMALY_RATE: 0.7,
+    ANOMALY_SPIKE: 0.5
+}
+
+# 滚动统计异常的警报配置: (警报类型, 严重程度)，未列出的类型按异常行为处理
+ANOMALY_ALERTS = {
+    SensorType.CURRENT.value: ('OVERCURRENT', 3),
+    SensorType.TEMPERATURE.value: ('OVERHEAT', 4),
+    SensorType.SMOKE.value: ('SMOKE', 4)
+}
 
 class SensorManager:
     """传感器管理服务"""
@@ -14,9 +50,34 @@ class SensorManager:
     def __init__(self):
         self.logger = logging.getLogger("SensorManager")
         self.alert_service = AlertService()
+        self.fusion = get_fusion_service()
+        self.app = None
+        
+        # 原始读数存储：sql（sensor_data表）或 columnar（列式文件）
+        self.storage = create_storage(os.environ.get("SENSOR_STORAGE_BACKEND", "sql"))
+        
+        # 降采样汇总表，与原始读数在同一事务中更新
+        self.rollups = SensorRollupService()
         
-        # 加载传感器阈值配置
+        # 每个设备的最新读数缓存，供 /sensors/latest 直接读取
+        # 最新读数变化时推送给实时事件订阅者
+        self.event_bus = get_event_bus()
+        self.latest_cache = LatestReadingCache(self.storage.latest, self._publish_latest)
+        
+        # 原始数据保留策略，过期的整天数据归档后删除
+        self.retention = SensorRetentionService(self.storage, self.rollups, self._app_context)
+        
+        # 采样线程的读数先写入缓冲区，再批量写入数据库
+        self.write_buffer = SensorWriteBuffer(self._write_readings)
+        atexit.register(self.write_buffer.stop)
+        
+        # 加载传感器阈值配置（含按设备覆盖的阈值），编译为向量化判断引擎
+        self.device_thresholds = {}
         self.thresholds = self._load_thresholds()
+        self.threshold_engine = ThresholdEngine(self.thresholds, self.device_thresholds)
+        
+        # 变化率与滚动窗口异常检测，规则可在阈值配置中覆盖
+        self.anomaly_detector = AnomalyDetector(self.thresholds, self.device_thresholds)
         
         # 传感器读取线程
         self.sensor_threads = {}
@@ -25,6 +86,17 @@ class SensorManager:
         # 启动传感器监控
         self.start_monitoring()
         
+    def init_app(self, app):
+        """绑定Flask应用，后台线程在该应用上下文中访问数据库"""
+        self.app = app
+        self.retention.start()
+        
+    def _app_context(self):
+        """获取后台线程使用的应用上下文"""
+        if self.app is None:
+            return nullcontext()
+        return self.app.app_context()
+        
     def _load_thresholds(self):
         """加载传感器阈值配置"""
         # 默认阈值
@@ -78,24 +150,39 @@ class SensorManager:
                         if sensor_type in default_thresholds:
                             default_thresholds[sensor_type].update(thresholds)
                     
+                    # 按设备覆盖的阈值: {"devices": {device_id: {sensor_type: {...}}}}
+                    self.device_thresholds = config.get('devices', {})
+                    
                 self.logger.info(f"从配置文件加载了传感器阈值: {config_path}")
         except Exception as e:
             self.logger.error(f"加载传感器阈值配置失败: {e}")
             
         return default_thresholds
         
-    def get_thresholds(self):
+    def get_thresholds(self, include_devices=False):
         """获取当前阈值配置"""
+        if include_devices:
+            return dict(self.thresholds, devices=self.device_thresholds)
         return self.thresholds
         
     def update_thresholds(self, new_thresholds):
         """更新阈值配置"""
+        new_thresholds = dict(new_thresholds)
+        
+        # 更新按设备覆盖的阈值
+        for device_id, overrides in new_thresholds.pop('devices', {}).items():
+            for sensor_type, thresholds in overrides.items():
+                self.device_thresholds.setdefault(device_id, {}).setdefault(sensor_type, {}).update(thresholds)
+        
         # 更新内存中的阈值
         for sensor_type, thresholds in new_thresholds.items():
             if sensor_type in self.thresholds:
                 self.thresholds[sensor_type].update(thresholds)
             else:
                 self.thresholds[sensor_type] = thresholds
+        
+        self.threshold_engine.compile(self.thresholds, self.device_thresholds)
+        self.anomaly_detector.configure(self.thresholds, self.device_thresholds)
                 
         # 保存到配置文件
         config_path = os.environ.get("SENSOR_CONFIG_PATH", "config/sensor_thresholds.json")
@@ -104,7 +191,7 @@ class SensorManager:
             os.makedirs(os.path.dirname(config_path), exist_ok=True)
             
             with open(config_path, 'w') as f:
-                json.dump(self.thresholds, f, indent=4)
+                json.dump(dict(self.thresholds, devices=self.device_thresholds), f, indent=4)
                 
             self.logger.info(f"已更新传感器阈值配置: {config_path}")
         except Exception as e:
@@ -112,27 +199,17 @@ class SensorManager:
             
         return self.thresholds
         
-    def check_threshold(self, sensor_type, value):
+    def check_threshold(self, sensor_type, value, device_id=None):
         """检查传感器值是否超出阈值"""
-        if sensor_type not in self.thresholds:
-            return False, None
-            
-        thresholds = self.thresholds[sensor_type]
+        return self.threshold_engine.check(sensor_type, value, device_id)
         
-        # 检查是否超出临界阈值
-        if value >= thresholds.get('critical', float('inf')):
-            return True, 'critical'
-            
-        # 检查是否超出警告阈值
-        if value >= thresholds.get('warning', float('inf')):
-            return True, 'warning'
-            
-        # 检查是否低于最小值
-        if value < thresholds.get('min', float('-inf')):
-            return True, 'below_min'
-            
-        # 正常范围内
-        return False, None
+    def _thresholds_for(self, sensor_type, device_id=None):
+        """获取设备实际生效的阈值配置"""
+        thresholds = self.thresholds.get(sensor_type)
+        override = self.device_thresholds.get(device_id, {}).get(sensor_type) if device_id else None
+        if override:
+            return dict(thresholds or {}, **override)
+        return thresholds
         
     def start_monitoring(self):
         """启动传感器监控"""
@@ -140,6 +217,7 @@ class SensorManager:
             return
             
         self.is_running = True
+        self.write_buffer.start()
         self.logger.info("启动传感器监控服务")
         
         # 启动传感器读取线程
@@ -149,8 +227,18 @@ class SensorManager:
     def stop_monitoring(self):
         """停止传感器监控"""
         self.is_running = False
+        self.write_buffer.stop()
+        self.retention.stop()
         self.logger.info("停止传感器监控服务")
         
+    def get_stats(self):
+        """获取传感器服务统计信息"""
+        return {
+            'write_buffer': self.write_buffer.get_stats(),
+            'storage': self.storage.get_stats(),
+            'retention': self.retention.get_stats()
+        }
+        
     def _start_sensor_thread(self, sensor_type):
         """启动特定类型的传感器读取线程"""
         # 检查线程是否已经在运行
@@ -173,22 +261,24 @@ class SensorManager:
                 # 模拟读取传感器数据
                 # 实际项目中，这里应该从真实传感器读取数据
                 value = self._simulate_sensor_reading(sensor_type)
+                device_id = f"sim_{sensor_type}_001"  # 模拟设备ID
                 
-                # 创建传感器数据记录
-                sensor_data = SensorData(
-                    sensor_type=sensor_type,
-                    value=value,
-                    device_id=f"sim_{sensor_type}_001",  # 模拟设备ID
-                    unit=self._get_sensor_unit(sensor_type),
-                    timestamp=datetime.utcnow()
-                )
+                reading = {
+                    'sensor_type': sensor_type,
+                    'value': value,
+                    'device_id': device_id,
+                    'unit': self._get_sensor_unit(sensor_type),
+                    'timestamp': datetime.utcnow()
+                }
                 
-                # 保存数据
-                db.session.add(sensor_data)
-                db.session.commit()
+                # 读数进入写入缓冲区，由后台线程批量保存；最新读数缓存立即更新
+                self.write_buffer.add(reading)
+                self.latest_cache.update([reading])
                 
-                # 检查是否需要触发警报
-                self._check_alert(sensor_type, value, sensor_data.id)
+                # 阈值检查和异常检测直接使用内存中的读数，无需等待写入
+                with self._app_context():
+                    self._check_alert(sensor_type, value, None, device_id)
+                    self.detect_anomalies([reading])
                 
                 # 等待下一次读取
                 time.sleep(self._get_sensor_interval(sensor_type))
@@ -250,57 +340,208 @@ class SensorManager:
         }
         return intervals.get(sensor_type, 5)
         
-    def _check_alert(self, sensor_type, value, sensor_data_id):
+    def _write_readings(self, readings):
+        """将缓冲区中的读数批量写入数据库（写入缓冲区的回调）"""
+        with self._app_context():
+            self._insert_readings(readings)
+        
+    def ingest_readings(self, readings):
+        """
+        批量写入传感器读数并在一次遍历中检查阈值
+        
+        Args:
+            readings: 读数字典列表，键为 sensor_data 表的列名
+                      (sensor_type, value, device_id, location, timestamp, unit, status, metadata)
+                      
+        Returns:
+            写入的读数数量
+        """
+        if not readings:
+            return 0
+            
+        self._insert_readings(readings)
+        self.latest_cache.update(readings)
+        
+        self.check_readings(readings)
+        self.detect_anomalies(readings)
+        return len(readings)
+        
+    def _insert_readings(self, readings):
+        """批量写入原始读数并更新汇总表，整个批次只提交一次"""
+        with self.rollups.lock:
+            try:
+                self.storage.insert(readings)
+                self.rollups.apply(readings)
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+        
+    def check_readings(self, readings):
+        """
+        批量检查一批读数的阈值
+        
+        同一设备同一类型在批次内只按最严重的一条读数触发一次警报
+        """
+        if not readings:
+            return 0
+            
+        levels = self.threshold_engine.evaluate(
+            [reading['sensor_type'] for reading in readings],
+            [reading['value'] for reading in readings],
+            [reading['device_id'] for reading in readings]
+        )
+        
+        worst = {}  # {(sensor_type, device_id): (级别代码, value)}
+        for index in np.flatnonzero(levels):
+            reading = readings[index]
+            key = (reading['sensor_type'], reading['device_id'])
+            if key not in worst or levels[index] > worst[key][0]:
+                worst[key] = (levels[index], reading['value'])
+        
+        for (sensor_type, device_id), (level, value) in worst.items():
+            self._raise_alert(sensor_type, value, LEVEL_NAMES[int(level)], None, device_id)
+            
+        return len(worst)
+        
+    def detect_anomalies(self, readings):
+        """
+        更新滚动统计并检查变化率/突变异常
+        
+        同一设备同一类型的每种异常在批次内只按最后一条读数触发一次警报
+        """
+        found = {}  # {(sensor_type, device_id, kind): 异常信息}
+        for reading in readings:
+            anomalies = self.anomaly_detector.observe(
+                reading['sensor_type'], reading['device_id'], reading['value'], reading.get('timestamp')
+            )
+            for anomaly in anomalies:
+                found[(reading['sensor_type'], reading['device_id'], anomaly['kind'])] = anomaly
+        
+        for (sensor_type, device_id, _), anomaly in found.items():
+            self._raise_anomaly_alert(sensor_type, device_id, anomaly)
+            
+        return len(found)
+        
+    def _raise_anomaly_alert(self, sensor_type, device_id, anomaly):
+        """根据滚动统计异常触发传感器警报"""
+        alert_type, severity = ANOMALY_ALERTS.get(sensor_type, ('ABNORMAL_BEHAVIOR', 3))
+        unit = self._get_sensor_unit(sensor_type)
+        
+        if anomaly['kind'] == ANOMALY_SPIKE:
+            message = f"{sensor_type} 读数突变: {anomaly['value']}{unit}（基线 {anomaly['mean']:.2f}{unit}）"
+        elif anomaly['kind'] == ANOMALY_RATE:
+            message = f"{sensor_type} 上升过快: {anomaly['slope_per_minute']:.2f}{unit}/分钟"
+        else:
+            message = f"{sensor_type} 预计 {anomaly['seconds_to_critical']:.0f} 秒内达到临界值 {anomaly['critical']}{unit}"
+        
+        self.alert_service.create_alert(
+            alert_type=alert_type,
+            message=message,
+            source_type="sensor",
+            source_id=device_id or f"sensor_{sensor_type}",
+            details=dict(anomaly, sensor_type=sensor_type, device_id=device_id, level='anomaly'),
+            severity=severity
+        )
+        
+        self.logger.warning(f"传感器异常 ({sensor_type}, {device_id}): {anomaly['kind']}")
+        self._observe_fusion(sensor_type, device_id, anomaly['kind'])
+        
+    def _observe_fusion(self, sensor_type, device_id, level):
+        """将传感器事件送入多源融合服务"""
+        confidence = FUSION_CONFIDENCE.get(level)
+        if confidence is None:
+            return
+        source_id = device_id or f"sensor_{sensor_type}"
+        location = self.latest_cache.get_location(sensor_type, device_id)
+        self.fusion.observe(f"sensor:{sensor_type}", source_id, confidence, location)
+        
+    def get_anomaly_stats(self, sensor_type=None, device_id=None):
+        """获取各设备的滚动统计（EWMA、滚动均值/标准差、斜率）"""
+        return self.anomaly_detector.get_stats(sensor_type, device_id)
+        
+    def _check_alert(self, sensor_type, value, sensor_data_id, device_id=None):
         """检查是否需要触发警报"""
-        exceeded, level = self.check_threshold(sensor_type, value)
+        exceeded, level = self.check_threshold(sensor_type, value, device_id)
         
         if exceeded:
-            # 构建警报信息
-            alerts = {
-                SensorType.CURRENT.value: {
-                    'alert_type': 'OVERCURRENT',
-                    'message': f"电流异常: {value}A",
-                    'severity': 4 if level == 'critical' else 3
-                },
-                SensorType.VOLTAGE.value: {
-                    'alert_type': 'SYSTEM_ERROR',
-                    'message': f"电压异常: {value}V",
-                    'severity': 4 if level == 'critical' else 3
-                },
-                SensorType.TEMPERATURE.value: {
-                    'alert_type': 'OVERHEAT',
-                    'message': f"温度过高: {value}°C",
-                    'severity': 5 if level == 'critical' else 4
+            self._raise_alert(sensor_type, value, level, sensor_data_id, device_id)
+            
+    def _raise_alert(self, sensor_type, value, level, sensor_data_id, device_id=None):
+        """根据超限级别触发传感器警报"""
+        # 获取当前传感器类型的警报信息
+        alert_info = SENSOR_ALERTS.get(sensor_type)
+        
+        if alert_info:
+            alert_type, message, critical_severity, severity = alert_info
+            
+            # 触发警报
+            self.alert_service.create_alert(
+                alert_type=alert_type,
+                message=message.format(value=value),
+                source_type="sensor",
+                source_id=device_id or f"sensor_{sensor_type}",
+                details={
+                    'sensor_type': sensor_type,
+                    'device_id': device_id,
+                    'value': value,
+                    'level': level,
+                    'threshold': self._thresholds_for(sensor_type, device_id),
+                    'sensor_data_id': sensor_data_id
                 },
-                SensorType.SMOKE.value: {
-                    'alert_type': 'SMOKE',
-                    'message': f"检测到烟雾: {value}ppm",
-                    'severity': 5 if level == 'critical' else 4
-                }
-            }
+                severity=critical_severity if level == 'critical' else severity
+            )
             
-            # 获取当前传感器类型的警报信息
-            alert_info = alerts.get(sensor_type)
+            self.logger.warning(f"传感器警报 ({sensor_type}): {value} - {level}")
             
-            if alert_info:
-                # 触发警报
-                self.alert_service.create_alert(
-                    alert_type=alert_info['alert_type'],
-                    message=alert_info['message'],
-                    source_type="sensor",
-                    source_id=f"sensor_{sensor_type}",
-                    details={
-                        'sensor_type': sensor_type,
-                        'value': value,
-                        'level': level,
-                        'threshold': self.thresholds.get(sensor_type),
-                        'sensor_data_id': sensor_data_id
-                    },
-                    severity=alert_info['severity']
-                )
-                
-                self.logger.warning(f"传感器警报 ({sensor_type}): {value} - {level}")
-                
+        self._observe_fusion(sensor_type, device_id, level)
+            
+    def _publish_latest(self, readings):
+        """推送最新读数，慢客户端只收到每个设备的最新值"""
+        if not self.event_bus.has_subscribers(TOPIC_SENSORS):
+            return
+        for reading in readings:
+            self.event_bus.publish(
+                TOPIC_SENSORS, 'sensor_reading', LatestReadingCache.to_dict(reading),
+                coalesce_key=(reading['sensor_type'], reading['device_id'])
+            )
+        
+    def get_average(self, sensor_type, device_id=None, hours=1):
+        """获取指定类型最近一段时间原始读数的平均值"""
+        start_time = datetime.utcnow() - timedelta(hours=hours)
+        result = self.storage.average(sensor_type, start_time, device_id=device_id)
+        return result if result is not None else 0
+        
+    def save_reading(self, sensor_data):
+        """保存单条读数记录，更新汇总表和最新读数缓存，并检查是否需要触发警报"""
+        reading = {
+            'sensor_type': sensor_data.sensor_type,
+            'device_id': sensor_data.device_id,
+            'value': sensor_data.value,
+            'timestamp': sensor_data.timestamp
+        }
+        
+        with self.rollups.lock:
+            try:
+                self.storage.add(sensor_data)
+                self.rollups.apply([reading])
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+        
+        reading.update(
+            id=sensor_data.id,
+            location=sensor_data.location,
+            unit=sensor_data.unit,
+            status=sensor_data.status,
+            metadata=sensor_data.extra_metadata
+        )
+        self.latest_cache.update([reading])
+        
+        self._check_alert(sensor_data.sensor_type, sensor_data.value, sensor_data.id, sensor_data.device_id)
+        self.detect_anomalies([reading])
+        
     def manual_read_sensor(self, sensor_type, device_id=None):
         """手动读取传感器数据"""
         # 实际项目中，这里应该从真实传感器读取数据
@@ -315,11 +556,7 @@ class SensorManager:
             timestamp=datetime.utcnow()
         )
         
-        # 保存数据
-        db.session.add(sensor_data)
-        db.session.commit()
-        
-        # 检查是否需要触发警报
-        self._check_alert(sensor_type, value, sensor_data.id)
+        # 保存数据并检查是否需要触发警报
+        self.save_reading(sensor_data)
         
         return value 
\ No newline at end of file
@@ -0,0 +1,221 @@
+import logging
+from datetime import timedelta
+from sqlalchemy import event, func, select
+from app.models.sensor_data import SensorData
+from app.services.sensors.columnar_store import ColumnarSensorStore, EPOCH
+from app import db
+
+# 读数字段（与 SensorData.to_dict 的键一致）
+SENSOR_DATA_FIELDS = ['id', 'sensor_type', 'value', 'device_id', 'location', 'timestamp', 'unit', 'status', 'metadata']
+
+def _columns(fields):
+    """读数字段对应的 SensorData 列"""
+    return [SensorData.extra_metadata if field == 'metadata' else getattr(SensorData, field) for field in fields]
+
+class SqlSensorStorage:
+    """关系数据库存储：每条读数保存为 sensor_data 表的一行"""
+
+    name = 'sql'
+    has_ids = True
+
+    def insert(self, readings):
+        """批量写入读数（不提交事务，由调用方提交）"""
+        db.session.execute(SensorData.__table__.insert(), readings)
+
+    def add(self, sensor_data):
+        """写入单条读数记录（不提交事务）"""
+        db.session.add(sensor_data)
+
+    def query(self, start_time, end_time=None, sensor_type=None, device_id=None, limit=100, before=None, fields=None):
+        """
+        查询时间范围内的读数，按 (时间, ID) 倒序返回
+
+        只查询所需的列并由列值直接构造字典（timestamp为datetime），不创建模型实例
+
+        Args:
+            before: 游标位置 (时间, ID)，只返回排在其后的读数
+            fields: 只加载并返回的字段列表（SensorData.to_dict 的键名）
+        """
+        fields = fields or SENSOR_DATA_FIELDS
+        query = select(*_columns(fields)).where(SensorData.timestamp >= start_time)
+
+        if sensor_type:
+            query = query.where(SensorData.sensor_type == sensor_type)
+
+        if device_id:
+            query = query.where(SensorData.device_id == device_id)
+
+        if end_time:
+            query = query.where(SensorData.timestamp <= end_time)
+
+        if before is not None:
+            timestamp, row_id = before
+            if row_id is None:
+                query = query.where(SensorData.timestamp < timestamp)
+            else:
+                query = query.where(db.tuple_(SensorData.timestamp, SensorData.id) < (timestamp, row_id))
+
+        query = query.order_by(SensorData.timestamp.desc(), SensorData.id.desc()).limit(limit)
+        return [dict(zip(fields, row)) for row in db.session.execute(query)]
+
+    def iter_readings(self, start_time, end_time, sensor_type=None, device_id=None, fields=None, chunk_size=1000):
+        """
+        按 (时间, ID) 正序逐行生成范围内的读数字典（timestamp为datetime），用于导出
+
+        通过 yield_per 分批从服务端游标读取，只加载所选的列，内存占用与范围大小无关
+        """
+        fields = fields or SENSOR_DATA_FIELDS
+        query = select(*_columns(fields)).where(
+            SensorData.timestamp >= start_time,
+            SensorData.timestamp <= end_time
+        )
+        if sensor_type:
+            query = query.where(SensorData.sensor_type == sensor_type)
+        if device_id:
+            query = query.where(SensorData.device_id == device_id)
+        query = query.order_by(SensorData.timestamp, SensorData.id).execution_options(yield_per=chunk_size)
+
+        for row in db.session.execute(query):
+            yield dict(zip(fields, row))
+
+    def average(self, sensor_type, start_time, end_time=None, device_id=None):
+        """计算时间范围内读数的平均值，没有数据时返回None"""
+        query = db.session.query(func.avg(SensorData.value)).filter(
+            SensorData.sensor_type == sensor_type,
+            SensorData.timestamp >= start_time
+        )
+        if device_id:
+            query = query.filter(SensorData.device_id == device_id)
+        if end_time:
+            query = query.filter(SensorData.timestamp <= end_time)
+        return query.scalar()
+
+    def latest(self):
+        """返回每个 (传感器类型, 设备ID) 的最新读数列表"""
+        latest = db.session.query(
+            SensorData.sensor_type,
+            SensorData.device_id,
+            func.max(SensorData.timestamp).label('timestamp')
+        ).group_by(SensorData.sensor_type, SensorData.device_id).subquery()
+
+        records = SensorData.query.join(
+            latest,
+            db.and_(
+                SensorData.sensor_type == latest.c.sensor_type,
+                SensorData.device_id == latest.c.device_id,
+                SensorData.timestamp == latest.c.timestamp
+            )
+        ).all()
+
+        return [
+            {
+                'id': record.id,
+                'sensor_type': record.sensor_type,
+                'value': record.value,
+                'device_id': record.device_id,
+                'location': record.location,
+                'timestamp': record.timestamp,
+                'unit': record.unit,
+                'status': record.status,
+                'metadata': record.extra_metadata
+            }
+            for record in records
+        ]
+
+    def get_stats(self):
+        return {'backend': self.name}
+
+
+class ColumnarSensorStorage:
+    """
+    列式存储：读数按 (传感器类型, 设备ID) 追加到内存映射的时间戳/数值数组
+
+    文件追加无法回滚，写入的读数先登记在数据库会话中，事务提交后才追加到文件，回滚时丢弃。
+    状态和元数据字段不保存；读数没有ID（id 为None），不支持依赖ID的游标分页。
+    """
+
+    name = 'columnar'
+    has_ids = False
+
+    def __init__(self, root=None):
+        self.store = ColumnarSensorStore(root)
+
+        # 读数随会话事务提交写入文件
+        event.listen(db.session, 'after_commit', self._after_commit)
+        event.listen(db.session, 'after_soft_rollback', self._after_rollback)
+
+    def insert(self, readings):
+        """登记一批读数，事务提交后写入文件（不提交事务，由调用方提交）"""
+        # 确保会话已开始事务，登记的读数随该事务提交或回滚
+        db.session.connection()
+        db.session.info.setdefault('columnar_readings', []).extend(readings)
+
+    def add(self, sensor_data):
+        """登记单条读数记录，事务提交后写入文件；读数没有ID，sensor_data.id 保持为None"""
+        self.insert([{
+            'sensor_type': sensor_data.sensor_type,
+            'device_id': sensor_data.device_id,
+            'value': sensor_data.value,
+            'timestamp': sensor_data.timestamp,
+            'unit': sensor_data.unit,
+            'location': sensor_data.location
+        }])
+
+    def _after_commit(self, session):
+        readings = session.info.pop('columnar_readings', None)
+        if readings:
+            self.store.append(readings)
+
+    def _after_rollback(self, session, previous_transaction):
+        # 只在最外层事务回滚时丢弃，保存点回滚时外层事务仍会提交
+        if previous_transaction.parent is not None:
+            return
+        session.info.pop('columnar_readings', None)
+
+    def query(self, start_time, end_time=None, sensor_type=None, device_id=None, limit=100, before=None, fields=None):
+        # 读数没有ID，同一时间的读数无法在游标两侧区分
+        if before is not None:
+            raise ValueError("列式存储的读数没有ID，不支持游标分页")
+        readings = self.store.query(start_time, end_time, sensor_type=sensor_type, device_id=device_id, limit=limit)
+        if fields:
+            return [{field: reading[field] for field in fields} for reading in readings]
+        return readings
+
+    def iter_readings(self, start_time, end_time, sensor_type=None, device_id=None, fields=None, chunk_size=None):
+        """按时间正序逐天生成范围内的读数字典（读数没有ID）"""
+        fields = fields or SENSOR_DATA_FIELDS
+        for reading in self.store.iter_range(start_time, end_time, sensor_type=sensor_type, device_id=device_id):
+            yield {field: reading[field] for field in fields}
+
+    def average(self, sensor_type, start_time, end_time=None, device_id=None):
+        return self.store.average(sensor_type, start_time, end_time, device_id=device_id)
+
+    def latest(self):
+        return self.store.latest()
+
+    def expired_days(self, cutoff):
+        """返回早于cutoff的分段日期列表"""
+        return [(EPOCH + timedelta(days=day)).date() for day in self.store.expired_days(cutoff)]
+
+    def drop_day(self, day, archive_dir=None):
+        """删除（并可选归档）一天的分段，返回 (删除的读数数量, 归档文件列表)"""
+        return self.store.drop_day((day - EPOCH.date()).days, archive_dir)
+
+    def get_stats(self):
+        stats = self.store.get_stats()
+        stats['backend'] = self.name
+        return stats
+
+
+STORAGE_BACKENDS = {
+    'sql': SqlSensorStorage,
+    'columnar': ColumnarSensorStorage
+}
+
+def create_storage(name):
+    """根据名称创建传感器数据存储"""
+    storage_class = STORAGE_BACKENDS.get(name)
+    if storage_class is None:
+        raise ValueError(f"未知的传感器数据存储: {name}")
+    logging.getLogger("SensorStorage").info(f"传感器数据存储: {name}")
+    return storage_class()
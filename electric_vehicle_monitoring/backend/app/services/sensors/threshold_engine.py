@@ -0,0 +1,110 @@
+import numpy as np
+
+# 级别代码，数值越大越严重
+LEVEL_NONE = 0
+LEVEL_BELOW_MIN = 1
+LEVEL_WARNING = 2
+LEVEL_CRITICAL = 3
+
+LEVEL_NAMES = {
+    LEVEL_BELOW_MIN: 'below_min',
+    LEVEL_WARNING: 'warning',
+    LEVEL_CRITICAL: 'critical'
+}
+
+class CompiledThresholds:
+    """编译后的阈值规则：每行对应一个传感器类型或一个设备的覆盖配置"""
+
+    def __init__(self, thresholds, device_thresholds=None):
+        self.rows = {}  # {sensor_type 或 (sensor_type, device_id): 行号}
+        mins, warnings, criticals = [], [], []
+
+        def add_row(key, config):
+            self.rows[key] = len(mins)
+            mins.append(config.get('min', -np.inf))
+            warnings.append(config.get('warning', np.inf))
+            criticals.append(config.get('critical', np.inf))
+
+        for sensor_type, config in thresholds.items():
+            add_row(sensor_type, config)
+
+        # 设备覆盖配置在类型配置的基础上修改
+        for device_id, overrides in (device_thresholds or {}).items():
+            for sensor_type, config in overrides.items():
+                add_row((sensor_type, device_id), dict(thresholds.get(sensor_type, {}), **config))
+
+        # 最后一行用于未配置的传感器类型，不会触发任何级别
+        self.unknown_row = len(mins)
+        mins.append(-np.inf)
+        warnings.append(np.inf)
+        criticals.append(np.inf)
+
+        self.has_device_rows = bool(device_thresholds)
+        self.min = np.array(mins, dtype=np.float64)
+        self.warning = np.array(warnings, dtype=np.float64)
+        self.critical = np.array(criticals, dtype=np.float64)
+
+    def row_for(self, sensor_type, device_id=None):
+        if self.has_device_rows and device_id is not None:
+            row = self.rows.get((sensor_type, device_id))
+            if row is not None:
+                return row
+        return self.rows.get(sensor_type, self.unknown_row)
+
+
+class ThresholdEngine:
+    """
+    向量化阈值判断引擎
+
+    阈值编译为按行排列的数组，整批读数通过一次NumPy比较得到每条读数的级别代码。
+    更新阈值时重新编译并整体替换，判断过程无需加锁。
+    """
+
+    def __init__(self, thresholds, device_thresholds=None):
+        self.compiled = CompiledThresholds(thresholds, device_thresholds)
+
+    def compile(self, thresholds, device_thresholds=None):
+        """重新编译阈值规则"""
+        self.compiled = CompiledThresholds(thresholds, device_thresholds)
+
+    def evaluate(self, sensor_types, values, device_ids=None):
+        """
+        批量判断读数级别
+
+        Args:
+            sensor_types: 传感器类型序列
+            values: 数值序列
+            device_ids: 设备ID序列（可选，用于设备覆盖配置）
+
+        Returns:
+            int8数组，每条读数的级别代码（LEVEL_*）
+        """
+        compiled = self.compiled
+        if device_ids is None:
+            device_ids = [None] * len(sensor_types)
+
+        rows = np.fromiter(
+            (compiled.row_for(sensor_type, device_id) for sensor_type, device_id in zip(sensor_types, device_ids)),
+            dtype=np.intp, count=len(sensor_types)
+        )
+        values = np.asarray(values, dtype=np.float64)
+
+        # 与逐条判断的优先级一致：临界 > 警告 > 低于最小值
+        return np.select(
+            [values >= compiled.critical[rows], values >= compiled.warning[rows], values < compiled.min[rows]],
+            [LEVEL_CRITICAL, LEVEL_WARNING, LEVEL_BELOW_MIN],
+            default=LEVEL_NONE
+        ).astype(np.int8)
+
+    def check(self, sensor_type, value, device_id=None):
+        """判断单条读数，返回 (是否超限, 级别名称)"""
+        compiled = self.compiled
+        row = compiled.row_for(sensor_type, device_id)
+
+        if value >= compiled.critical[row]:
+            return True, LEVEL_NAMES[LEVEL_CRITICAL]
+        if value >= compiled.warning[row]:
+            return True, LEVEL_NAMES[LEVEL_WARNING]
+        if value < compiled.min[row]:
+            return True, LEVEL_NAMES[LEVEL_BELOW_MIN]
+        return False, None
@@ -0,0 +1,143 @@
+import os
+import time
+import logging
+import threading
+from collections import deque
+
+class SensorWriteBuffer:
+    """
+    传感器读数的延迟写入缓冲区
+
+    读数先缓存在内存中，数量达到批量大小或距上次写入超过时间间隔时，
+    由后台线程通过一次批量INSERT写入数据库。写入失败时读数保留在缓冲区中等待重试，
+    积压超过上限时丢弃最旧的读数。
+    """
+
+    def __init__(self, flush_func, batch_size=None, flush_interval=None, max_pending=None):
+        self.logger = logging.getLogger("SensorWriteBuffer")
+
+        # 触发写入的读数数量
+        if batch_size is None:
+            batch_size = int(os.environ.get("SENSOR_WRITE_BATCH_SIZE", 500))
+        # 最长写入间隔（秒）
+        if flush_interval is None:
+            flush_interval = float(os.environ.get("SENSOR_WRITE_FLUSH_INTERVAL", 5))
+        # 缓冲区最多保留的读数数量
+        if max_pending is None:
+            max_pending = int(os.environ.get("SENSOR_WRITE_MAX_PENDING", 50000))
+
+        self.flush_func = flush_func  # 接收读数列表并写入数据库
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+
+        self.pending = deque()
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()  # 保证同一时间只有一个写入
+        self.flush_requested = threading.Event()
+        self.thread = None
+        self.is_running = False
+
+        # 统计信息
+        self.stats = {
+            'buffered': 0,
+            'written': 0,
+            'flushes': 0,
+            'failed_flushes': 0,
+            'dropped': 0,
+            'high_watermark': 0,
+            'last_flush_size': 0,
+            'last_flush_duration': 0.0,
+            'last_flush_at': None
+        }
+
+    def start(self):
+        """启动后台写入线程"""
+        if self.is_running:
+            return
+
+        self.is_running = True
+        self.thread = threading.Thread(target=self._flush_loop, name="sensor-write-buffer", daemon=True)
+        self.thread.start()
+        self.logger.info(f"启动传感器写入缓冲，批量大小: {self.batch_size}，写入间隔: {self.flush_interval}秒")
+
+    def stop(self, timeout=5):
+        """停止后台线程并写入剩余读数"""
+        self.is_running = False
+        self.flush_requested.set()
+        if self.thread is not None:
+            self.thread.join(timeout)
+            self.thread = None
+        self.flush()
+
+    def add(self, reading):
+        """添加一条读数（字典，键为 sensor_data 表的列名）"""
+        with self.lock:
+            self.pending.append(reading)
+            self.stats['buffered'] += 1
+
+            # 积压过多（数据库长时间不可用）时丢弃最旧的读数
+            overflow = len(self.pending) - self.max_pending
+            if overflow > 0:
+                for _ in range(overflow):
+                    self.pending.popleft()
+                self.stats['dropped'] += overflow
+
+            size = len(self.pending)
+            self.stats['high_watermark'] = max(self.stats['high_watermark'], size)
+
+        if size >= self.batch_size:
+            self.flush_requested.set()
+
+    def flush(self):
+        """立即写入缓冲区中的全部读数，返回写入的数量"""
+        with self.flush_lock:
+            with self.lock:
+                if not self.pending:
+                    return 0
+                batch = list(self.pending)
+                self.pending.clear()
+
+            start = time.time()
+            try:
+                self.flush_func(batch)
+            except Exception as e:
+                # 写入失败，读数放回缓冲区头部等待下次重试
+                with self.lock:
+                    self.pending.extendleft(reversed(batch))
+                    overflow = len(self.pending) - self.max_pending
+                    for _ in range(max(0, overflow)):
+                        self.pending.popleft()
+                    self.stats['dropped'] += max(0, overflow)
+                    self.stats['failed_flushes'] += 1
+                self.logger.error(f"批量写入传感器读数失败（{len(batch)}条）: {e}")
+                return 0
+
+            duration = time.time() - start
+            with self.lock:
+                self.stats['written'] += len(batch)
+                self.stats['flushes'] += 1
+                self.stats['last_flush_size'] = len(batch)
+                self.stats['last_flush_duration'] = round(duration, 4)
+                self.stats['last_flush_at'] = start
+
+            return len(batch)
+
+    def get_stats(self):
+        """获取缓冲区统计信息"""
+        with self.lock:
+            stats = dict(self.stats)
+            stats['pending'] = len(self.pending)
+        stats['batch_size'] = self.batch_size
+        stats['flush_interval'] = self.flush_interval
+        stats['max_pending'] = self.max_pending
+        return stats
+
+    def _flush_loop(self):
+        """后台写入线程：按数量或时间间隔触发写入"""
+        while self.is_running:
+            self.flush_requested.wait(self.flush_interval)
+            self.flush_requested.clear()
+            if not self.is_running:
+                break
+            self.flush()
@@ -0,0 +1,22 @@
+import os
+import pytest
+
+@pytest.fixture(scope='session')
+def app(tmp_path_factory):
+    """使用临时SQLite数据库创建应用（停止传感器模拟采样，不启动统计核对和数据清理线程）"""
+    db_path = tmp_path_factory.mktemp('db') / 'ev_monitoring.db'
+    os.environ['DATABASE_URI'] = f"sqlite:///{db_path}"
+    os.environ['ALERT_STATS_RECONCILE_INTERVAL'] = '0'
+    os.environ['SENSOR_RETENTION_DAYS'] = '0'
+
+    from app import create_app
+    from app.api.sensors import sensor_manager
+
+    app = create_app()
+    app.config['TESTING'] = True
+    sensor_manager.stop_monitoring()
+    yield app
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
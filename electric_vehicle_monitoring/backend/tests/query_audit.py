@@ -0,0 +1,143 @@
+import re
+import logging
+from datetime import datetime
+from sqlalchemy import event
+from app.api.pagination import encode_cursor
+from app import db
+
+# 游标分页的非首页请求使用的游标
+AUDIT_CURSOR = encode_cursor(datetime(2024, 1, 31), 1000)
+
+# 需要检查的接口请求（GET，不修改数据）
+AUDIT_REQUESTS = [
+    '/api/alerts',
+    '/api/alerts?cursor=',
+    f'/api/alerts?cursor={AUDIT_CURSOR}',
+    f'/api/alerts?cursor={AUDIT_CURSOR}&status=new',
+    f'/api/alerts?cursor={AUDIT_CURSOR}&type=overheat&fields=id,message',
+    f'/api/alerts?cursor={AUDIT_CURSOR}&status=new&count=true',
+    '/api/alerts?count=false&fields=id,status',
+    '/api/alerts?status=new',
+    '/api/alerts?type=overheat',
+    '/api/alerts?status=new&type=overheat',
+    '/api/alerts?start_date=2024-01-01&end_date=2024-01-31',
+    '/api/alerts/1',
+    '/api/alerts/stats',
+    '/api/alerts/export',
+    '/api/alerts/export?format=ndjson&status=new',
+    '/api/alerts/export?type=overheat&start_date=2024-01-01&end_date=2024-01-31',
+    '/api/sensors/data?resolution=raw',
+    '/api/sensors/data?resolution=raw&type=temperature',
+    '/api/sensors/data?resolution=raw&type=temperature&device_id=sim_temperature_001',
+    '/api/sensors/data?resolution=1h',
+    '/api/sensors/data?resolution=1m&type=temperature',
+    '/api/sensors/data?resolution=1m&type=temperature&device_id=sim_temperature_001',
+    '/api/sensors/data?resolution=auto&start_time=2024-01-01T00:00:00',
+    '/api/sensors/data?cursor=',
+    f'/api/sensors/data?cursor={AUDIT_CURSOR}&type=temperature',
+    f'/api/sensors/data?cursor={AUDIT_CURSOR}&type=temperature&device_id=sim_temperature_001&fields=value',
+    '/api/sensors/export',
+    '/api/sensors/export?type=temperature&format=ndjson',
+    '/api/sensors/export?type=temperature&device_id=sim_temperature_001',
+    '/api/sensors/latest',
+]
+
+# EXPLAIN QUERY PLAN 中未使用索引的全表扫描，如 "SCAN alerts"
+FULL_SCAN_PATTERN = re.compile(r'^SCAN (?:TABLE )?(\w+)(?: AS \w+)?$')
+
+# 允许整表读取的表：警报统计计数表只有按类型/状态/日期汇总的少量行，加载时整表读入内存
+FULL_SCAN_ALLOWED = {'alert_stats'}
+
+class QueryAudit:
+    """
+    查询计划检查
+
+    执行接口、AlertService.get_* 方法和警报统计核对，记录其发出的SELECT语句，
+    再通过SQLite的 EXPLAIN QUERY PLAN 检查每条语句是否都使用了索引。
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.logger = logging.getLogger("QueryAudit")
+        self.statements = []  # [(来源, SQL, 参数)]
+        self.statuses = {}  # {请求URL: 响应状态码}
+        self.source = None
+
+    def run(self):
+        """执行检查，返回 [(来源, SQL, 查询计划, 全表扫描的表)]"""
+        with self.app.app_context():
+            if db.engine.dialect.name != 'sqlite':
+                raise RuntimeError("查询计划检查需在SQLite数据库上运行（设置 DATABASE_URI=sqlite:///...）")
+
+            event.listen(db.engine, 'before_cursor_execute', self._capture)
+            try:
+                self._run_requests()
+                self._run_alert_service()
+                self._run_alert_stats()
+            finally:
+                event.remove(db.engine, 'before_cursor_execute', self._capture)
+
+            return [self._explain(source, statement, parameters)
+                    for source, statement, parameters in self.statements]
+
+    def _run_requests(self):
+        """通过测试客户端请求各个接口"""
+        from app.api.sensors import sensor_manager
+        from app.services.alerts.alert_stats import get_alert_stats
+
+        client = self.app.test_client()
+        for url in AUDIT_REQUESTS:
+            if url == '/api/sensors/latest':
+                # 最新读数缓存只在首次访问时查询数据库
+                sensor_manager.latest_cache.loaded = False
+            if url == '/api/alerts/stats':
+                # 警报统计只在首次访问时从统计表加载
+                get_alert_stats().loaded = False
+            self.source = f"GET {url}"
+            response = client.get(url)
+            # 导出接口为流式响应，读取响应体才会执行查询
+            response.get_data()
+            response.close()
+            self.statuses[url] = response.status_code
+
+    def _run_alert_service(self):
+        """调用 AlertService 的查询方法"""
+        from app.services.alerts.alert_service import AlertService
+
+        service = AlertService()
+        calls = [
+            ('get_active_alerts', ()),
+            ('get_alerts_by_type', ('overheat',)),
+            ('get_alerts_by_source', ('sensor',)),
+            ('get_alerts_by_source', ('sensor', 'sim_temperature_001')),
+        ]
+        for name, args in calls:
+            self.source = f"AlertService.{name}{args}"
+            getattr(service, name)(*args)
+            db.session.rollback()
+
+    def _run_alert_stats(self):
+        """执行警报统计的定期核对（聚合查询）"""
+        from app.services.alerts.alert_stats import get_alert_stats
+
+        self.source = "AlertStatsService.reconcile()"
+        get_alert_stats().reconcile()
+
+    def _capture(self, conn, cursor, statement, parameters, context, executemany):
+        """记录发出的SELECT语句"""
+        if self.source and statement.lstrip().upper().startswith('SELECT'):
+            self.statements.append((self.source, statement, parameters))
+
+    def _explain(self, source, statement, parameters):
+        """获取语句的查询计划，找出未使用索引的全表扫描"""
+        table_names = set(db.metadata.tables)
+        with db.engine.connect() as conn:
+            plan = [row[-1] for row in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters)]
+
+        scans = []
+        for detail in plan:
+            match = FULL_SCAN_PATTERN.match(detail)
+            if match and match.group(1) in table_names and match.group(1) not in FULL_SCAN_ALLOWED:
+                scans.append(match.group(1))
+        return source, statement, plan, scans
+
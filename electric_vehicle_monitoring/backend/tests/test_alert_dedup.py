@@ -0,0 +1,73 @@
+from app import db
+from app.models.alert import Alert
+from app.services.alerts.alert_deduplicator import AlertDeduplicator
+from app.services.alerts.alert_service import AlertService
+
+KEY = ('overheat', 'sensor', 'dedup_unit')
+
+
+def test_duplicate_and_escalate():
+    deduplicator = AlertDeduplicator(window=60, flush_interval=10)
+
+    action, _ = deduplicator.observe(KEY, 3, now=0)
+    assert action == AlertDeduplicator.NEW
+    deduplicator.bind(KEY, 7, now=0)
+
+    action, entry = deduplicator.observe(KEY, 3, now=1)
+    assert action == AlertDeduplicator.DUPLICATE
+    assert entry['alert_id'] == 7 and entry['count'] == 2
+
+    # 严重程度不变或降低时合并，升高时升级
+    assert deduplicator.observe(KEY, 2, now=2)[0] == AlertDeduplicator.DUPLICATE
+    action, entry = deduplicator.observe(KEY, 5, now=3)
+    assert action == AlertDeduplicator.ESCALATE
+    assert entry['severity'] == 5 and entry['count'] == 4
+    assert deduplicator.get_stats() == {'tracked': 1, 'suppressed': 2, 'escalated': 1}
+
+def test_window_counts_from_last_occurrence():
+    deduplicator = AlertDeduplicator(window=60, flush_interval=10)
+    deduplicator.observe(KEY, 3, now=0)
+    deduplicator.bind(KEY, 7, now=0)
+
+    assert deduplicator.observe(KEY, 3, now=50)[0] == AlertDeduplicator.DUPLICATE
+    assert deduplicator.observe(KEY, 3, now=100)[0] == AlertDeduplicator.DUPLICATE
+
+    # 超出窗口后新建，未写回的次数留待写回
+    assert deduplicator.observe(KEY, 3, now=161)[0] == AlertDeduplicator.NEW
+    assert deduplicator.take_pending_flushes(now=161) == [(7, 3, 100)]
+
+def test_release_keeps_unflushed_count():
+    deduplicator = AlertDeduplicator(window=60, flush_interval=10)
+    deduplicator.observe(KEY, 3, now=0)
+    deduplicator.bind(KEY, 7, now=0)
+    deduplicator.observe(KEY, 3, now=1)
+
+    deduplicator.release(7)
+    assert deduplicator.observe(KEY, 3, now=2)[0] == AlertDeduplicator.NEW
+    assert deduplicator.take_pending_flushes(now=2) == [(7, 2, 1)]
+
+def test_service_merges_escalates_and_releases_on_status_update(app, client):
+    service = AlertService()
+    source_id = 'dedup_service'
+
+    with app.app_context():
+        alert_id = service.create_alert('OVERHEAT', '温度过高', 'sensor', source_id, severity=3)
+        assert alert_id is not None
+        assert service.create_alert('OVERHEAT', '温度过高', 'sensor', source_id, severity=3) == alert_id
+        assert service.is_duplicate('OVERHEAT', 'sensor', source_id, 3)
+        assert service.create_alert('OVERHEAT', '温度严重过高', 'sensor', source_id, severity=5) == alert_id
+
+        alert = db.session.get(Alert, alert_id)
+        assert (alert.severity, alert.message) == (5, '温度严重过高')
+        assert Alert.query.filter_by(source_id=source_id).count() == 1
+
+    # 关闭警报时写回合并的次数，之后的同类警报新建记录
+    response = client.put(f'/api/alerts/{alert_id}', json={'status': 'resolved'})
+    assert response.status_code == 200
+
+    with app.app_context():
+        assert db.session.get(Alert, alert_id).occurrence_count == 3
+        assert not service.is_duplicate('OVERHEAT', 'sensor', source_id, 3)
+
+        new_id = service.create_alert('OVERHEAT', '温度过高', 'sensor', source_id, severity=3)
+        assert new_id not in (None, alert_id)
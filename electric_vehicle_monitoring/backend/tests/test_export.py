@@ -0,0 +1,106 @@
+import csv
+import io
+import gzip
+import json
+import pytest
+from datetime import datetime
+from app import db
+from app.api import export
+from app.models.alert import Alert
+from app.models.sensor_data import SensorData
+
+
+@pytest.fixture(scope='module')
+def export_alerts(app):
+    """三条 export_test 警报，包含JSON字段和中文"""
+    with app.app_context():
+        alerts = [
+            Alert(alert_type='export_test', message=f'导出警报{i}', source_type='sensor', source_id='export',
+                  details={'value': i}, severity=i, created_at=datetime(2023, 7, 1, 8, i))
+            for i in range(3)
+        ]
+        db.session.add_all(alerts)
+        db.session.commit()
+        return [alert.id for alert in alerts]
+
+@pytest.fixture(scope='module')
+def export_readings(app):
+    with app.app_context():
+        db.session.add_all([
+            SensorData(sensor_type='voltage', value=220.0 + i, device_id='export_sensor', unit='V',
+                       timestamp=datetime(2023, 7, 1, 8, i))
+            for i in range(3)
+        ])
+        db.session.commit()
+
+def _csv_rows(body):
+    return list(csv.reader(io.StringIO(body.decode('utf-8'))))
+
+def test_alerts_csv(client, export_alerts):
+    response = client.get('/api/alerts/export', query_string={
+        'type': 'export_test', 'fields': 'id,message,details,created_at'
+    })
+
+    assert response.status_code == 200
+    assert response.is_streamed
+    assert response.mimetype == 'text/csv'
+    assert response.headers['Content-Disposition'] == 'attachment; filename="alerts.csv"'
+    header, *rows = _csv_rows(response.get_data())
+    assert header == ['id', 'message', 'details', 'created_at']
+    # JSON字段序列化为字符串，时间为ISO格式
+    assert [[row[0], row[1], json.loads(row[2]), row[3]] for row in rows] == [
+        [str(alert_id), f'导出警报{i}', {'value': i}, f'2023-07-01T08:0{i}:00']
+        for i, alert_id in enumerate(export_alerts)
+    ]
+
+def test_alerts_ndjson(client, export_alerts):
+    response = client.get('/api/alerts/export', query_string={
+        'type': 'export_test', 'format': 'ndjson', 'fields': 'id,severity,details'
+    })
+
+    assert response.mimetype == 'application/x-ndjson'
+    assert [json.loads(line) for line in response.get_data().decode('utf-8').splitlines()] == [
+        {'id': alert_id, 'severity': i, 'details': {'value': i}}
+        for i, alert_id in enumerate(export_alerts)
+    ]
+
+@pytest.mark.parametrize('export_format', ['csv', 'ndjson'])
+def test_gzip(client, export_alerts, export_format, monkeypatch):
+    # 每行一个数据块，压缩跨越多个块
+    monkeypatch.setattr(export, 'EXPORT_CHUNK_ROWS', 1)
+    params = {'type': 'export_test', 'format': export_format, 'fields': 'id,message'}
+    plain = client.get('/api/alerts/export', query_string=params).get_data()
+
+    response = client.get('/api/alerts/export', query_string=dict(params, gzip='true'))
+
+    assert response.mimetype == 'application/gzip'
+    assert response.headers['Content-Disposition'] == f'attachment; filename="alerts.{export_format}.gz"'
+    assert gzip.decompress(response.get_data()) == plain
+    assert len(plain.splitlines()) == (4 if export_format == 'csv' else 3)
+
+def test_sensor_export(client, export_readings):
+    params = {
+        'device_id': 'export_sensor',
+        'start_time': '2023-07-01T08:00:00',
+        'end_time': '2023-07-01T08:01:30',
+        'fields': 'value,unit,timestamp',
+    }
+    response = client.get('/api/sensors/export', query_string=params)
+
+    assert response.headers['Content-Disposition'] == 'attachment; filename="sensor_data.csv"'
+    # 字段按读数字段的固定顺序导出，只包含时间范围内的读数
+    assert _csv_rows(response.get_data()) == [
+        ['value', 'timestamp', 'unit'],
+        ['220.0', '2023-07-01T08:00:00', 'V'],
+        ['221.0', '2023-07-01T08:01:00', 'V'],
+    ]
+
+    response = client.get('/api/sensors/export', query_string=dict(params, format='ndjson', gzip='true'))
+    lines = gzip.decompress(response.get_data()).decode('utf-8').splitlines()
+    assert [json.loads(line)['value'] for line in lines] == [220.0, 221.0]
+
+def test_invalid_export_requests(client):
+    assert client.get('/api/alerts/export?format=xml').status_code == 400
+    assert client.get('/api/alerts/export?fields=password').status_code == 400
+    assert client.get('/api/sensors/export?format=xml').status_code == 400
+    assert client.get('/api/sensors/export?start_time=yesterday').status_code == 400
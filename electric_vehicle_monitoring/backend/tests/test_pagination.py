@@ -0,0 +1,91 @@
+import pytest
+from datetime import datetime
+from app import db
+from app.models.alert import Alert
+from app.models.sensor_data import SensorData
+
+CREATED_AT = datetime(2023, 6, 1, 12, 0)
+
+
+def _pages(client, url, params):
+    """按 next_cursor 依次获取所有页"""
+    pages = []
+    cursor = ''
+    while cursor is not None:
+        data = client.get(url, query_string=dict(params, cursor=cursor)).get_json()
+        pages.append(data)
+        cursor = data['next_cursor']
+    return pages
+
+@pytest.fixture(scope='module')
+def alert_ids(app):
+    """五条 cursor_test 警报，前四条创建时间相同"""
+    with app.app_context():
+        alerts = [
+            Alert(alert_type='cursor_test', message=f'警报{i}', source_type='sensor', source_id='cursor',
+                  created_at=CREATED_AT if i < 4 else datetime(2023, 6, 1, 11, 0))
+            for i in range(5)
+        ]
+        db.session.add_all(alerts)
+        db.session.commit()
+        return [alert.id for alert in alerts]
+
+@pytest.fixture(scope='module')
+def reading_ids(app):
+    """三条时间相同的读数"""
+    with app.app_context():
+        readings = [
+            SensorData(sensor_type='temperature', value=float(i), device_id='cursor_sensor', timestamp=CREATED_AT)
+            for i in range(3)
+        ]
+        db.session.add_all(readings)
+        db.session.commit()
+        return [reading.id for reading in readings]
+
+def test_alert_cursor_is_stable_across_equal_created_at(client, alert_ids):
+    pages = _pages(client, '/api/alerts', {'type': 'cursor_test', 'per_page': 2})
+
+    # 相同时间的警报按ID倒序，翻页时不重复也不遗漏
+    assert [[item['id'] for item in page['items']] for page in pages] == [
+        [alert_ids[3], alert_ids[2]], [alert_ids[1], alert_ids[0]], [alert_ids[4]]
+    ]
+    assert pages[-1]['next_cursor'] is None
+
+def test_alert_cursor_last_page_exactly_full(client, alert_ids):
+    pages = _pages(client, '/api/alerts', {'type': 'cursor_test', 'per_page': 5})
+    assert len(pages) == 1
+    assert len(pages[0]['items']) == 5
+    assert pages[0]['next_cursor'] is None
+
+def test_alert_cursor_count_is_opt_in(client, alert_ids):
+    params = {'type': 'cursor_test', 'per_page': 2, 'cursor': ''}
+    assert client.get('/api/alerts', query_string=params).get_json()['total'] is None
+
+    params['count'] = 'true'
+    assert client.get('/api/alerts', query_string=params).get_json()['total'] == 5
+
+    # 页码分页默认统计总数
+    data = client.get('/api/alerts', query_string={'type': 'cursor_test', 'per_page': 2}).get_json()
+    assert (data['total'], data['pages']) == (5, 3)
+
+def test_alert_cursor_fields(client, alert_ids):
+    data = client.get('/api/alerts', query_string={
+        'type': 'cursor_test', 'per_page': 1, 'cursor': '', 'fields': 'message'
+    }).get_json()
+    assert data['items'] == [{'message': '警报3'}]
+    assert data['next_cursor'] is not None
+
+def test_invalid_cursor_and_fields(client):
+    assert client.get('/api/alerts?cursor=not-a-cursor').status_code == 400
+    assert client.get('/api/alerts?cursor=&fields=id,password').status_code == 400
+
+def test_sensor_cursor_is_stable_across_equal_timestamps(client, reading_ids):
+    pages = _pages(client, '/api/sensors/data', {
+        'device_id': 'cursor_sensor', 'start_time': '2023-06-01T00:00:00', 'limit': 2, 'fields': 'id,value'
+    })
+
+    assert [page['items'] for page in pages] == [
+        [{'id': reading_ids[2], 'value': 2.0}, {'id': reading_ids[1], 'value': 1.0}],
+        [{'id': reading_ids[0], 'value': 0.0}],
+    ]
+    assert pages[-1]['next_cursor'] is None
@@ -0,0 +1,31 @@
+import pytest
+from query_audit import QueryAudit
+
+
+@pytest.fixture(scope='module')
+def audit(app):
+    """执行接口和服务查询，记录查询计划"""
+    from app.services.alerts.alert_service import AlertService
+
+    # 单个警报详情接口需要一条警报；使用模拟传感器不会触发的来源，
+    # 避免与启动时传感器线程的警报合并
+    with app.app_context():
+        alert_id = AlertService().create_alert('OVERHEAT', '温度过高', 'sensor', 'audit_temperature')
+    assert alert_id is not None
+
+    audit = QueryAudit(app)
+    audit.results = audit.run()
+    return audit
+
+def test_audited_requests_succeed(audit):
+    failed = {url: status for url, status in audit.statuses.items() if status != 200}
+    assert not failed
+
+def test_queries_use_indexes(audit):
+    assert audit.results
+
+    scans = [
+        f"{source}: {' '.join(statement.split())}\n    {plan}"
+        for source, statement, plan, scans in audit.results if scans
+    ]
+    assert not scans, "存在未使用索引的全表扫描:\n" + "\n".join(scans)
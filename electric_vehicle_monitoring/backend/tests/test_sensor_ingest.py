@@ -0,0 +1,84 @@
+import json
+from datetime import datetime
+from app.models.sensor_data import SensorData
+
+
+def _readings(app, device_id):
+    with app.app_context():
+        rows = SensorData.query.filter_by(device_id=device_id).order_by(SensorData.timestamp).all()
+        return [(row.value, row.timestamp) for row in rows]
+
+def test_json_array(app, client):
+    response = client.post('/api/sensors/readings/batch', json=[
+        {'sensor_type': 'temperature', 'value': 25.5, 'device_id': 'ingest_json', 'timestamp': '2024-03-01T08:00:00'},
+        {'sensor_type': 'temperature', 'value': '26', 'device_id': 'ingest_json', 'timestamp': '2024-03-01T08:01:00'},
+    ])
+
+    assert response.status_code == 201
+    assert response.get_json() == {'accepted': 2, 'rejected': 0, 'errors': []}
+    assert _readings(app, 'ingest_json') == [
+        (25.5, datetime(2024, 3, 1, 8, 0)),
+        (26.0, datetime(2024, 3, 1, 8, 1)),
+    ]
+
+def test_ndjson(app, client):
+    lines = [
+        {'sensor_type': 'humidity', 'value': 40, 'device_id': 'ingest_ndjson', 'timestamp': '2024-03-01T08:00:00'},
+        {'sensor_type': 'humidity', 'value': 41, 'device_id': 'ingest_ndjson', 'timestamp': '2024-03-01T08:01:00'},
+    ]
+    body = "\n".join(json.dumps(line) for line in lines) + "\n\n{not json}\n"
+    response = client.post('/api/sensors/readings/batch', data=body, content_type='application/x-ndjson')
+
+    assert response.status_code == 201
+    assert response.get_json() == {'accepted': 2, 'rejected': 1, 'errors': [{'index': 3, 'error': '无效的读数格式'}]}
+    assert [value for value, _ in _readings(app, 'ingest_ndjson')] == [40.0, 41.0]
+
+def test_bad_rows_are_reported_and_skipped(app, client):
+    response = client.post('/api/sensors/readings/batch', json={'readings': [
+        {'sensor_type': 'temperature', 'value': 30, 'device_id': 'ingest_bad'},
+        {'sensor_type': 'unknown', 'value': 30, 'device_id': 'ingest_bad'},
+        {'sensor_type': 'temperature', 'value': 'hot', 'device_id': 'ingest_bad'},
+        {'sensor_type': 'temperature', 'device_id': 'ingest_bad'},
+        {'sensor_type': 'temperature', 'value': 30, 'device_id': 'ingest_bad', 'timestamp': 'yesterday'},
+        'reading',
+    ]})
+
+    assert response.status_code == 201
+    data = response.get_json()
+    assert data['accepted'] == 1
+    assert data['errors'] == [
+        {'index': 1, 'error': '无效的传感器类型'},
+        {'index': 2, 'error': '无效的数值'},
+        {'index': 3, 'error': '缺少必要参数'},
+        {'index': 4, 'error': '无效的时间戳'},
+        {'index': 5, 'error': '无效的读数格式'},
+    ]
+    assert len(_readings(app, 'ingest_bad')) == 1
+
+def test_no_valid_rows(client):
+    response = client.post('/api/sensors/readings/batch', json=[{'sensor_type': 'unknown'}])
+    assert response.status_code == 400
+    assert response.get_json()['accepted'] == 0
+
+    response = client.post('/api/sensors/readings/batch', json={'value': 1})
+    assert response.status_code == 400
+
+def test_aware_timestamps_are_stored_as_naive_utc(app, client):
+    response = client.post('/api/sensors/readings/batch', json=[
+        {'sensor_type': 'temperature', 'value': 20, 'device_id': 'ingest_tz', 'timestamp': '2024-03-01T10:00:00+08:00'},
+        {'sensor_type': 'temperature', 'value': 21, 'device_id': 'ingest_tz', 'timestamp': '2024-03-01T02:30:00+00:00'},
+    ])
+    assert response.status_code == 201
+
+    assert _readings(app, 'ingest_tz') == [
+        (20.0, datetime(2024, 3, 1, 2, 0)),
+        (21.0, datetime(2024, 3, 1, 2, 30)),
+    ]
+
+    # 查询参数中带时区的时间同样转换为UTC
+    response = client.get('/api/sensors/data', query_string={
+        'device_id': 'ingest_tz',
+        'start_time': '2024-03-01T10:15:00+08:00',
+        'end_time': '2024-03-01T03:00:00+00:00',
+    })
+    assert [item['value'] for item in response.get_json()] == [21.0]
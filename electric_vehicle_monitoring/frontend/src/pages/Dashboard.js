@@ -103,9 +103,24 @@ const Dashboard = () => {
 
     fetchDashboardData();
     
-    // 设置定时刷新
-    const interval = setInterval(fetchDashboardData, 30000);
-    return () => clearInterval(interval);
+    // 订阅服务器推送的警报事件，替代定时刷新；断线后浏览器自动重连并补发遗漏的事件
+    const events = new EventSource('/api/events?topics=alerts');
+    
+    events.addEventListener('alert_created', (event) => {
+      const alert = JSON.parse(event.data);
+      setRecentAlerts((alerts) => [alert, ...alerts.filter((item) => item.id !== alert.id)].slice(0, 10));
+      setStats((current) => ({ ...current, activeAlerts: current.activeAlerts + 1 }));
+    });
+    
+    events.addEventListener('alert_updated', (event) => {
+      const alert = JSON.parse(event.data);
+      setRecentAlerts((alerts) => alerts.map((item) => (item.id === alert.id ? alert : item)));
+    });
+    
+    // 推送积压被丢弃时重新拉取完整数据
+    events.addEventListener('resync', fetchDashboardData);
+    
+    return () => events.close();
   }, []);
 
   // 报警状态标签